@@ -2,13 +2,18 @@ import cv2
 import numpy as np
 import tkinter as tk
 from tkinter import ttk
-from PIL import Image, ImageTk
+from PIL import ImageTk
+import argparse
+import os
 import threading
 import time
-import requests
+
+from detection import AttentionScorer
+from frame_buffer import FrameBuffer
+from summary_outbox import SummaryOutbox
 
 class AttentionDetector:
-    def __init__(self, root):
+    def __init__(self, root, session_id=None, api_base="http://localhost:8000", display_fps=30, max_fps=30):
         self.root = root
         self.root.title("Attention Detector")
         self.root.geometry("800x600")
@@ -16,7 +21,12 @@ class AttentionDetector:
         # State variables
         self.running = False
         self.cap = None
-        self.current_frame = None
+        self.frame_buffer = FrameBuffer()
+        self.display_interval_ms = max(1, int(1000 / display_fps))
+        # Capture/detection cap, so a fast camera doesn't pin a core; 0 disables it
+        self.frame_interval = 1.0 / max_fps if max_fps > 0 else 0.0
+        self.display_image = None
+        self.displayed_status = None
         self.attention_status = "Unknown"
         self.attention_percentage = 0
         
@@ -30,9 +40,13 @@ class AttentionDetector:
         self.detection_start_time = 0
         self.last_frame_time = 0
         
-        # OpenCV classifiers
-        self.face_cascade = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
-        self.eye_cascade = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_eye.xml')
+        # Backend reporting (summaries go through a durable local outbox)
+        self.current_session_id = session_id
+        self.api_base = api_base
+        self.outbox = SummaryOutbox(api_base)
+        
+        # Face/eye scoring, shared with the headless runner
+        self.scorer = AttentionScorer()
         
         # Setup GUI
         self.setup_gui()
@@ -131,103 +145,30 @@ class AttentionDetector:
     
     def detect_attention(self, frame):
         """Detect if person is paying attention"""
-        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-        
-        # Detect faces
-        faces = self.face_cascade.detectMultiScale(gray, 1.3, 5)
-        
-        if len(faces) == 0:
-            return False, 0, frame  # No face detected
-        
-        # Get the largest face (assuming it's the main person)
-        largest_face = max(faces, key=lambda rect: rect[2] * rect[3])
-        x, y, w, h = largest_face
-        
-        # Draw face rectangle
-        cv2.rectangle(frame, (x, y), (x+w, y+h), (255, 0, 0), 2)
-        
-        # Region of Interest for eyes
-        roi_gray = gray[y:y+h, x:x+w]
-        roi_color = frame[y:y+h, x:x+w]
-        
-        # Detect eyes
-        eyes = self.eye_cascade.detectMultiScale(roi_gray, 1.1, 3)
-        
-        # Calculate attention metrics
-        attention_score = 0
-        eye_count = len(eyes)
-        
-        # Face position and size (center and size relative to frame)
-        frame_height, frame_width = frame.shape[:2]
-        face_center_x = x + w // 2
-        face_center_y = y + h // 2
-        
-        # Check if face is centered (within 30% of center)
-        center_threshold = 0.3
-        x_center_offset = abs(face_center_x - frame_width // 2) / (frame_width // 2)
-        y_center_offset = abs(face_center_y - frame_height // 2) / (frame_height // 2)
-        
-        # Face size (should be reasonable, not too small or too large)
-        face_area = w * h
-        frame_area = frame_width * frame_height
-        face_ratio = face_area / frame_area
-        
-        # Calculate attention based on multiple factors
-        factors = {
-            'face_detected': 30,  # Base score for having a face
-            'face_centered_x': 0,
-            'face_centered_y': 0,
-            'eyes_detected': 0,
-            'face_size': 0
-        }
-        
-        # Face centered score (x-axis)
-        if x_center_offset < center_threshold:
-            factors['face_centered_x'] = 25
-        elif x_center_offset < 0.5:
-            factors['face_centered_x'] = 15
-        
-        # Face centered score (y-axis)
-        if y_center_offset < center_threshold:
-            factors['face_centered_y'] = 20
-        elif y_center_offset < 0.5:
-            factors['face_centered_y'] = 10
-        
-        # Eyes detected score
-        if eye_count >= 2:
-            factors['eyes_detected'] = 25
-            # Draw eye rectangles
-            for (ex, ey, ew, eh) in eyes:
-                cv2.rectangle(roi_color, (ex, ey), (ex+ew, ey+eh), (0, 255, 0), 2)
-        elif eye_count == 1:
-            factors['eyes_detected'] = 10
-        
-        # Face size score (optimal size is around 10-30% of frame)
-        if 0.05 < face_ratio < 0.40:
-            factors['face_size'] = 10
-        elif 0.02 < face_ratio < 0.50:
-            factors['face_size'] = 5
-        
-        attention_score = sum(factors.values())
-        
-        # Determine if paying attention (threshold: 60%)
-        is_attentive = attention_score >= 60
-        
-        return is_attentive, attention_score, frame
+        result = self.scorer.detect(frame)
+        return result.is_attentive, result.score, frame
     
     def update_frame(self):
         """Continuously update the video frame"""
+        next_frame_at = time.monotonic()
         while True:
             if self.cap is None or not self.cap.isOpened():
                 break
+            
+            # Sleep off whatever is left of the frame interval; slow frames don't wait at all
+            if self.frame_interval:
+                wait = next_frame_at - time.monotonic()
+                if wait > 0:
+                    time.sleep(wait)
+                next_frame_at = max(next_frame_at, time.monotonic() - self.frame_interval) + self.frame_interval
                 
             ret, frame = self.cap.read()
             if not ret:
                 break
             
             if self.running:
-                # Detect attention
-                is_attentive, score, processed_frame = self.detect_attention(frame.copy())
+                # Detect attention (overlays are drawn straight onto the captured frame)
+                is_attentive, score, processed_frame = self.detect_attention(frame)
                 
                 # Update status
                 self.attention_status = "Paying Attention" if is_attentive else "Not Paying Attention"
@@ -254,36 +195,35 @@ class AttentionDetector:
                            cv2.FONT_HERSHEY_SIMPLEX, 1, color, 2)
                 cv2.putText(processed_frame, f"Score: {self.attention_percentage}%", (10, 70),
                            cv2.FONT_HERSHEY_SIMPLEX, 0.7, color, 2)
-                
-                self.current_frame = processed_frame
             else:
                 # Just show the raw frame with instructions
                 cv2.putText(frame, "Press 'Start Detection' to begin", (10, 30),
                            cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 255, 255), 2)
-                self.current_frame = frame
-            
-            # Convert to RGB for tkinter
-            frame_rgb = cv2.cvtColor(self.current_frame, cv2.COLOR_BGR2RGB)
-            frame_pil = Image.fromarray(frame_rgb)
-            frame_tk = ImageTk.PhotoImage(image=frame_pil)
             
-            # Update GUI in main thread
-            self.root.after(0, self.update_gui, frame_tk)
-            
-            time.sleep(0.03)  # ~30 FPS
+            # Hand the frame to the display; the Tk thread picks up the newest one on its own schedule
+            self.frame_buffer.publish(frame)
     
-    def update_gui(self, frame_tk):
-        """Update GUI elements (must be called from main thread)"""
-        # Update video display
-        self.video_label.config(image=frame_tk)
-        self.video_label.image = frame_tk  # Keep a reference
+    def update_gui(self):
+        """Display tick on the Tk thread, rescheduled at a fixed rate independent of detection"""
+        image = self.frame_buffer.take()
+        if image is not None:
+            if self.display_image is None or (self.display_image.width(), self.display_image.height()) != image.size:
+                self.display_image = ImageTk.PhotoImage(image=image)
+                self.video_label.config(image=self.display_image)
+            else:
+                # Copies pixels into the existing Tk image; no new PhotoImage per frame
+                self.display_image.paste(image)
         
-        if self.running:
+        status = (self.running, self.attention_status, self.attention_percentage)
+        if self.running and status != self.displayed_status:
             # Update status
             color = "green" if self.attention_status == "Paying Attention" else "red"
             self.status_label.config(text=f"Status: {self.attention_status}", foreground=color)
             self.percentage_label.config(text=f"Attention: {self.attention_percentage}%")
             self.progress_bar['value'] = self.attention_percentage
+        self.displayed_status = status
+        
+        self.root.after(self.display_interval_ms, self.update_gui)
     
     def print_stats_periodically(self):
         """Print attention statistics every 2 seconds"""
@@ -336,22 +276,16 @@ class AttentionDetector:
         )
 
         payload = {
+            "session_id": self.current_session_id,
             "seconds_focused": int(self.focused_seconds),        
             "seconds_distracted": int(self.distracted_seconds),  
             "avg_attention": float(avg_attention),
             "samples_count": int(len(self.attention_percentages)),
         }
 
-        try:
-            r = requests.post(
-                f"{self.api_base}/sessions/attention-summary",
-                json=payload,
-                timeout=5
-            )
-            r.raise_for_status()
-            print("✅ Sent session summary to backend:", r.json())
-        except Exception as e:
-            print(f"❌ Failed to send session summary: {e}")
+        # Local insert only; the outbox's sender thread does the network I/O
+        self.outbox.enqueue(payload)
+        print("📝 Queued session summary for the backend")
 
     def stop_detection(self):
         """Stop the attention detection"""
@@ -387,6 +321,9 @@ class AttentionDetector:
             print("="*60)
             print("No data collected.\n")
         
+        if self.attention_percentages:
+            self.send_attention_summary()
+        
         self.start_button.config(state=tk.NORMAL)
         self.stop_button.config(state=tk.DISABLED)
         self.status_label.config(text="Status: Stopped", foreground="black")
@@ -398,20 +335,31 @@ class AttentionDetector:
         # Start video update thread
         video_thread = threading.Thread(target=self.update_frame, daemon=True)
         video_thread.start()
+        self.update_gui()
         
         # Handle window closing
         def on_closing():
             self.running = False
             if self.cap is not None:
                 self.cap.release()
+            self.outbox.close()
             self.root.destroy()
         
         self.root.protocol("WM_DELETE_WINDOW", on_closing)
         self.root.mainloop()
 
 def main():
+    parser = argparse.ArgumentParser(description="Attention Detector")
+    parser.add_argument("--session-id", default=os.getenv("ATTENTION_SESSION_ID"),
+                        help="study session to report summaries for")
+    parser.add_argument("--api-base", default=os.getenv("ATTENTION_API_BASE", "http://localhost:8000"))
+    parser.add_argument("--display-fps", type=int, default=30, help="video refresh rate, independent of detection")
+    parser.add_argument("--max-fps", type=int, default=30, help="cap on frames captured and scored per second (0: no cap)")
+    args = parser.parse_args()
+    
     root = tk.Tk()
-    app = AttentionDetector(root)
+    app = AttentionDetector(root, session_id=args.session_id, api_base=args.api_base, display_fps=args.display_fps,
+                            max_fps=args.max_fps)
     app.run()
 
 if __name__ == "__main__":
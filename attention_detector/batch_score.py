@@ -0,0 +1,247 @@
+"""
+Offline batch scoring of recorded sessions
+
+Splits every video into fixed-length chunks of frames and scores the chunks
+on a process pool; each worker loads its own cascades and runs OpenCV
+single-threaded, so throughput grows with the number of workers instead of
+fighting over cores. Each finished chunk is written atomically as a
+columnar .npz file, so an interrupted run picks up where it stopped: chunks
+already on disk are skipped. Once all chunks of a video are done they are
+merged into <video>.npz with one entry per scored frame.
+
+Results are tied to the scoring rules: when detection.py changes, the
+previous chunks of a video no longer match its manifest and are re-scored.
+
+    python batch_score.py recordings/*.mp4 --out-dir scores/ --workers 8
+"""
+import argparse
+import glob
+import hashlib
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import cv2
+import numpy as np
+
+from detection import AttentionScorer
+
+_scorer = None
+
+
+def rules_version():
+    """Fingerprint of the scoring rules, stored with the results"""
+    path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "detection.py")
+    with open(path, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()[:16]
+
+
+def _init_worker():
+    global _scorer
+    # One core per worker; parallelism comes from the pool
+    cv2.setNumThreads(1)
+    _scorer = AttentionScorer()
+
+
+def score_chunk(video, start, end, stride, path):
+    """
+    Score frames [start, end) of a video and write them to path
+
+    Args:
+        video: Video file
+        start: First frame
+        end: Frame to stop before, or None to read to the end of the video
+        stride: Score every Nth frame
+        path: Output .npz file
+
+    Returns:
+        Number of frames scored
+    """
+    cap = cv2.VideoCapture(video)
+    fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+    if start:
+        cap.set(cv2.CAP_PROP_POS_FRAMES, start)
+
+    frames, scores, attentive, faces, eyes = [], [], [], [], []
+    index = start
+    try:
+        while end is None or index < end:
+            if (index - start) % stride:
+                if not cap.grab():
+                    break
+                index += 1
+                continue
+            ret, frame = cap.read()
+            if not ret:
+                break
+            result = _scorer.detect(frame, draw=False)
+            frames.append(index)
+            scores.append(min(100, max(0, int(result.score))))
+            attentive.append(result.is_attentive)
+            faces.append(result.face if result.face is not None else (-1, -1, -1, -1))
+            eyes.append(len(result.eyes))
+            index += 1
+    finally:
+        cap.release()
+
+    frame_idx = np.asarray(frames, dtype=np.int64)
+    tmp = path + ".tmp.npz"
+    np.savez(
+        tmp,
+        frame=frame_idx,
+        t=(frame_idx / fps).astype(np.float64),
+        score=np.asarray(scores, dtype=np.uint8),
+        attentive=np.asarray(attentive, dtype=bool),
+        face=np.asarray(faces, dtype=np.int32).reshape(-1, 4),
+        eyes=np.asarray(eyes, dtype=np.uint8),
+    )
+    # Only complete chunks ever appear under their final name
+    os.replace(tmp, path)
+    return len(frames)
+
+
+def plan_video(video, out_dir, chunk_seconds, stride, version):
+    """
+    Work out a video's chunks and reset its results if the manifest is stale
+
+    Returns:
+        (manifest, list of (start, end, chunk path) still to score)
+    """
+    stat = os.stat(video)
+    cap = cv2.VideoCapture(video)
+    if not cap.isOpened():
+        raise IOError(f"Could not open video {video}")
+    fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+    frame_count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    cap.release()
+    chunk_frames = max(1, int(chunk_seconds * fps))
+
+    name = os.path.splitext(os.path.basename(video))[0]
+    key = hashlib.sha1(os.path.abspath(video).encode()).hexdigest()[:8]
+    video_dir = os.path.join(out_dir, f"{name}-{key}")
+    os.makedirs(video_dir, exist_ok=True)
+
+    manifest = {
+        "video": os.path.abspath(video),
+        "size": stat.st_size,
+        "mtime": int(stat.st_mtime),
+        "fps": fps,
+        "frame_count": frame_count,
+        "chunk_frames": chunk_frames,
+        "stride": stride,
+        "rules_version": version,
+    }
+    manifest_path = os.path.join(video_dir, "manifest.json")
+    previous = None
+    if os.path.exists(manifest_path):
+        with open(manifest_path) as f:
+            previous = json.load(f)
+    if previous != manifest:
+        # Different video, settings or scoring rules: nothing on disk can be reused
+        for stale in glob.glob(os.path.join(video_dir, "chunk_*.npz")):
+            os.remove(stale)
+        with open(manifest_path, "w") as f:
+            json.dump(manifest, f, indent=2)
+    manifest["dir"] = video_dir
+
+    # Chunk boundaries are multiples of the stride so striding stays aligned across chunks
+    step = max(stride, chunk_frames - chunk_frames % stride)
+    todo = []
+    # Frame counts from container headers can be off; the last chunk reads to the end
+    starts = list(range(0, max(frame_count, 1), step))
+    manifest["chunks"] = len(starts)
+    for i, start in enumerate(starts):
+        end = starts[i + 1] if i + 1 < len(starts) else None
+        path = os.path.join(video_dir, f"chunk_{start:09d}.npz")
+        if not os.path.exists(path):
+            todo.append((start, end, path))
+    return manifest, todo
+
+
+def merge_video(manifest):
+    """Concatenate a video's chunks into <video>.npz and return its summary"""
+    chunks = sorted(glob.glob(os.path.join(manifest["dir"], "chunk_*.npz")))
+    parts = []
+    for c in chunks:
+        # Each NpzFile keeps its file open until closed
+        with np.load(c) as z:
+            parts.append({k: z[k] for k in z.files})
+    columns = {k: np.concatenate([p[k] for p in parts]) for k in parts[0]} if parts else {}
+    np.savez(manifest["dir"] + ".npz", **columns)
+
+    scored = len(columns.get("frame", ()))
+    if scored == 0:
+        return {"video": manifest["video"], "frames": 0}
+    # Time between two scored frames counts toward the later frame's state
+    deltas = np.diff(columns["t"], prepend=columns["t"][0])
+    return {
+        "video": manifest["video"],
+        "frames": scored,
+        "seconds_focused": round(float(deltas[columns["attentive"]].sum()), 3),
+        "seconds_distracted": round(float(deltas[~columns["attentive"]].sum()), 3),
+        "avg_attention": round(float(columns["score"].mean()), 2),
+    }
+
+
+def run(videos, out_dir, workers=None, chunk_seconds=60.0, stride=1):
+    """
+    Score videos into out_dir, skipping chunks finished by earlier runs
+
+    Returns:
+        List of per-video summaries
+    """
+    version = rules_version()
+    plans = []
+    for video in videos:
+        try:
+            plans.append(plan_video(video, out_dir, chunk_seconds, stride, version))
+        except IOError as e:
+            print(f"❌ {e}")
+
+    tasks = [(m, start, end, path) for m, todo in plans for start, end, path in todo]
+    total_chunks = sum(m["chunks"] for m, _ in plans)
+    print(f"{len(plans)} videos, {len(tasks)} of {total_chunks} chunks to score on {workers or os.cpu_count()} workers")
+
+    started = time.perf_counter()
+    scored = 0
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as pool:
+        futures = {pool.submit(score_chunk, m["video"], start, end, stride, path): path
+                   for m, start, end, path in tasks}
+        for done, future in enumerate(as_completed(futures), 1):
+            try:
+                scored += future.result()
+            except Exception as e:
+                print(f"❌ Chunk {futures[future]} failed: {e}")
+                continue
+            elapsed = time.perf_counter() - started
+            print(f"[{done}/{len(tasks)}] {scored} frames, {scored / elapsed:.0f} fps")
+
+    summaries = []
+    for manifest, _ in plans:
+        if len(glob.glob(os.path.join(manifest["dir"], "chunk_*.npz"))) < manifest["chunks"]:
+            print(f"⚠️  {manifest['video']} is incomplete; run again to resume")
+            continue
+        summary = merge_video(manifest)
+        summaries.append(summary)
+        print(json.dumps(summary))
+    return summaries
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Score recorded videos on all cores")
+    parser.add_argument("videos", nargs="+", help="video files")
+    parser.add_argument("--out-dir", default="scores", help="directory for per-chunk and merged results")
+    parser.add_argument("--workers", type=int, help="worker processes (default: one per core)")
+    parser.add_argument("--chunk-seconds", type=float, default=60.0,
+                        help="length of the time ranges long videos are split into")
+    parser.add_argument("--stride", type=int, default=1, help="score every Nth frame")
+    args = parser.parse_args()
+
+    run(args.videos, args.out_dir, workers=args.workers, chunk_seconds=args.chunk_seconds, stride=args.stride)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
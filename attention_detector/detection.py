@@ -0,0 +1,127 @@
+"""
+Attention scoring shared by the Tk app and the headless runner
+
+Scores a BGR frame from the largest detected face and the eyes inside it:
+- Presence of a face (30 points)
+- Face centered horizontally (0-25 points)
+- Face centered vertically (0-20 points)
+- Eyes detected (0-25 points)
+- Optimal face size (0-10 points)
+"""
+import cv2
+
+ATTENTION_THRESHOLD = 60
+
+
+class DetectionResult:
+    __slots__ = ("is_attentive", "score", "face", "eyes")
+
+    def __init__(self, is_attentive=False, score=0, face=None, eyes=()):
+        self.is_attentive = is_attentive
+        self.score = score
+        self.face = face        # (x, y, w, h) of the largest face, or None
+        self.eyes = eyes        # eye boxes relative to the face
+
+    def to_dict(self):
+        return {
+            "attentive": self.is_attentive,
+            "score": int(self.score),
+            "face": [int(v) for v in self.face] if self.face is not None else None,
+            "eyes": len(self.eyes),
+        }
+
+
+class AttentionScorer:
+    def __init__(self, threshold=ATTENTION_THRESHOLD):
+        self.threshold = threshold
+        self.face_cascade = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
+        self.eye_cascade = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_eye.xml')
+
+    def detect(self, frame, draw=True):
+        """
+        Score one BGR frame
+
+        Args:
+            frame: BGR image; face and eye boxes are drawn onto it when draw is set
+            draw: Whether to draw the overlays
+        """
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+
+        # Detect faces
+        faces = self.face_cascade.detectMultiScale(gray, 1.3, 5)
+
+        if len(faces) == 0:
+            return DetectionResult()  # No face detected
+
+        # Get the largest face (assuming it's the main person)
+        largest_face = max(faces, key=lambda rect: rect[2] * rect[3])
+        x, y, w, h = largest_face
+
+        # Draw face rectangle
+        if draw:
+            cv2.rectangle(frame, (x, y), (x+w, y+h), (255, 0, 0), 2)
+
+        # Region of Interest for eyes
+        roi_gray = gray[y:y+h, x:x+w]
+        roi_color = frame[y:y+h, x:x+w]
+
+        # Detect eyes
+        eyes = self.eye_cascade.detectMultiScale(roi_gray, 1.1, 3)
+        eye_count = len(eyes)
+
+        # Face position and size (center and size relative to frame)
+        frame_height, frame_width = frame.shape[:2]
+        face_center_x = x + w // 2
+        face_center_y = y + h // 2
+
+        # Check if face is centered (within 30% of center)
+        center_threshold = 0.3
+        x_center_offset = abs(face_center_x - frame_width // 2) / (frame_width // 2)
+        y_center_offset = abs(face_center_y - frame_height // 2) / (frame_height // 2)
+
+        # Face size (should be reasonable, not too small or too large)
+        face_area = w * h
+        frame_area = frame_width * frame_height
+        face_ratio = face_area / frame_area
+
+        # Calculate attention based on multiple factors
+        factors = {
+            'face_detected': 30,  # Base score for having a face
+            'face_centered_x': 0,
+            'face_centered_y': 0,
+            'eyes_detected': 0,
+            'face_size': 0
+        }
+
+        # Face centered score (x-axis)
+        if x_center_offset < center_threshold:
+            factors['face_centered_x'] = 25
+        elif x_center_offset < 0.5:
+            factors['face_centered_x'] = 15
+
+        # Face centered score (y-axis)
+        if y_center_offset < center_threshold:
+            factors['face_centered_y'] = 20
+        elif y_center_offset < 0.5:
+            factors['face_centered_y'] = 10
+
+        # Eyes detected score
+        if eye_count >= 2:
+            factors['eyes_detected'] = 25
+            # Draw eye rectangles
+            if draw:
+                for (ex, ey, ew, eh) in eyes:
+                    cv2.rectangle(roi_color, (ex, ey), (ex+ew, ey+eh), (0, 255, 0), 2)
+        elif eye_count == 1:
+            factors['eyes_detected'] = 10
+
+        # Face size score (optimal size is around 10-30% of frame)
+        if 0.05 < face_ratio < 0.40:
+            factors['face_size'] = 10
+        elif 0.02 < face_ratio < 0.50:
+            factors['face_size'] = 5
+
+        attention_score = sum(factors.values())
+
+        # Determine if paying attention (threshold: 60%)
+        return DetectionResult(attention_score >= self.threshold, attention_score, tuple(largest_face), eyes)
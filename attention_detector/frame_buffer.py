@@ -0,0 +1,59 @@
+"""
+Triple-buffered frame hand-off from the capture thread to the Tk thread
+
+The capture thread converts each frame into the "back" buffer and
+publishes it; the display tick takes the most recent published frame as
+its "front" buffer. Frames published between two ticks replace each other,
+so a slow display drops frames instead of queueing them, and neither side
+ever waits for the other or allocates per frame.
+"""
+import threading
+
+import cv2
+import numpy as np
+from PIL import Image
+
+
+class FrameBuffer:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._buffers = None
+        self._views = None
+        self._back, self._pending, self._front = 0, 1, 2
+        self._ready = False
+        self.size = None
+        self.published = 0
+        self.displayed = 0
+
+    def _allocate(self, height, width):
+        self._buffers = [np.empty((height, width, 4), dtype=np.uint8) for _ in range(3)]
+        # RGBA views share memory with the arrays, so they never need rebuilding
+        self._views = [Image.frombuffer("RGBA", (width, height), buf, "raw", "RGBA", 0, 1) for buf in self._buffers]
+        self.size = (width, height)
+
+    def publish(self, frame_bgr):
+        """Capture thread: convert a BGR frame into the back buffer and make it current"""
+        height, width = frame_bgr.shape[:2]
+        if self.size != (width, height):
+            with self._lock:
+                self._allocate(height, width)
+                self._ready = False
+        cv2.cvtColor(frame_bgr, cv2.COLOR_BGR2RGBA, dst=self._buffers[self._back])
+        with self._lock:
+            self._back, self._pending = self._pending, self._back
+            self._ready = True
+            self.published += 1
+
+    def take(self):
+        """
+        Display thread: the newest frame as a PIL image, or None if nothing
+        new was published since the last call. The image stays valid until
+        the next call.
+        """
+        with self._lock:
+            if not self._ready:
+                return None
+            self._front, self._pending = self._pending, self._front
+            self._ready = False
+            self.displayed += 1
+            return self._views[self._front]
@@ -0,0 +1,161 @@
+"""
+Headless attention detection
+
+Scores frames from a webcam, a recorded video, an image directory or a
+synthetic generator with the same detector as the desktop app, without a
+window. Offline sources run at full speed by default (no sleeps, no
+drawing), so recorded sessions are processed much faster than real time.
+Writes one JSON object per scored frame, then a summary line.
+
+    python headless.py recording.mp4 --output scores.jsonl
+    python headless.py frames/ --fps 15 --summary-only
+    python headless.py webcam --session-id <session_id>
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+from detection import AttentionScorer
+from frame_sources import open_source
+
+
+class HeadlessRunner:
+    """
+    Args:
+        source: Frame source (see frame_sources)
+        scorer: AttentionScorer to use; a new one by default
+        output: Text stream for JSON lines, or None to only compute the summary
+        realtime: Pace offline sources at their nominal frame rate
+        max_frames: Stop after this many scored frames
+    """
+
+    def __init__(self, source, scorer=None, output=None, realtime=False, max_frames=None):
+        self.source = source
+        self.scorer = scorer or AttentionScorer()
+        self.output = output
+        self.realtime = realtime
+        self.max_frames = max_frames
+
+    def run(self):
+        """
+        Score every frame from the source
+
+        Returns:
+            Summary dict with focus/distraction time (media time), average
+            attention and processing throughput
+        """
+        frames = 0
+        focused = distracted = 0.0
+        score_total = 0
+        last_ts = None
+        first_ts = None
+        write = self.output.write if self.output is not None else None
+        pace = self.realtime and not self.source.live
+        started = time.perf_counter()
+
+        for ts, frame in self.source:
+            if first_ts is None:
+                first_ts = ts
+            if pace:
+                delay = started + (ts - first_ts) - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+            result = self.scorer.detect(frame, draw=False)
+            score = min(100, max(0, int(result.score)))
+
+            if last_ts is not None:
+                # Time since the previous scored frame counts toward this frame's state
+                if result.is_attentive:
+                    focused += ts - last_ts
+                else:
+                    distracted += ts - last_ts
+            last_ts = ts
+            frames += 1
+            score_total += score
+
+            if write is not None:
+                record = result.to_dict()
+                record["score"] = score
+                write(json.dumps(dict(frame=frames - 1, t=round(ts, 3), **record), separators=(",", ":")))
+                write("\n")
+            if self.max_frames is not None and frames >= self.max_frames:
+                break
+
+        elapsed = time.perf_counter() - started
+        media_seconds = (last_ts - first_ts) if frames > 1 else 0.0
+        return {
+            "frames": frames,
+            "seconds_focused": round(focused, 3),
+            "seconds_distracted": round(distracted, 3),
+            "avg_attention": round(score_total / frames, 2) if frames else 0.0,
+            "media_seconds": round(media_seconds, 3),
+            "wall_seconds": round(elapsed, 3),
+            "frames_per_second": round(frames / elapsed, 1) if elapsed > 0 else 0.0,
+            "speedup": round(media_seconds / elapsed, 1) if elapsed > 0 else 0.0,
+        }
+
+
+def report_summary(summary, session_id, api_base):
+    """Queue the run's summary for a study session through the durable outbox"""
+    from summary_outbox import SummaryOutbox
+
+    outbox = SummaryOutbox(api_base)
+    outbox.enqueue({
+        "session_id": session_id,
+        "seconds_focused": int(summary["seconds_focused"]),
+        "seconds_distracted": int(summary["seconds_distracted"]),
+        "avg_attention": float(summary["avg_attention"]),
+        "samples_count": int(summary["frames"]),
+    })
+    outbox.close(timeout=5.0)
+    print(f"📝 Queued session summary for the backend ({outbox.pending_count()} still pending)", file=sys.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Headless attention detection")
+    parser.add_argument("source", help='"webcam[:index]", "synthetic", an image directory or a video file')
+    parser.add_argument("--output", "-o", help="JSON-lines file for per-frame scores (default: stdout)")
+    parser.add_argument("--summary-only", action="store_true", help="skip per-frame output")
+    parser.add_argument("--stride", type=int, default=1, help="score every Nth frame of a video or image directory")
+    parser.add_argument("--fps", type=float, default=30.0, help="frame rate of image directories and synthetic frames")
+    parser.add_argument("--frames", type=int, default=300, help="number of synthetic frames")
+    parser.add_argument("--max-frames", type=int, help="stop after this many scored frames")
+    parser.add_argument("--realtime", action="store_true",
+                        help="pace offline sources at their frame rate instead of running at full speed")
+    parser.add_argument("--session-id", default=os.getenv("ATTENTION_SESSION_ID"),
+                        help="study session to report the summary for")
+    parser.add_argument("--api-base", default=os.getenv("ATTENTION_API_BASE", "http://localhost:8000"))
+    args = parser.parse_args()
+
+    try:
+        source = open_source(args.source, stride=args.stride, fps=args.fps, frames=args.frames)
+    except IOError as e:
+        print(f"❌ {e}", file=sys.stderr)
+        return 1
+
+    output = open(args.output, "w") if args.output else sys.stdout
+    try:
+        runner = HeadlessRunner(source, output=None if args.summary_only else output,
+                                realtime=args.realtime, max_frames=args.max_frames)
+        summary = runner.run()
+        # The summary is the last line of the stream
+        output.write(json.dumps({"summary": summary}) + "\n")
+    except KeyboardInterrupt:
+        return 130
+    finally:
+        source.close()
+        if output is not sys.stdout:
+            output.close()
+
+    print(f"Scored {summary['frames']} frames in {summary['wall_seconds']}s "
+          f"({summary['frames_per_second']} fps, {summary['speedup']}x real time)", file=sys.stderr)
+
+    if args.session_id and summary["frames"]:
+        report_summary(summary, args.session_id, args.api_base)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,180 @@
+"""
+Write-behind outbox for attention summaries
+Summaries are written to a local SQLite file (a single small insert, no
+network) and a background thread delivers them to the backend in batches.
+Every summary carries an idempotency key, so re-sending after a timeout or
+crash can't apply it twice. Rows are only deleted once the backend
+confirmed them; summaries it rejects for good are kept as "dead" rows.
+"""
+import json
+import os
+import random
+import sqlite3
+import threading
+import time
+import uuid
+
+import requests
+from requests.adapters import HTTPAdapter
+
+PENDING = "pending"
+DEAD = "dead"
+
+# Worth retrying later: server trouble, throttling, or a backend that doesn't
+# have the batch endpoint yet (404/405 from the route itself)
+RETRYABLE_STATUS = (404, 405, 408, 429)
+
+
+class DeliveryError(Exception):
+    """The backend answered, but not every summary in the batch was acknowledged"""
+
+
+class SummaryOutbox:
+    def __init__(self, api_base, path=None, batch_size=50, max_backoff=300.0, timeout=5.0):
+        self.api_base = api_base.rstrip("/")
+        self.path = path or os.path.join(os.path.expanduser("~"), ".attention_detector", "outbox.db")
+        self.batch_size = batch_size
+        self.max_backoff = max_backoff
+        self.timeout = timeout
+
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS outbox ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, "
+            "idempotency_key TEXT NOT NULL UNIQUE, "
+            "payload TEXT NOT NULL, "
+            "status TEXT NOT NULL DEFAULT 'pending', "
+            "attempts INTEGER NOT NULL DEFAULT 0, "
+            "last_error TEXT, "
+            "created_at REAL NOT NULL)"
+        )
+
+        # Pooled keep-alive connections to the backend
+        self._http = requests.Session()
+        self._http.mount("http://", HTTPAdapter(pool_connections=1, pool_maxsize=2))
+        self._http.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=2))
+
+        self._wakeup = threading.Event()
+        self._stopped = False
+        self._thread = threading.Thread(target=self._send_loop, name="summary-outbox", daemon=True)
+        self._thread.start()
+
+    def enqueue(self, payload):
+        """Store a summary durably and return immediately; returns its idempotency key"""
+        key = str(uuid.uuid4())
+        with self._lock:
+            self._db.execute(
+                "INSERT INTO outbox (idempotency_key, payload, created_at) VALUES (?, ?, ?)",
+                (key, json.dumps(payload), time.time()),
+            )
+        self._wakeup.set()
+        return key
+
+    def pending_count(self):
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM outbox WHERE status = ?", (PENDING,)).fetchone()[0]
+
+    def close(self, timeout=2.0):
+        """Give pending summaries a short chance to go out; the rest stay on disk for the next run"""
+        self._stopped = True
+        self._wakeup.set()
+        self._thread.join(timeout)
+
+    # Sender thread
+
+    def _send_loop(self):
+        failures = 0
+        while True:
+            try:
+                sent = self._send_batch()
+                failures = 0
+            except requests.RequestException as e:
+                failures += 1
+                sent = 0
+                print(f"⚠️  Could not reach backend ({self.pending_count()} summaries queued): {e}")
+            except Exception as e:
+                # Unexpected responses or local database errors mustn't kill the sender
+                failures += 1
+                sent = 0
+                print(f"⚠️  Sending session summaries failed, will retry: {type(e).__name__}: {e}")
+            if self._stopped:
+                return
+            if sent == self.batch_size:
+                continue
+            if failures:
+                # Exponential backoff with jitter, capped
+                delay = min(self.max_backoff, 2 ** failures) * random.uniform(0.5, 1.0)
+            else:
+                delay = None
+            self._wakeup.wait(delay)
+            self._wakeup.clear()
+
+    def _send_batch(self):
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT id, idempotency_key, payload FROM outbox WHERE status = ? ORDER BY id LIMIT ?",
+                (PENDING, self.batch_size),
+            ).fetchall()
+        if not rows:
+            return 0
+
+        self._deliver(rows)
+        return len(rows)
+
+    def _deliver(self, rows):
+        items = [dict(json.loads(payload), idempotency_key=key) for _, key, payload in rows]
+        try:
+            r = self._http.post(
+                f"{self.api_base}/sessions/attention-summary/batch",
+                json={"items": items},
+                timeout=self.timeout,
+            )
+        except requests.RequestException:
+            self._record_attempt([row[0] for row in rows], "network error")
+            raise
+        if r.status_code >= 500 or r.status_code in RETRYABLE_STATUS:
+            self._record_attempt([row[0] for row in rows], f"HTTP {r.status_code}")
+            r.raise_for_status()
+        if r.status_code >= 400:
+            if len(rows) > 1:
+                # One bad summary fails the whole batch: resend one by one to isolate it
+                for row in rows:
+                    self._deliver([row])
+                return
+            # Rejected for good (e.g. invalid payload): keep it for inspection
+            self._mark_dead([rows[0][0]], f"HTTP {r.status_code}: {r.text[:200]}")
+            print(f"❌ Backend rejected a session summary: HTTP {r.status_code}")
+            return
+
+        results = {res["idempotency_key"]: res["status"] for res in r.json()["results"]}
+        delivered = [row_id for row_id, key, _ in rows if results.get(key) in ("applied", "duplicate")]
+        rejected = [row_id for row_id, key, _ in rows if results.get(key) not in (None, "applied", "duplicate")]
+        missing = [row_id for row_id, key, _ in rows if key not in results]
+        with self._lock:
+            self._db.executemany("DELETE FROM outbox WHERE id = ?", [(i,) for i in delivered])
+        if rejected:
+            self._mark_dead(rejected, "session not found")
+        if delivered:
+            print(f"✅ Sent {len(delivered)} session summaries to backend")
+        if missing:
+            # Left pending; failing the attempt makes the sender back off instead of resending at once
+            self._record_attempt(missing, "not acknowledged")
+            raise DeliveryError(f"{len(missing)} summaries were not acknowledged by the backend")
+
+    def _record_attempt(self, ids, error):
+        with self._lock:
+            self._db.executemany(
+                "UPDATE outbox SET attempts = attempts + 1, last_error = ? WHERE id = ?",
+                [(error, i) for i in ids],
+            )
+
+    def _mark_dead(self, ids, error):
+        with self._lock:
+            self._db.executemany(
+                "UPDATE outbox SET status = ?, last_error = ? WHERE id = ?",
+                [(DEAD, error, i) for i in ids],
+            )
@@ -0,0 +1,20 @@
+from app.config import Settings
+from app.services.metrics import metrics
+
+GEMINI_BUCKETS = (0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+GEMINI_SECONDS = metrics.histogram(
+    "gemini_request_seconds", "Gemini call duration (streams: until the last chunk)", ("call",), GEMINI_BUCKETS)
+GEMINI_FIRST_CHUNK_SECONDS = metrics.histogram(
+    "gemini_first_chunk_seconds", "Time until a Gemini stream produced its first chunk", ("call",), GEMINI_BUCKETS)
+GEMINI_REQUESTS = metrics.counter("gemini_requests_total", "Gemini calls by outcome", ("call", "outcome"))
+
+def create_gemini_client():
+    """Gemini client (optional - only initialized if API key is available)"""
+    if not Settings.GEMINI_API_KEY:
+        return None
+    try:
+        from google import genai
+        return genai.Client(api_key=Settings.GEMINI_API_KEY)
+    except Exception as e:
+        print(f"Warning: Could not initialize Gemini client: {e}")
+        return None
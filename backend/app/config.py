@@ -8,6 +8,89 @@ ENV_PATH = BASE_DIR / ".env"
 load_dotenv(ENV_PATH)
 
 class Settings:
-    DATABASE_URL = os.getenv("DATABASE_URL")                # Supabase URL
+    # "central": everything in DATABASE_URL (Supabase); "embedded": a local
+    # SQLite file, optionally synced to DATABASE_URL in the background
+    STORAGE_MODE = os.getenv("STORAGE_MODE", "central")
+    SQLITE_PATH = Path(os.getenv("SQLITE_PATH", BASE_DIR / "data" / "companion.db"))
+    if STORAGE_MODE == "embedded":
+        DATABASE_URL = f"sqlite:///{SQLITE_PATH}"
+        SYNC_DATABASE_URL = os.getenv("SYNC_DATABASE_URL", os.getenv("DATABASE_URL"))
+    else:
+        DATABASE_URL = os.getenv("DATABASE_URL")            # Supabase URL
+        SYNC_DATABASE_URL = None
+    SYNC_INTERVAL = float(os.getenv("SYNC_INTERVAL", "5"))            # seconds between sync batches
+    SYNC_BATCH_SIZE = int(os.getenv("SYNC_BATCH_SIZE", "500"))
+    DATABASE_REPLICA_URL = os.getenv("DATABASE_REPLICA_URL")  # optional read replica
     GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
     BACKEND_HOSTS = ["http://localhost:5173", "http://localhost:3000"]
+
+    # Database connection pool
+    DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+    DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "5"))
+    DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))          # seconds to wait for a connection
+    DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))          # seconds; -1 = never
+    DB_PRE_PING = os.getenv("DB_PRE_PING", "idle")                       # "idle", "always" or "never"
+    DB_IDLE_PING_AFTER = float(os.getenv("DB_IDLE_PING_AFTER", "60"))    # seconds idle before "idle" pings
+    DB_REPLICA_STICKY_SECONDS = float(os.getenv("DB_REPLICA_STICKY_SECONDS", "5"))  # reads stay on primary after a write
+    DB_REPLICA_RETRY_AFTER = float(os.getenv("DB_REPLICA_RETRY_AFTER", "30"))       # seconds before retrying a failed replica
+
+    # Services loaded in the background after startup (comma separated; empty = load on first use)
+    WARMUP_SERVICES = [s for s in os.getenv(
+        "WARMUP_SERVICES", "attention_detector_service,music_service,gemini_client,visualization_job_queue"
+    ).split(",") if s]
+
+    # Admin endpoints (/admin/*) are disabled unless a token is set
+    ADMIN_TOKEN = os.getenv("ADMIN_TOKEN")
+    PROFILER_MAX_SECONDS = float(os.getenv("PROFILER_MAX_SECONDS", "60"))
+
+    # Request tracing: share of requests traced, finished traces kept for
+    # /admin/traces, and an optional file to append them to as OTLP/JSON lines
+    TRACING_SAMPLE_RATE = float(os.getenv("TRACING_SAMPLE_RATE", "0.1"))
+    TRACING_BUFFER_SIZE = int(os.getenv("TRACING_BUFFER_SIZE", "200"))
+    TRACING_EXPORT_PATH = os.getenv("TRACING_EXPORT_PATH") or None
+
+    # Attention detection: frames whose downsampled image differs from the last
+    # analyzed one by less than ATTENTION_CHANGE_THRESHOLD gray levels (mean
+    # absolute difference, 0 disables) reuse its result, for at most
+    # ATTENTION_REFRESH_SECONDS before a full detection is forced
+    ATTENTION_CHANGE_THRESHOLD = float(os.getenv("ATTENTION_CHANGE_THRESHOLD", "1.5"))
+    ATTENTION_REFRESH_SECONDS = float(os.getenv("ATTENTION_REFRESH_SECONDS", "2"))
+
+    # Face detector backend: "haar" cascades, or "dnn" (OpenCV DNN SSD face
+    # model, e.g. res10_300x300_ssd_iter_140000.caffemodel + deploy.prototxt);
+    # falls back to haar if the model files are missing
+    FACE_DETECTOR = os.getenv("FACE_DETECTOR", "haar")
+    FACE_DNN_MODEL = Path(os.getenv("FACE_DNN_MODEL", BASE_DIR / "models" / "res10_300x300_ssd_iter_140000.caffemodel"))
+    FACE_DNN_CONFIG = os.getenv("FACE_DNN_CONFIG", str(BASE_DIR / "models" / "deploy.prototxt"))  # empty if not needed
+    FACE_DNN_INPUT_SIZE = int(os.getenv("FACE_DNN_INPUT_SIZE", "300"))
+    FACE_DNN_CONFIDENCE = float(os.getenv("FACE_DNN_CONFIDENCE", "0.5"))
+    FACE_DETECTOR_THREADS = int(os.getenv("FACE_DETECTOR_THREADS", "0"))      # OpenCV threads; 0 = default
+    FACE_BATCH_MAX = int(os.getenv("FACE_BATCH_MAX", "8"))                    # frames per DNN forward pass
+    FACE_BATCH_WAIT_MS = float(os.getenv("FACE_BATCH_WAIT_MS", "0"))          # hold a batch open for more streams
+
+    # Visualization analysis jobs
+    VISUALIZATION_MAX_WORKERS = int(os.getenv("VISUALIZATION_MAX_WORKERS", "2"))
+    VISUALIZATION_MAX_PENDING = int(os.getenv("VISUALIZATION_MAX_PENDING", "32"))
+    VISUALIZATION_CACHE_TTL = int(os.getenv("VISUALIZATION_CACHE_TTL", "600"))      # seconds
+
+    # Music playback state
+    MUSIC_SESSION_IDLE_TTL = int(os.getenv("MUSIC_SESSION_IDLE_TTL", "3600"))   # seconds
+    MUSIC_MAX_SESSIONS = int(os.getenv("MUSIC_MAX_SESSIONS", "10000"))
+    MUSIC_PERSIST_STATE = os.getenv("MUSIC_PERSIST_STATE", "false").lower() == "true"
+    MUSIC_ADAPTATION_ENABLED = os.getenv("MUSIC_ADAPTATION_ENABLED", "true").lower() == "true"
+    MUSIC_ADAPT_DUCK_AFTER = float(os.getenv("MUSIC_ADAPT_DUCK_AFTER", "10"))        # seconds distracted
+    MUSIC_ADAPT_SWITCH_AFTER = float(os.getenv("MUSIC_ADAPT_SWITCH_AFTER", "120"))   # seconds distracted
+    MUSIC_ADAPT_MIN_INTERVAL = float(os.getenv("MUSIC_ADAPT_MIN_INTERVAL", "15"))    # seconds between changes
+    MUSIC_BACKEND = os.getenv("MUSIC_BACKEND", "youtube")                        # "youtube" or "local"
+
+    # Pomodoro scheduler
+    POMODORO_WORK_MINUTES = int(os.getenv("POMODORO_WORK_MINUTES", "25"))
+    POMODORO_SHORT_BREAK_MINUTES = int(os.getenv("POMODORO_SHORT_BREAK_MINUTES", "5"))
+    POMODORO_LONG_BREAK_MINUTES = int(os.getenv("POMODORO_LONG_BREAK_MINUTES", "15"))
+    POMODORO_LONG_BREAK_EVERY = int(os.getenv("POMODORO_LONG_BREAK_EVERY", "4"))     # work phases
+    POMODORO_PERSIST = os.getenv("POMODORO_PERSIST", "false").lower() == "true"
+    POMODORO_FLUSH_INTERVAL = float(os.getenv("POMODORO_FLUSH_INTERVAL", "2"))      # seconds
+
+    # Local audio engine
+    AUDIO_ASSETS_DIR = Path(os.getenv("AUDIO_ASSETS_DIR", BASE_DIR / "audio"))   # pre-transcoded tracks
+    AUDIO_STREAM_CHUNK_BYTES = int(os.getenv("AUDIO_STREAM_CHUNK_BYTES", str(64 * 1024)))
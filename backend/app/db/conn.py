@@ -1,21 +1,321 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
+from sqlalchemy.exc import DisconnectionError
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import QueuePool
+from collections import deque
 from contextlib import contextmanager
+from typing import Optional
+import threading
+import time
 from app.config import Settings
+from app.db.routing import RoutingSession, replica_router
+from app.services.metrics import metrics
+from app.services.tracing import CLIENT, tracer
 
-# Use SSL with Supabase; connection pooling is fine for FastAPI
-engine = create_engine(
-    Settings.DATABASE_URL,
-    pool_pre_ping=True,
-    pool_size=5,
-    max_overflow=5,
-    echo=False,
-)
-SessionLocal = sessionmaker(bind=engine, autocommit=False, autoflush=False)
+_engine = None
+_engine_lock = threading.Lock()
+_sync = None
+SessionLocal = sessionmaker(class_=RoutingSession, autocommit=False, autoflush=False)
+
+class PoolMetrics:
+    """Checkout waits, usage and connection ages of the engine's pool"""
+
+    def __init__(self, window: int = 1000):
+        self._lock = threading.Lock()
+        self._waits = deque(maxlen=window)      # recent checkout waits, seconds
+        self.checkouts = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        self.timeouts = 0
+        self.connects = 0
+        self.disconnects = 0
+        self.stale_pings = 0
+        self.stale_found = 0
+        self.checked_out = 0
+        self.peak_checked_out = 0
+        self._connected_at = {}                 # id(connection record) -> monotonic time
+
+    def record_wait(self, seconds: float, timed_out: bool = False):
+        with self._lock:
+            self.checkouts += not timed_out
+            self.timeouts += timed_out
+            self.wait_total += seconds
+            self.wait_max = max(self.wait_max, seconds)
+            self._waits.append(seconds)
+
+    def snapshot(self) -> dict:
+        now = time.monotonic()
+        with self._lock:
+            waits = sorted(self._waits)
+            ages = [now - t for t in self._connected_at.values()]
+            return {
+                "checkouts": self.checkouts,
+                "checked_out": self.checked_out,
+                "peak_checked_out": self.peak_checked_out,
+                "timeouts": self.timeouts,
+                "wait_ms": {
+                    "mean": round(self.wait_total / max(self.checkouts + self.timeouts, 1) * 1000, 3),
+                    "p50": round(_percentile(waits, 0.50) * 1000, 3),
+                    "p95": round(_percentile(waits, 0.95) * 1000, 3),
+                    "p99": round(_percentile(waits, 0.99) * 1000, 3),
+                    "max": round(self.wait_max * 1000, 3),
+                },
+                "connections": {
+                    "open": len(ages),
+                    "opened_total": self.connects,
+                    "closed_total": self.disconnects,
+                    "oldest_age_seconds": round(max(ages), 1) if ages else None,
+                    "mean_age_seconds": round(sum(ages) / len(ages), 1) if ages else None,
+                },
+                "stale_check": {"pings": self.stale_pings, "stale_found": self.stale_found},
+            }
+
+def _percentile(sorted_values, q: float) -> float:
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(int(q * len(sorted_values)), len(sorted_values) - 1)]
+
+pool_metrics = PoolMetrics()
+replica_pool_metrics = PoolMetrics()
+
+_POOL_CHECKED_OUT = metrics.gauge("db_pool_checked_out", "Connections currently checked out", ("pool",))
+_POOL_OPEN = metrics.gauge("db_pool_open_connections", "Open connections", ("pool",))
+_POOL_TIMEOUTS = metrics.gauge("db_pool_checkout_timeouts", "Checkouts that timed out waiting for a connection", ("pool",))
+for _name, _pool in (("primary", pool_metrics), ("replica", replica_pool_metrics)):
+    _POOL_CHECKED_OUT.labels(_name).set_function(lambda m=_pool: m.checked_out)
+    _POOL_OPEN.labels(_name).set_function(lambda m=_pool: len(m._connected_at))
+    _POOL_TIMEOUTS.labels(_name).set_function(lambda m=_pool: m.timeouts)
+
+class InstrumentedQueuePool(QueuePool):
+    """QueuePool that times how long each checkout waits for a connection"""
+
+    metrics = pool_metrics
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except Exception:
+            self.metrics.record_wait(time.perf_counter() - started, timed_out=True)
+            raise
+        self.metrics.record_wait(time.perf_counter() - started)
+        return connection
+
+def _instrument_pool(engine, metrics: PoolMetrics, idle_ping_after: float = None):
+    """
+    Track pool usage and connection ages; with idle_ping_after, ping only
+    connections that sat idle that long instead of on every checkout
+    """
+    @event.listens_for(engine, "connect")
+    def on_connect(dbapi_connection, record):
+        with metrics._lock:
+            metrics.connects += 1
+            metrics._connected_at[id(record)] = time.monotonic()
+
+    @event.listens_for(engine, "close")
+    def on_close(dbapi_connection, record):
+        with metrics._lock:
+            metrics.disconnects += 1
+            metrics._connected_at.pop(id(record), None)
+
+    @event.listens_for(engine, "checkout")
+    def on_checkout(dbapi_connection, record, proxy):
+        with metrics._lock:
+            metrics.checked_out += 1
+            metrics.peak_checked_out = max(metrics.peak_checked_out, metrics.checked_out)
+        idle_since = record.info.get("checked_in_at")
+        if idle_ping_after is None or idle_since is None or time.monotonic() - idle_since < idle_ping_after:
+            return
+        with metrics._lock:
+            metrics.stale_pings += 1
+        try:
+            cursor = dbapi_connection.cursor()
+            cursor.execute("SELECT 1")
+            cursor.close()
+        except Exception as e:
+            with metrics._lock:
+                metrics.stale_found += 1
+                metrics.checked_out -= 1
+            # Makes the pool discard this connection and retry with a fresh one
+            raise DisconnectionError(f"Stale connection after idling: {e}") from e
+
+    @event.listens_for(engine, "checkin")
+    def on_checkin(dbapi_connection, record):
+        with metrics._lock:
+            metrics.checked_out -= 1
+        record.info["checked_in_at"] = time.monotonic()
+
+def _trace_queries(engine):
+    """Record each statement as a span of the current request's trace, if sampled"""
+    system = engine.dialect.name
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def before_execute(conn, cursor, statement, parameters, context, executemany):
+        span = tracer.start_child("db.query", CLIENT, **{
+            "db.system": system,
+            "db.operation": statement.split(None, 1)[0].upper() if statement else "",
+            "db.statement": statement[:500],
+        })
+        if span is not None:
+            conn.info.setdefault("trace_spans", []).append(span)
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def after_execute(conn, cursor, statement, parameters, context, executemany):
+        spans = conn.info.get("trace_spans")
+        if spans:
+            span = spans.pop()
+            if cursor.rowcount is not None and cursor.rowcount >= 0:
+                span.set("db.rows", cursor.rowcount)
+            span.end()
+
+    @event.listens_for(engine, "handle_error")
+    def on_error(context):
+        spans = context.connection.info.get("trace_spans") if context.connection is not None else None
+        if spans:
+            span = spans.pop()
+            span.record_error(context.original_exception)
+            span.end()
+
+# WAL lets readers run alongside the writer; synchronous=NORMAL makes a
+# commit an append to the WAL without an fsync (still crash-safe in WAL mode)
+SQLITE_PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "foreign_keys": "ON",
+    "busy_timeout": "5000",
+    "temp_store": "MEMORY",
+    "cache_size": "-20000",         # KiB
+    "mmap_size": str(256 * 1024 * 1024),
+}
+
+def _configure_sqlite(engine):
+    @event.listens_for(engine, "connect")
+    def set_pragmas(dbapi_connection, record):
+        cursor = dbapi_connection.cursor()
+        for name, value in SQLITE_PRAGMAS.items():
+            cursor.execute(f"PRAGMA {name}={value}")
+        cursor.close()
+
+def _create_engine(url: str, metrics: PoolMetrics):
+    pool_options = {}
+    if url.startswith("sqlite"):
+        pool_options = dict(connect_args={"check_same_thread": False})
+    else:
+        # Use SSL with Supabase; connection pooling is fine for FastAPI
+        pool_options = dict(
+            # Per-engine subclass so each pool reports into its own metrics
+            poolclass=type("InstrumentedQueuePool", (InstrumentedQueuePool,), {"metrics": metrics}),
+            pool_size=Settings.DB_POOL_SIZE,
+            max_overflow=Settings.DB_MAX_OVERFLOW,
+            pool_timeout=Settings.DB_POOL_TIMEOUT,
+            pool_recycle=Settings.DB_POOL_RECYCLE,
+        )
+    engine = create_engine(
+        url,
+        pool_pre_ping=Settings.DB_PRE_PING == "always",
+        echo=False,
+        **pool_options,
+    )
+    if url.startswith("sqlite"):
+        _configure_sqlite(engine)
+    _instrument_pool(engine, metrics, Settings.DB_IDLE_PING_AFTER if Settings.DB_PRE_PING == "idle" else None)
+    _trace_queries(engine)
+    return engine
+
+def _init_embedded(engine):
+    """Create the local schema and start syncing it to the central database"""
+    global _sync
+    from app.db.sync import OutboxSync, install_outbox
+    from app.models import Base
+
+    Settings.SQLITE_PATH.parent.mkdir(parents=True, exist_ok=True)
+    Base.metadata.create_all(engine)
+    if Settings.SYNC_DATABASE_URL:
+        install_outbox(engine)
+        _sync = OutboxSync(engine, Settings.SYNC_DATABASE_URL, Settings.SYNC_INTERVAL, Settings.SYNC_BATCH_SIZE)
+        _sync.start()
+
+def _upgrade_schema(engine):
+    from app.db.migrations import upgrade_schema
+
+    try:
+        upgrade_schema(engine)
+    except Exception as e:
+        # Unreachable database: requests fail on their own; the upgrade runs again on the next start
+        print(f"Schema upgrade skipped: {getattr(e, 'orig', e)}")
+
+def get_engine():
+    """Create the engine on first use; loading the DB driver is slow at import time"""
+    global _engine
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                engine = _create_engine(Settings.DATABASE_URL, pool_metrics)
+                if Settings.STORAGE_MODE == "embedded":
+                    _init_embedded(engine)
+                _upgrade_schema(engine)
+                replica = None
+                if Settings.DATABASE_REPLICA_URL:
+                    replica = _create_engine(Settings.DATABASE_REPLICA_URL, replica_pool_metrics)
+                replica_router.configure(
+                    engine, replica,
+                    sticky_seconds=Settings.DB_REPLICA_STICKY_SECONDS,
+                    retry_after=Settings.DB_REPLICA_RETRY_AFTER,
+                )
+                SessionLocal.configure(bind=engine)
+                _engine = engine
+    return _engine
+
+def _engine_stats(engine, metrics: PoolMetrics) -> dict:
+    pool = engine.pool
+    stats = {
+        "pool": type(pool).__name__,
+        "pre_ping": Settings.DB_PRE_PING,
+        **metrics.snapshot(),
+    }
+    if isinstance(pool, QueuePool):
+        stats.update({
+            "size": pool.size(),
+            "max_overflow": pool._max_overflow,
+            "idle": pool.checkedin(),
+            "overflow_in_use": max(pool.overflow(), 0),
+        })
+    return stats
+
+def pool_stats() -> dict:
+    """Pool configuration, current usage and checkout wait statistics"""
+    if _engine is None:
+        return {"engine": "not created"}
+    stats = _engine_stats(_engine, pool_metrics)
+    if replica_router.replica is not None:
+        stats["replica"] = _engine_stats(replica_router.replica, replica_pool_metrics)
+    stats["routing"] = replica_router.stats()
+    return stats
+
+def sync_stats() -> dict:
+    """Outbox backlog and delivery state of embedded-mode sync"""
+    if _sync is None:
+        return {"enabled": False, "storage_mode": Settings.STORAGE_MODE}
+    return {"enabled": True, "storage_mode": Settings.STORAGE_MODE, **_sync.stats()}
+
+def __getattr__(name):
+    # Keeps `from app.db.conn import engine` working without eager creation
+    if name == "engine":
+        return get_engine()
+    raise AttributeError(name)
 
 @contextmanager
-def db_session():
+def db_session(read_only: bool = False, consistency_key: Optional[str] = None):
+    """
+    Args:
+        read_only: Let every read in this session use the read replica
+        consistency_key: Scope for read-your-writes, e.g. a study session id;
+            reads under the same key stay on the primary shortly after a write
+    """
+    get_engine()
     db = SessionLocal()
+    db.info["read_only_depth"] = int(read_only)
+    db.info["consistency_key"] = consistency_key
     try:
         yield db
         db.commit()
@@ -0,0 +1,40 @@
+"""
+Schema upgrades
+Base.metadata.create_all only creates missing tables, so columns added to
+existing models are brought to already-deployed databases here. Every
+step checks the live schema first and is a no-op once applied, so this
+runs on each engine start-up.
+"""
+from sqlalchemy import inspect, text
+
+from app.models import Base
+
+# (table, column) pairs added after the first deployment; each gets a unique index
+UNIQUE_COLUMNS = [
+    ("session", "idempotency_key"),
+    ("telemetry_events", "idempotency_key"),
+]
+
+
+def upgrade_schema(engine):
+    """Add any missing columns (with their unique indexes) to existing tables"""
+    with engine.begin() as conn:
+        inspector = inspect(conn)
+        tables = set(inspector.get_table_names())
+        quote = conn.dialect.identifier_preparer.quote
+        for table_name, column_name in UNIQUE_COLUMNS:
+            if table_name not in tables:
+                # create_all makes it with the column
+                continue
+            if column_name in {c["name"] for c in inspector.get_columns(table_name)}:
+                continue
+            column = Base.metadata.tables[table_name].c[column_name]
+            print(f"Schema upgrade: adding {table_name}.{column_name}")
+            conn.execute(text(
+                f"ALTER TABLE {quote(table_name)} ADD COLUMN {quote(column_name)} "
+                f"{column.type.compile(dialect=conn.dialect)}"
+            ))
+            conn.execute(text(
+                f"CREATE UNIQUE INDEX IF NOT EXISTS {quote(f'ix_{table_name}_{column_name}')} "
+                f"ON {quote(table_name)} ({quote(column_name)})"
+            ))
@@ -1,10 +1,37 @@
-from typing import Optional
+from typing import Optional, List, Tuple
 from datetime import datetime
+from sqlalchemy import exists, literal, select, union_all, update
 from sqlalchemy.orm import Session as DBSession
 import uuid
 
-from app.models import Session, TelemetryEvent, SessionStatus, Client
+from app.db.routing import read_only
+from app.services.metrics import metrics, timed
+from app.models import Session, TelemetryEvent, SessionStatus, Client, MusicPlayback, PomodoroCycle
 
+_CALL_SECONDS = metrics.histogram("db_repository_seconds", "Repository call duration", ("repository", "method"))
+_CALL_ERRORS = metrics.counter("db_repository_errors_total", "Repository calls that raised", ("repository", "method"))
+
+def _instrumented(cls):
+    """Time every repository method and count the ones that raise"""
+    for name, attr in list(vars(cls).items()):
+        if isinstance(attr, staticmethod):
+            labels = (cls.__name__, name)
+            fn = timed(_CALL_SECONDS.labels(*labels), _CALL_ERRORS.labels(*labels))(attr.__func__)
+            setattr(cls, name, staticmethod(fn))
+    return cls
+
+def _upsert(db: DBSession, model):
+    """Dialect-specific INSERT supporting ON CONFLICT, or None if the dialect has none"""
+    dialect = db.get_bind().dialect.name
+    if dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    elif dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        return None
+    return insert(model)
+
+@_instrumented
 class SessionRepository:
     @staticmethod
     def create(db: DBSession, client_id: uuid.UUID, session_topic: str) -> Session:
@@ -17,29 +44,146 @@ class SessionRepository:
         return session
     
     @staticmethod
+    def create_idempotent(db: DBSession, client_id: uuid.UUID, session_topic: str,
+                          idempotency_key: Optional[str] = None) -> Tuple[Session, bool]:
+        """
+        Create a session, or return the one an earlier request with the same
+        idempotency key created, in a single INSERT ... ON CONFLICT ... RETURNING
+        
+        Returns:
+            (session, created) where created is False for a replayed request
+        """
+        stmt = _upsert(db, Session) if idempotency_key else None
+        if stmt is None:
+            return SessionRepository.create(db, client_id, session_topic), True
+        
+        session_id = uuid.uuid4()
+        stmt = stmt.values(
+            session_id=session_id,
+            client_id=client_id,
+            session_topic=session_topic,
+            idempotency_key=idempotency_key,
+        )
+        # A no-op update (rather than DO NOTHING) makes RETURNING yield the existing row
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[Session.idempotency_key],
+            set_={"idempotency_key": stmt.excluded.idempotency_key},
+        )
+        session = db.scalars(
+            stmt.returning(Session), execution_options={"populate_existing": True}
+        ).one()
+        return session, session.session_id == session_id
+    
+    @staticmethod
+    def apply_attention_summary(db: DBSession, session_id: uuid.UUID, seconds_focused: int,
+                                seconds_distracted: int, avg_attention: float,
+                                idempotency_key: Optional[str] = None) -> Optional[Tuple[dict, bool]]:
+        """
+        Store a session's attention summary and record a telemetry event
+        
+        On PostgreSQL the update, the telemetry insert and reading the result
+        back are one statement (data-modifying CTEs). A request whose
+        idempotency key was already applied changes nothing and gets the
+        current values back.
+        
+        Returns:
+            (summary, applied), or None if the session doesn't exist
+        """
+        columns = (Session.session_id, Session.seconds_focused, Session.seconds_distracted, Session.avg_attention)
+        stmt = update(Session).where(Session.session_id == session_id)
+        if idempotency_key:
+            stmt = stmt.where(~exists().where(TelemetryEvent.idempotency_key == idempotency_key))
+        stmt = stmt.values(
+            seconds_focused=seconds_focused,
+            seconds_distracted=seconds_distracted,
+            avg_attention=avg_attention,
+        ).returning(*columns)
+        
+        if db.get_bind().dialect.name == "postgresql":
+            from sqlalchemy.dialects.postgresql import insert
+            
+            updated = stmt.cte("updated")
+            telemetry = insert(TelemetryEvent).from_select(
+                ["telemetry_id", "session_id", "created_at", "idempotency_key"],
+                select(
+                    literal(uuid.uuid4(), TelemetryEvent.telemetry_id.type),
+                    updated.c.session_id,
+                    literal(datetime.utcnow(), TelemetryEvent.created_at.type),
+                    literal(idempotency_key, TelemetryEvent.idempotency_key.type),
+                ),
+            ).on_conflict_do_nothing().cte("telemetry")
+            # CTEs see the snapshot from before the update, so take the new
+            # values from RETURNING and fall back to the table only when nothing was applied
+            row = db.execute(union_all(
+                select(*updated.c, literal(True).label("applied")),
+                select(*columns, literal(False).label("applied")).where(
+                    Session.session_id == session_id, ~exists(select(updated.c.session_id))
+                ),
+            ).add_cte(telemetry)).first()
+        else:
+            row = db.execute(stmt).first()
+            if row is not None:
+                TelemetryRepository.create(db, session_id, idempotency_key)
+                row = (*row, True)
+            else:
+                row = db.execute(select(*columns, literal(False)).where(Session.session_id == session_id)).first()
+        
+        if row is None:
+            return None
+        session_id, seconds_focused, seconds_distracted, avg_attention, applied = row
+        return {
+            "session_id": session_id,
+            "seconds_focused": seconds_focused,
+            "seconds_distracted": seconds_distracted,
+            "avg_attention": avg_attention,
+        }, bool(applied)
+    
+    @staticmethod
+    @read_only
     def get_current_active(db: DBSession) -> Optional[Session]:
         return db.query(Session).filter(
             Session.status == SessionStatus.ACTIVE
         ).order_by(Session.created_at.desc()).first()
     
     @staticmethod
+    @read_only
     def get_by_id(db: DBSession, session_id: uuid.UUID) -> Optional[Session]:
         return db.query(Session).filter(
             Session.session_id == session_id
         ).first()
+    
+    @staticmethod
+    @read_only
+    def list_history(db: DBSession, client_id: uuid.UUID, limit: int = 50) -> List[Session]:
+        """Most recent sessions of a client, for the history charts"""
+        return db.query(Session).filter(
+            Session.client_id == client_id
+        ).order_by(Session.created_at.desc()).limit(limit).all()
 
+@_instrumented
 class TelemetryRepository:
     @staticmethod
-    def create(db: DBSession, session_id: uuid.UUID) -> TelemetryEvent:
+    def create(db: DBSession, session_id: uuid.UUID, idempotency_key: Optional[str] = None) -> TelemetryEvent:
         telemetry = TelemetryEvent(
             session_id=session_id,
-            created_at=datetime.utcnow()
+            created_at=datetime.utcnow(),
+            idempotency_key=idempotency_key
         )
         db.add(telemetry)
         db.flush()
         return telemetry
 
+@_instrumented
 class ClientRepository:
+    @staticmethod
+    def ensure(db: DBSession, client_id: uuid.UUID, client_name: str = None) -> None:
+        """Create the client if it doesn't exist, without reading it back"""
+        stmt = _upsert(db, Client)
+        if stmt is None:
+            ClientRepository.get_or_create(db, client_id, client_name)
+            return
+        db.execute(stmt.values(client_id=client_id, client_name=client_name).on_conflict_do_nothing())
+    
     @staticmethod
     def get_or_create(db: DBSession, client_id: uuid.UUID, client_name: str = None) -> Client:
         client = db.query(Client).filter(Client.client_id == client_id).first()
@@ -47,4 +191,34 @@ class ClientRepository:
             client = Client(client_id=client_id, client_name=client_name)
             db.add(client)
             db.flush()
-        return client
\ No newline at end of file
+        return client
+
+@_instrumented
+class MusicPlaybackRepository:
+    @staticmethod
+    @read_only
+    def get_many(db: DBSession, session_ids: List[uuid.UUID]) -> List[MusicPlayback]:
+        return db.query(MusicPlayback).filter(
+            MusicPlayback.session_id.in_(session_ids)
+        ).all()
+
+    @staticmethod
+    def upsert_many(db: DBSession, states: List[dict]) -> None:
+        for state in states:
+            db.merge(MusicPlayback(**state))
+        db.flush()
+
+@_instrumented
+class PomodoroCycleRepository:
+    @staticmethod
+    def upsert_many(db: DBSession, cycles: List[dict]) -> None:
+        for cycle in cycles:
+            db.merge(PomodoroCycle(**cycle))
+        db.flush()
+
+    @staticmethod
+    @read_only
+    def list_for_session(db: DBSession, session_id: uuid.UUID) -> List[PomodoroCycle]:
+        return db.query(PomodoroCycle).filter(
+            PomodoroCycle.session_id == session_id
+        ).order_by(PomodoroCycle.started_at).all()
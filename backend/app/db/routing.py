@@ -0,0 +1,185 @@
+"""
+Read replica routing
+Sends the reads of repository methods marked @read_only to a replica
+engine while everything else stays on the primary. Reads go back to the
+primary when:
+- the session already wrote in its transaction,
+- a write committed under the same consistency key, or earlier in the
+  same request, within the last few seconds (read-your-writes), or
+- the replica recently failed (it is retried after a cool-down).
+"""
+import functools
+import threading
+import time
+from contextvars import ContextVar
+from typing import Dict, Optional
+
+from sqlalchemy import event
+from sqlalchemy.exc import InterfaceError, OperationalError
+from sqlalchemy.orm import Session
+
+# Time of the current request's last committed write, in a list so commits
+# made in thread-pool copies of the context still reach the request
+_request_write: ContextVar[Optional[list]] = ContextVar("request_write", default=None)
+
+
+class ReplicaRouter:
+    """Engines to route between, plus recent-write and replica-health state"""
+
+    def __init__(self, sticky_seconds: float = 5.0, retry_after: float = 30.0):
+        self.primary = None
+        self.replica = None
+        self.sticky_seconds = sticky_seconds
+        self.retry_after = retry_after
+        self._last_write: Dict[str, float] = {}
+        self._replica_down_until = 0.0
+        self._lock = threading.Lock()
+        self.replica_reads = 0
+        self.primary_reads = 0
+        self.fallbacks = 0
+
+    def configure(self, primary, replica=None, sticky_seconds: Optional[float] = None,
+                  retry_after: Optional[float] = None):
+        self.primary = primary
+        self.replica = replica
+        if sticky_seconds is not None:
+            self.sticky_seconds = sticky_seconds
+        if retry_after is not None:
+            self.retry_after = retry_after
+
+    def note_write(self, key: Optional[str]):
+        now = time.monotonic()
+        scope = _request_write.get()
+        if scope is None:
+            _request_write.set([now])
+        else:
+            scope[0] = now
+        if not key:
+            return
+        with self._lock:
+            self._last_write[key] = now
+            if len(self._last_write) > 10000:
+                cutoff = now - self.sticky_seconds
+                self._last_write = {k: t for k, t in self._last_write.items() if t >= cutoff}
+
+    def recently_wrote(self, key: Optional[str]) -> bool:
+        """Whether a read should stay on the primary: this request wrote, or someone wrote under key"""
+        now = time.monotonic()
+        scope = _request_write.get()
+        if scope is not None and scope[0] is not None and now - scope[0] < self.sticky_seconds:
+            return True
+        last = self._last_write.get(key) if key else None
+        return last is not None and now - last < self.sticky_seconds
+
+    def replica_available(self) -> bool:
+        return self.replica is not None and time.monotonic() >= self._replica_down_until
+
+    def mark_replica_down(self, error: Exception):
+        print(f"Read replica failed, using the primary for {self.retry_after:.0f}s: {getattr(error, 'orig', error)}")
+        self._replica_down_until = time.monotonic() + self.retry_after
+        self.fallbacks += 1
+
+    def stats(self) -> dict:
+        return {
+            "replica_configured": self.replica is not None,
+            "replica_available": self.replica_available(),
+            "replica_reads": self.replica_reads,
+            "primary_reads": self.primary_reads,
+            "fallbacks": self.fallbacks,
+            "sticky_seconds": self.sticky_seconds,
+        }
+
+
+# Create singleton instance
+replica_router = ReplicaRouter()
+
+
+class RoutingSession(Session):
+    """
+    Session that picks an engine per statement: the replica inside read-only
+    scopes (see read_only and db_session(read_only=True)), the primary otherwise
+    """
+
+    def get_bind(self, mapper=None, clause=None, **kw):
+        router = replica_router
+        if router.primary is None:
+            return super().get_bind(mapper=mapper, clause=clause, **kw)
+        if self.info.get("read_only_depth", 0) <= 0 or getattr(clause, "is_dml", False):
+            return router.primary
+        if (self._flushing or self.info.get("wrote") or not router.replica_available()
+                or router.recently_wrote(self.info.get("consistency_key"))):
+            router.primary_reads += 1
+            return router.primary
+        router.replica_reads += 1
+        self.info["used_replica"] = True
+        return router.replica
+
+
+@event.listens_for(RoutingSession, "after_flush")
+def _flushed(session, flush_context):
+    session.info["wrote"] = True
+
+
+@event.listens_for(RoutingSession, "do_orm_execute")
+def _executed(orm_execute_state):
+    if not orm_execute_state.is_select:
+        orm_execute_state.session.info["wrote"] = True
+
+
+@event.listens_for(RoutingSession, "after_commit")
+def _committed(session):
+    if session.info.pop("wrote", False):
+        replica_router.note_write(session.info.get("consistency_key"))
+    session.info.pop("used_replica", None)
+
+
+@event.listens_for(RoutingSession, "after_rollback")
+def _rolled_back(session):
+    session.info.pop("wrote", None)
+    session.info.pop("used_replica", None)
+
+
+def read_only(fn):
+    """
+    Mark a repository method as a read that may run on the replica
+
+    The method's first argument must be the DB session. If the replica
+    fails and the session hasn't written anything yet, the read is retried
+    on the primary.
+    """
+    @functools.wraps(fn)
+    def wrapper(db, *args, **kwargs):
+        if not isinstance(db, RoutingSession):
+            return fn(db, *args, **kwargs)
+        db.info["read_only_depth"] = db.info.get("read_only_depth", 0) + 1
+        try:
+            return fn(db, *args, **kwargs)
+        except (OperationalError, InterfaceError) as e:
+            if not db.info.get("used_replica") or db.info.get("wrote") or db.new or db.dirty or db.deleted:
+                raise
+            replica_router.mark_replica_down(e)
+            db.rollback()
+            return fn(db, *args, **kwargs)
+        finally:
+            db.info["read_only_depth"] -= 1
+    return wrapper
+
+
+class ReadYourWritesMiddleware:
+    """
+    ASGI middleware giving each HTTP request its own write scope, so reads
+    after a write in the same request stay on the primary even when the
+    write and the read run in different thread-pool calls
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        token = _request_write.set([None])
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            _request_write.reset(token)
@@ -0,0 +1,162 @@
+"""
+Embedded storage sync
+Mirrors a local SQLite database to the central Postgres. Triggers record
+the primary key of every inserted or updated row in a sync_outbox table
+(not its rowid, which VACUUM may renumber), in the same local transaction
+as the write itself, so nothing is lost when the
+network or the process goes away. A background thread upserts pending
+rows into Postgres in batches and deletes the outbox entries it delivered.
+"""
+import threading
+import time
+from typing import Dict, List, Optional
+
+from sqlalchemy import create_engine, literal_column, select, text
+from sqlalchemy.dialects.postgresql import insert
+
+from app.db.migrations import upgrade_schema
+from app.models import Base
+
+# Parents before children, so foreign keys exist when a batch is applied
+SYNCED_TABLES = ["client", "session", "telemetry_events", "pomodoro_cycles", "music_playback"]
+
+
+def _key_column(table_name: str) -> str:
+    """Name of a synced table's (single-column) primary key"""
+    (column,) = Base.metadata.tables[table_name].primary_key.columns
+    return column.name
+
+
+def install_outbox(engine):
+    """Create the outbox table and its triggers (idempotent)"""
+    with engine.begin() as conn:
+        conn.execute(text(
+            "CREATE TABLE IF NOT EXISTS sync_outbox ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, table_name TEXT NOT NULL, row_key TEXT NOT NULL)"
+        ))
+        for table in SYNCED_TABLES:
+            key = _key_column(table)
+            for op in ("INSERT", "UPDATE"):
+                conn.execute(text(
+                    f"CREATE TRIGGER IF NOT EXISTS sync_{table}_{op.lower()} AFTER {op} ON {table} "
+                    f"BEGIN INSERT INTO sync_outbox (table_name, row_key) VALUES ('{table}', NEW.{key}); END"
+                ))
+
+
+class OutboxSync:
+    """
+    Args:
+        local_engine: SQLite engine with the outbox installed
+        remote_url: Central Postgres URL
+        interval: Seconds between batches while idle
+        batch_size: Outbox entries per batch
+    """
+
+    def __init__(self, local_engine, remote_url: str, interval: float = 5.0, batch_size: int = 500):
+        self.local_engine = local_engine
+        self.remote_url = remote_url
+        self.interval = interval
+        self.batch_size = batch_size
+        self._remote = None
+        self._thread: Optional[threading.Thread] = None
+        self._wakeup = threading.Event()
+        self.synced_rows = 0
+        self.failures = 0
+        self.last_error: Optional[str] = None
+        self.last_sync_at: Optional[float] = None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._loop, name="db-sync", daemon=True)
+            self._thread.start()
+
+    def trigger(self):
+        """Sync now instead of waiting for the next interval"""
+        self._wakeup.set()
+
+    def _loop(self):
+        backoff = self.interval
+        while True:
+            self._wakeup.wait(backoff)
+            self._wakeup.clear()
+            try:
+                # Drain the backlog before going back to sleep
+                while self.sync_once() == self.batch_size:
+                    pass
+                backoff = self.interval
+            except Exception as e:
+                self.failures += 1
+                self.last_error = str(getattr(e, "orig", e))
+                print(f"Database sync failed, retrying in {backoff:.0f}s: {self.last_error}")
+                # Back off while the central database is unreachable
+                backoff = min(backoff * 2, 300)
+
+    def sync_once(self) -> int:
+        """
+        Deliver one batch of outbox entries
+
+        Returns:
+            Number of outbox entries handled
+        """
+        with self.local_engine.connect() as local:
+            entries = local.execute(
+                text("SELECT id, table_name, row_key FROM sync_outbox ORDER BY id LIMIT :n"),
+                {"n": self.batch_size},
+            ).all()
+            if not entries:
+                return 0
+
+            row_keys: Dict[str, set] = {}
+            for _, table_name, row_key in entries:
+                row_keys.setdefault(table_name, set()).add(row_key)
+
+            batches: Dict[str, List[dict]] = {}
+            for table_name in SYNCED_TABLES:
+                if table_name not in row_keys:
+                    continue
+                table = Base.metadata.tables[table_name]
+                # Compared as stored, bypassing the column type's bind conversion
+                rows = local.execute(
+                    select(table).where(literal_column(_key_column(table_name)).in_(row_keys[table_name]))
+                ).mappings().all()
+                batches[table_name] = [dict(row) for row in rows]
+
+        with self._remote_engine().begin() as remote:
+            for table_name, rows in batches.items():
+                if not rows:
+                    continue
+                table = Base.metadata.tables[table_name]
+                stmt = insert(table).values(rows)
+                keys = [c.name for c in table.primary_key.columns]
+                updates = {c.name: stmt.excluded[c.name] for c in table.columns if c.name not in keys}
+                remote.execute(stmt.on_conflict_do_update(index_elements=keys, set_=updates)
+                               if updates else stmt.on_conflict_do_nothing())
+
+        # Entries added meanwhile have higher ids and stay for the next batch
+        with self.local_engine.begin() as local:
+            local.execute(text("DELETE FROM sync_outbox WHERE id <= :last"), {"last": entries[-1][0]})
+
+        self.synced_rows += sum(len(rows) for rows in batches.values())
+        self.last_sync_at = time.time()
+        self.last_error = None
+        return len(entries)
+
+    def _remote_engine(self):
+        if self._remote is None:
+            remote = create_engine(self.remote_url, pool_pre_ping=True, pool_size=1, max_overflow=0)
+            Base.metadata.create_all(remote)
+            # Central tables from before the idempotency keys lack those columns
+            upgrade_schema(remote)
+            self._remote = remote
+        return self._remote
+
+    def stats(self) -> dict:
+        with self.local_engine.connect() as local:
+            pending = local.execute(text("SELECT COUNT(*) FROM sync_outbox")).scalar()
+        return {
+            "pending": pending,
+            "synced_rows": self.synced_rows,
+            "failures": self.failures,
+            "last_error": self.last_error,
+            "last_sync_at": self.last_sync_at,
+        }
@@ -1,35 +1,46 @@
 import os
+import hmac
+import json
 import asyncio
-from typing import AsyncGenerator, Optional
+import time
+from typing import AsyncGenerator, List, Optional, Union
 from datetime import datetime, time as dt_time
 
+from contextlib import asynccontextmanager
+
 from app.config import Settings
-from fastapi import FastAPI, Header, HTTPException, Depends
+from fastapi import FastAPI, Header, HTTPException, Query, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import StreamingResponse
-from pydantic import BaseModel
-
-# Gemini
-from google import genai
-from google.genai import types
+from fastapi.responses import Response, StreamingResponse
+from starlette.concurrency import run_in_threadpool
+from pydantic import BaseModel, Field
 
 # Database
 from app.db.conn import db_session
 from app.db.repository import SessionRepository
-from app.models import SessionStatus
+from app.db.routing import ReadYourWritesMiddleware
+from app.routes import bootstrap, sessions
 
-# Services
-from app.services.music import music_service
-from app.services.attention_detector_service import attention_detector_service
+# Services (heavy modules load on first use or during background warmup)
+from app.services.registry import services
+from app.services.visualization_jobs import JobQueueFullError
+from app.services.metrics import HTTPMetricsMiddleware, metrics
+from app.services.tracing import CLIENT, TracingMiddleware, tracer
 
-# Gemini client (optional - only initialize if API key is available)
-try:
-    client = genai.Client(api_key=Settings.GEMINI_API_KEY) if Settings.GEMINI_API_KEY else None
-except Exception as e:
-    print(f"Warning: Could not initialize Gemini client: {e}")
-    client = None
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Warm up in a worker thread so the server accepts connections immediately
+    if Settings.WARMUP_SERVICES:
+        asyncio.get_running_loop().run_in_executor(None, services.warmup, Settings.WARMUP_SERVICES)
+    if Settings.STORAGE_MODE == "embedded":
+        # Opens the local database and resumes syncing any backlog from earlier runs
+        from app.db.conn import get_engine
+        asyncio.get_running_loop().run_in_executor(None, get_engine)
+    yield
+    if services.is_loaded("pomodoro_scheduler"):
+        await services.pomodoro_scheduler.shutdown()
 
-app = FastAPI(title="AI Companion API")
+app = FastAPI(title="AI Companion API", lifespan=lifespan)
 # CORS
 app.add_middleware(
     CORSMiddleware,
@@ -38,6 +49,11 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(HTTPMetricsMiddleware)
+app.add_middleware(TracingMiddleware)
+app.add_middleware(ReadYourWritesMiddleware)
+app.include_router(sessions.router)
+
 # request models
 class ChatRequest(BaseModel):
     session_id: str
@@ -45,19 +61,36 @@ class ChatRequest(BaseModel):
     system_prompt: str | None = None
     model: str = "gemini-2.5-flash"
 
+class PomodoroSessionItem(BaseModel):
+    id: Optional[Union[int, str]] = None
+    task: Optional[str] = None
+    # Minutes; the scheduler's work length when omitted
+    duration: Optional[float] = Field(default=None, gt=0)
+
 class SessionStartRequest(BaseModel):
     subject: str
     duration: int
     audio_type: str
     study_guide: Optional[dict] = None
-    pomodoro_sessions: Optional[list] = None
+    pomodoro_sessions: Optional[List[PomodoroSessionItem]] = None
     playlist_provider: Optional[str] = None
 
+class PomodoroStartRequest(BaseModel):
+    session_id: str
+    pomodoro_sessions: Optional[List[PomodoroSessionItem]] = None
+
 class MusicStartRequest(BaseModel):
     audio_type: str
     session_id: Optional[str] = None
     duration_minutes: Optional[int] = None
 
+class MusicStatusBatchRequest(BaseModel):
+    session_ids: list[str]
+
+class VisualizationAnalyzeRequest(BaseModel):
+    data: dict
+    query: str
+
 def sse(data: str) -> str:
     return f"data: {data}\n\n"
 
@@ -66,30 +99,148 @@ async def gemini_stream_text(
     model: str,
     contents: list[str],
     system_prompt: str | None = None, 
+    parent_span=None,
     ) -> AsyncGenerator[str, None]:
     """
     Streams partial text using google-genai SDK.
     Docs: client.models.generate_content_stream(...)
+
+    Traced as a gemini.generate_content_stream span with the time to the
+    first chunk and the gaps between chunks.
     """
+    setup = tracer.start_span("gemini.setup", parent=parent_span)
+    # Loading the client imports google.genai in a worker thread
+    client = await services.aget("gemini_client")
+    from google.genai import types
+    from app.client import GEMINI_FIRST_CHUNK_SECONDS, GEMINI_REQUESTS, GEMINI_SECONDS
+
     gen_cfg = None
     if system_prompt:
         gen_cfg = types.GenerateContentConfig(system_instruction=system_prompt) if system_prompt else None
+    setup.end()
 
-    stream = client.models.generate_content_stream(
-        model=model,
-        contents=contents,
-        config=gen_cfg,
-    )
-    
-    # Iterate SDK stream and yield text fragments
-    for chunk in stream:
-        if getattr(chunk, "text", None):
-            yield chunk.text
+    span = tracer.start_span("gemini.generate_content_stream", CLIENT, parent=parent_span, **{"gemini.model": model})
+    started = time.perf_counter()
+    last_chunk = started
+    chunks, max_gap, total_gap = 0, 0.0, 0.0
+    outcome = "error"
+    try:
+        stream = client.models.generate_content_stream(
+            model=model,
+            contents=contents,
+            config=gen_cfg,
+        )
+        
+        # Iterate SDK stream and yield text fragments
+        first_chunk = True
+        for chunk in stream:
+            now = time.perf_counter()
+            if first_chunk:
+                GEMINI_FIRST_CHUNK_SECONDS.labels("chat_stream").observe(now - started)
+                span.set("gemini.time_to_first_chunk_ms", round((now - started) * 1000, 3))
+                span.add_event("first_chunk")
+                first_chunk = False
+            else:
+                gap = now - last_chunk
+                max_gap = max(max_gap, gap)
+                total_gap += gap
+                span.add_event("chunk", gap_ms=round(gap * 1000, 3))
+            chunks += 1
+            last_chunk = now
+            if getattr(chunk, "text", None):
+                yield chunk.text
+        outcome = "ok"
+    except GeneratorExit:
+        outcome = "cancelled"  # client went away mid-stream
+        raise
+    except Exception as e:
+        span.record_error(e)
+        raise
+    finally:
+        GEMINI_SECONDS.labels("chat_stream").observe(time.perf_counter() - started)
+        GEMINI_REQUESTS.labels("chat_stream", outcome).inc()
+        span.set("gemini.outcome", outcome)
+        span.set("gemini.chunks", chunks)
+        if chunks > 1:
+            span.set("gemini.max_gap_ms", round(max_gap * 1000, 3))
+            span.set("gemini.mean_gap_ms", round(total_gap / (chunks - 1) * 1000, 3))
+        span.end()
 
 @app.get("/health")
 def health():
     return {"status": "ok"}
 
+@app.get("/health/services")
+def health_services():
+    """Which lazily loaded services are warm, and how long they took to load"""
+    return services.status()
+
+@app.get("/health/db/pool")
+def health_db_pool():
+    """Connection pool usage, checkout waits and connection ages"""
+    from app.db.conn import pool_stats
+    return pool_stats()
+
+@app.get("/health/db/sync")
+def health_db_sync():
+    """Embedded storage: rows waiting to be synced to the central database"""
+    from app.db.conn import sync_stats
+    return sync_stats()
+
+@app.get("/metrics")
+def prometheus_metrics():
+    """Counters, gauges and histograms in the Prometheus text format"""
+    return Response(metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+def require_admin(token: Optional[str]):
+    """Admin endpoints only exist when ADMIN_TOKEN is configured"""
+    if not Settings.ADMIN_TOKEN:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not token or not hmac.compare_digest(token.encode(), Settings.ADMIN_TOKEN.encode()):
+        raise HTTPException(status_code=403, detail="Forbidden")
+
+@app.get("/admin/profile")
+async def profile_worker(
+    seconds: float = Query(10, gt=0),
+    interval_ms: float = Query(5, ge=1, le=1000),
+    output_format: str = Query("collapsed", alias="format", pattern="^(collapsed|json)$"),
+    include_idle: bool = False,
+    x_admin_token: Optional[str] = Header(default=None),
+):
+    """
+    Sample the stacks of every thread in this worker for a few seconds
+    
+    format=collapsed returns flamegraph.pl / speedscope input; format=json
+    returns the top functions and raw stack counts.
+    """
+    require_admin(x_admin_token)
+    from app.services.profiler import ProfilerBusyError, collapsed, profiler, top_functions
+    
+    try:
+        # The sampler sleeps between samples in its own thread; the event loop keeps serving
+        result = await run_in_threadpool(profiler.profile, seconds, interval_ms / 1000, include_idle)
+    except ProfilerBusyError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    
+    if output_format == "json":
+        return {**result, "top": top_functions(result)}
+    filename = f"profile-{os.getpid()}-{int(time.time())}.collapsed"
+    return Response(collapsed(result), media_type="text/plain",
+                    headers={"Content-Disposition": f'attachment; filename="{filename}"'})
+
+@app.get("/admin/traces")
+def recent_traces(
+    limit: int = Query(20, ge=1, le=500),
+    min_ms: float = Query(0, ge=0),
+    x_admin_token: Optional[str] = Header(default=None),
+):
+    """
+    Recently finished request traces as OTLP/JSON, newest first; min_ms
+    keeps only requests that took at least that long
+    """
+    require_admin(x_admin_token)
+    return tracer.to_otlp(tracer.recent(limit, min_ms))
+
 @app.post("/echo")
 def echo(data: dict):
     return {"received": data}
@@ -97,27 +248,39 @@ def echo(data: dict):
 #client
 @app.post("/chat/stream")
 async def chat_stream(req: ChatRequest, authorization: str | None = Header(default=None)):
-    # TODO: replace with JWT verification
-    if not authorization or not authorization.startswith("Bearer "):
-        raise HTTPException(status_code=401, detail="Unauthorized")
+    with tracer.span("chat.auth"):
+        # TODO: replace with JWT verification
+        if not authorization or not authorization.startswith("Bearer "):
+            raise HTTPException(status_code=401, detail="Unauthorized")
+    with tracer.span("chat.model_setup"):
+        # First use loads the client
+        if await services.aget("gemini_client") is None:
+            raise HTTPException(status_code=503, detail="Gemini is not configured")
 
     async def event_generator():
-        contents = [req.message]   # add conversation history or RAG later
-        async for frag in gemini_stream_text(req.model, contents, req.system_prompt):
-            yield sse(frag)
-            await asyncio.sleep(0)  # cooperative yield
-        yield sse("[DONE]")
+        # Spans across yields are ended explicitly rather than made current
+        span = tracer.start_span("chat.stream")
+        fragments = 0
+        try:
+            contents = [req.message]   # add conversation history or RAG later
+            async for frag in gemini_stream_text(req.model, contents, req.system_prompt, parent_span=span):
+                yield sse(frag)
+                fragments += 1
+                await asyncio.sleep(0)  # cooperative yield
+            yield sse("[DONE]")
+        finally:
+            span.set("chat.fragments", fragments)
+            span.end()
     return StreamingResponse(event_generator(), media_type="text/event-stream")
 
-@app.post("/api/session/start")
-async def start_session(req: SessionStartRequest, db = Depends(db_session)):
-    """Start a new study session and store session data"""
-    try:
-        # Create session in database
-        session = SessionRepository.create(
-            db=db,
+def create_session_record(req: SessionStartRequest, idempotency_key: Optional[str]):
+    with db_session() as db:
+        bootstrap.ensure_local_client(db)
+        session, created = SessionRepository.create_idempotent(
+            db,
+            client_id=bootstrap.LOCAL_CLIENT_ID,
             session_topic=req.subject,
-            status=SessionStatus.ACTIVE
+            idempotency_key=idempotency_key
         )
         
         # Create plan if study guide is provided
@@ -135,27 +298,100 @@ async def start_session(req: SessionStartRequest, db = Depends(db_session)):
             #     pomodoro_pattern=pomodoro_pattern,
             #     qualitative_guide=str(req.study_guide)
             # )
-        
-        db.commit()
-        
-        return {
-            "session_id": str(session.session_id),
-            "status": "active",
-            "subject": req.subject,
-            "duration": req.duration,
-            "audio_type": req.audio_type
-        }
+        return str(session.session_id), created
+
+@app.post("/api/session/start")
+async def start_session(req: SessionStartRequest,
+                        idempotency_key: Optional[str] = Header(default=None, max_length=64)):
+    """
+    Start a new study session and store session data
+    
+    Retries carrying the same Idempotency-Key header get the original
+    session back instead of creating another one.
+    """
+    try:
+        session_id, created = await run_in_threadpool(create_session_record, req, idempotency_key)
     except Exception as e:
-        db.rollback()
         raise HTTPException(status_code=500, detail=f"Failed to start session: {str(e)}")
+    
+    scheduler = await services.aget("pomodoro_scheduler")
+    pomodoro = scheduler.get(session_id)
+    if req.pomodoro_sessions and (created or pomodoro is None):
+        pomodoro = scheduler.start(session_id, [item.model_dump() for item in req.pomodoro_sessions])
+    
+    return {
+        "session_id": session_id,
+        "status": "active",
+        "subject": req.subject,
+        "duration": req.duration,
+        "audio_type": req.audio_type,
+        "pomodoro": pomodoro,
+        "replayed": not created
+    }
+
+@app.post("/api/pomodoro/start")
+async def start_pomodoro(req: PomodoroStartRequest):
+    """Start (or restart) the server-side Pomodoro schedule of a session"""
+    scheduler = await services.aget("pomodoro_scheduler")
+    pomodoro_sessions = [item.model_dump() for item in req.pomodoro_sessions or []]
+    return scheduler.start(req.session_id, pomodoro_sessions)
+
+@app.post("/api/pomodoro/{session_id}/{action}")
+async def control_pomodoro(session_id: str, action: str):
+    """Pause, resume, skip or stop a session's Pomodoro schedule"""
+    scheduler = await services.aget("pomodoro_scheduler")
+    if action == "stop":
+        if not scheduler.stop(session_id):
+            raise HTTPException(status_code=404, detail="No Pomodoro schedule for this session")
+        return {"status": "success", "message": "Pomodoro stopped"}
+    handlers = {"pause": scheduler.pause, "resume": scheduler.resume, "skip": scheduler.skip}
+    if action not in handlers:
+        raise HTTPException(status_code=400, detail=f"Unknown action: {action}")
+    result = handlers[action](session_id)
+    if result is None and action != "skip":
+        raise HTTPException(status_code=404, detail="No Pomodoro schedule for this session")
+    return result or {"status": "success", "message": "Pomodoro finished"}
+
+@app.get("/api/pomodoro/stats")
+async def get_pomodoro_stats():
+    """Scheduler load: active sessions, heap size, pending writes"""
+    return (await services.aget("pomodoro_scheduler")).stats()
+
+@app.get("/api/pomodoro/{session_id}")
+async def get_pomodoro(session_id: str):
+    """Current phase and remaining time of a session"""
+    state = (await services.aget("pomodoro_scheduler")).get(session_id)
+    if state is None:
+        raise HTTPException(status_code=404, detail="No Pomodoro schedule for this session")
+    return state
+
+@app.websocket("/ws")
+async def events_websocket(websocket: WebSocket, session_id: Optional[str] = None):
+    """Push server events (e.g. {"type": "pomodoro", ...}) to the client"""
+    await websocket.accept()
+    event_hub = await services.aget("event_hub")
+    subscription = event_hub.subscribe(session_id)
+    try:
+        if session_id and (state := (await services.aget("pomodoro_scheduler")).get(session_id)):
+            await websocket.send_json({"type": "pomodoro", "event": "state", **state})
+        while True:
+            await websocket.send_json(await subscription.queue.get())
+    except WebSocketDisconnect:
+        pass
+    finally:
+        event_hub.unsubscribe(subscription)
 
 @app.post("/api/music/start")
 async def start_music(req: MusicStartRequest):
     """Start playing music based on audio type"""
     try:
-        result = music_service.start_music(
+        # Sessions evicted from the registry are reloaded from the database
+        music_service = await services.aget("music_service")
+        result = await run_in_threadpool(
+            music_service.start_music,
             audio_type=req.audio_type,
-            duration_minutes=req.duration_minutes
+            duration_minutes=req.duration_minutes,
+            session_id=req.session_id
         )
         
         if result["status"] == "error":
@@ -168,42 +404,125 @@ async def start_music(req: MusicStartRequest):
         raise HTTPException(status_code=500, detail=f"Failed to start music: {str(e)}")
 
 @app.post("/api/music/pause")
-async def pause_music():
+async def pause_music(session_id: Optional[str] = None):
     """Pause currently playing music"""
     try:
-        result = music_service.pause_music()
+        result = await run_in_threadpool((await services.aget("music_service")).pause_music, session_id)
         return result
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to pause music: {str(e)}")
 
 @app.post("/api/music/resume")
-async def resume_music():
+async def resume_music(session_id: Optional[str] = None):
     """Resume paused music"""
     try:
-        result = music_service.resume_music()
+        result = await run_in_threadpool((await services.aget("music_service")).resume_music, session_id)
         return result
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to resume music: {str(e)}")
 
 @app.post("/api/music/stop")
-async def stop_music():
+async def stop_music(session_id: Optional[str] = None):
     """Stop currently playing music"""
     try:
-        result = music_service.stop_music()
+        result = await run_in_threadpool((await services.aget("music_service")).stop_music, session_id)
         return result
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to stop music: {str(e)}")
 
 @app.get("/api/music/status")
-async def get_music_status():
+async def get_music_status(session_id: Optional[str] = None):
     """Get current music playback status"""
-    return music_service.get_status()
+    return await run_in_threadpool((await services.aget("music_service")).get_status, session_id)
+
+@app.post("/api/music/status/batch")
+async def get_music_statuses(req: MusicStatusBatchRequest):
+    """Get music playback status for many sessions at once"""
+    return await run_in_threadpool((await services.aget("music_service")).get_statuses, req.session_ids)
+
+@app.get("/api/music/tracks/{audio_type}")
+def get_music_track(audio_type: str, range_header: Optional[str] = Header(default=None, alias="range")):
+    """Serve a local ambient track from its memory map, honoring HTTP Range requests"""
+    from app.services.audio_engine import RangeNotSatisfiable
+
+    track = services.audio_engine.track(audio_type)
+    if track is None:
+        raise HTTPException(status_code=404, detail=f"No local track for: {audio_type}")
+
+    try:
+        start, end = track.byte_range(range_header)
+    except RangeNotSatisfiable as e:
+        return Response(status_code=416, headers={"Content-Range": str(e)})
+
+    headers = {"Accept-Ranges": "bytes", "Content-Length": str(end - start)}
+    status_code = 200
+    if range_header and (start, end) != (0, track.size):
+        status_code = 206
+        headers["Content-Range"] = f"bytes {start}-{end - 1}/{track.size}"
+    return StreamingResponse(
+        track.iter_range(start, end, services.audio_engine.chunk_bytes),
+        status_code=status_code,
+        media_type=track.media_type,
+        headers=headers,
+    )
+
+@app.get("/api/music/stream/{audio_type}")
+def stream_music(audio_type: str, duration_minutes: Optional[float] = None):
+    """Continuous WAV stream: a gaplessly looped local track or a synthesized signal"""
+    duration_seconds = duration_minutes * 60 if duration_minutes else None
+    chunks = services.audio_engine.stream(audio_type, duration_seconds)
+    if chunks is None:
+        raise HTTPException(status_code=404, detail=f"No local audio for: {audio_type}")
+    return StreamingResponse(chunks, media_type="audio/wav")
+
+@app.get("/api/music/generate/{signal}")
+def generate_music(
+    signal: str,
+    carrier: float = Query(200.0, ge=20, le=1500),
+    beat: float = Query(10.0, ge=0.5, le=40),
+    volume: float = Query(0.3, ge=0, le=1),
+    noise: Optional[str] = None,
+    noise_volume: float = Query(0.1, ge=0, le=1),
+    duration_minutes: Optional[float] = Query(None, gt=0),
+    output_format: str = Query("wav", alias="format", pattern="^(wav|pcm)$"),
+):
+    """
+    Stream procedurally generated audio with per-client parameters
+
+    signal is "binaural", "silence" or a noise color (white, pink, brown);
+    noise optionally mixes a noise bed under binaural beats. Output is PCM16
+    stereo at 44.1 kHz, as WAV or raw little-endian PCM.
+    """
+    from app.services.audio_generator import (
+        create_generator, stream_blocks, wav_header, with_header, SAMPLE_RATE, CHANNELS, SAMPLE_WIDTH,
+    )
+
+    try:
+        generator = create_generator(signal, carrier, beat, volume, noise, noise_volume)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    total_frames = int(duration_minutes * 60 * SAMPLE_RATE) if duration_minutes else None
+    blocks = stream_blocks(generator, total_frames)
+    if output_format == "pcm":
+        return StreamingResponse(blocks, media_type=f"audio/L16;rate={SAMPLE_RATE};channels=2")
+
+    header = wav_header(data_bytes=total_frames * CHANNELS * SAMPLE_WIDTH if total_frames else None)
+    return StreamingResponse(with_header(header, blocks), media_type="audio/wav")
+
+@app.get("/api/music/adaptation")
+async def get_music_adaptation_status():
+    """Get the state of attention-driven music adaptation"""
+    return (await services.aget("music_adaptation")).status()
 
 @app.post("/api/attention/start")
-async def start_attention_detection():
-    """Start attention detection"""
+async def start_attention_detection(session_id: Optional[str] = None):
+    """Start attention detection (and attention-driven music adaptation for the session)"""
     try:
-        success = attention_detector_service.start_detection()
+        detector = await services.aget("attention_detector_service")
+        if Settings.MUSIC_ADAPTATION_ENABLED:
+            (await services.aget("music_adaptation")).attach(detector, session_id)
+        success = detector.start_detection()
         if success:
             return {"status": "success", "message": "Attention detection started"}
         else:
@@ -215,7 +534,7 @@ async def start_attention_detection():
 async def stop_attention_detection():
     """Stop attention detection"""
     try:
-        attention_detector_service.stop_detection()
+        (await services.aget("attention_detector_service")).stop_detection()
         return {"status": "success", "message": "Attention detection stopped"}
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to stop attention detection: {str(e)}")
@@ -224,7 +543,49 @@ async def stop_attention_detection():
 async def get_attention_status():
     """Get current attention detection status"""
     try:
-        status = attention_detector_service.get_status()
+        status = (await services.aget("attention_detector_service")).get_status()
         return status
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to get attention status: {str(e)}")
+
+@app.post("/api/visualizations/analyze", status_code=202)
+async def analyze_visualization(req: VisualizationAnalyzeRequest):
+    """Queue a Gemini visualization analysis and return its job id immediately"""
+    try:
+        # Keying the job hashes the whole payload; keep that off the event loop
+        job_queue = await services.aget("visualization_job_queue")
+        job = await run_in_threadpool(job_queue.submit, req.data, req.query)
+    except JobQueueFullError as e:
+        raise HTTPException(status_code=429, detail=str(e))
+    return {"job_id": job.job_id, "status": job.status}
+
+@app.get("/api/visualizations/jobs/{job_id}")
+async def get_visualization_job(job_id: str, wait: float = 0):
+    """Poll a visualization job; `wait` long-polls for up to that many seconds"""
+    job_queue = await services.aget("visualization_job_queue")
+    if wait > 0:
+        job = await job_queue.wait(job_id, timeout=min(wait, 30))
+    else:
+        job = job_queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job.to_dict()
+
+@app.get("/api/visualizations/jobs/{job_id}/events")
+async def stream_visualization_job(job_id: str):
+    """Server-sent events: the job's current state, then its final state"""
+    job_queue = await services.aget("visualization_job_queue")
+    job = job_queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    async def event_generator():
+        if not job.finished:
+            yield sse(json.dumps(job.to_dict()))
+        while not job.finished:
+            await job_queue.wait(job_id, timeout=15)
+            if not job.finished:
+                yield ": keep-alive\n\n"
+        yield sse(json.dumps(job.to_dict()))
+        yield sse("[DONE]")
+    return StreamingResponse(event_generator(), media_type="text/event-stream")
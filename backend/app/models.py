@@ -1,5 +1,4 @@
-from sqlalchemy import Column, String, Integer, DateTime, Boolean, Text, ForeignKey, Enum as SQLEnum, Time, Float
-from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy import Column, String, Integer, DateTime, Boolean, Text, ForeignKey, Enum as SQLEnum, Time, Float, Uuid
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship
 from datetime import datetime
@@ -28,7 +27,7 @@ class PomodoroPhase(enum.Enum):
 class Client(Base):
     __tablename__ = 'client'
     
-    client_id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    client_id = Column(Uuid(as_uuid=True), primary_key=True, default=uuid.uuid4)
     client_name = Column(String(20))
     
     # Relationships
@@ -37,8 +36,8 @@ class Client(Base):
 
 class Session(Base):
     __tablename__ = "session"
-    session_id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
-    client_id = Column(UUID(as_uuid=True), ForeignKey("client.client_id"), nullable=False)
+    session_id = Column(Uuid(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    client_id = Column(Uuid(as_uuid=True), ForeignKey("client.client_id"), nullable=False)
 
     session_topic = Column(Text)
     duration = Column(Time)
@@ -50,20 +49,23 @@ class Session(Base):
 
     created_at = Column(DateTime(timezone=True), default=datetime.utcnow)
     completed_at = Column(DateTime(timezone=True), nullable=True)
+    # Client-supplied Idempotency-Key of the request that created the session
+    idempotency_key = Column(String(64), unique=True, nullable=True)
 
     # Relationships
     client = relationship("Client", back_populates="sessions")
     # chat_history = relationship("ChatHistory", back_populates="session")
     # plan = relationship("Plan", back_populates="session", uselist=False)
     telemetry_events = relationship("TelemetryEvent", back_populates="session")
+    pomodoro_cycles = relationship("PomodoroCycle", back_populates="session")
 
 # class ChatHistory(Base):
 #     __tablename__ = 'chathistory'
     
-#     chat_id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
-#     client_id = Column(UUID(as_uuid=True), ForeignKey('client.client_id'))
+#     chat_id = Column(Uuid(as_uuid=True), primary_key=True, default=uuid.uuid4)
+#     client_id = Column(Uuid(as_uuid=True), ForeignKey('client.client_id'))
 #     role = Column(SQLEnum(MessageRole, name='message_role'))
-#     session_id = Column(UUID(as_uuid=True), ForeignKey('session.session_id'))
+#     session_id = Column(Uuid(as_uuid=True), ForeignKey('session.session_id'))
 #     chat_log = Column(Text)
     
 #     # Relationships
@@ -73,7 +75,7 @@ class Session(Base):
 # class Plan(Base):
 #     __tablename__ = 'plans'
     
-#     session_id = Column(UUID(as_uuid=True), ForeignKey('session.session_id', ondelete='CASCADE'), primary_key=True)
+#     session_id = Column(Uuid(as_uuid=True), ForeignKey('session.session_id', ondelete='CASCADE'), primary_key=True)
 #     pomodoro_pattern = Column(Text)
 #     qualitative_guide = Column(Text)
 #     updated_at = Column(DateTime(timezone=True), nullable=False, default=datetime.utcnow)
@@ -81,26 +83,38 @@ class Session(Base):
 #     # Relationships
 #     session = relationship("Session", back_populates="plan")
 
-# class PomodoroCycle(Base):
-#     __tablename__ = 'pomodoro_cycles'
+class PomodoroCycle(Base):
+    __tablename__ = 'pomodoro_cycles'
     
-#     cycle_id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
-#     session_id = Column(UUID(as_uuid=True), ForeignKey('session.session_id'))
-#     phase = Column(SQLEnum(PomodoroPhase, name='pomodoro_phase'))
-#     total_duration = Column(Integer)
-#     started_at = Column(DateTime(timezone=True))
-#     ended_at = Column(DateTime(timezone=True), nullable=True)
-#     completed = Column(Boolean, default=False)
+    cycle_id = Column(Uuid(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    session_id = Column(Uuid(as_uuid=True), ForeignKey('session.session_id'))
+    phase = Column(SQLEnum(PomodoroPhase, name='pomodoro_phase'))
+    total_duration = Column(Integer)
+    started_at = Column(DateTime(timezone=True))
+    ended_at = Column(DateTime(timezone=True), nullable=True)
+    completed = Column(Boolean, default=False)
     
-#     # Relationships
-#     session = relationship("Session", back_populates="pomodoro_cycles")
+    # Relationships
+    session = relationship("Session", back_populates="pomodoro_cycles")
 
 class TelemetryEvent(Base):
     __tablename__ = 'telemetry_events'
     
-    telemetry_id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
-    session_id = Column(UUID(as_uuid=True), ForeignKey("session.session_id"), nullable=False)
+    telemetry_id = Column(Uuid(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    session_id = Column(Uuid(as_uuid=True), ForeignKey("session.session_id"), nullable=False)
     created_at = Column(DateTime(timezone=True), default=datetime.utcnow)
+    # Idempotency-Key of the summary request that produced this event
+    idempotency_key = Column(String(64), unique=True, nullable=True)
     
     # Relationships
-    session = relationship("Session", back_populates="telemetry_events")    
\ No newline at end of file
+    session = relationship("Session", back_populates="telemetry_events")
+
+class MusicPlayback(Base):
+    __tablename__ = 'music_playback'
+
+    session_id = Column(Uuid(as_uuid=True), ForeignKey("session.session_id", ondelete='CASCADE'), primary_key=True)
+    audio_type = Column(String(20), nullable=True)
+    is_playing = Column(Boolean, default=False)
+    volume = Column(Integer, default=100)
+    duration_minutes = Column(Integer, nullable=True)
+    updated_at = Column(DateTime(timezone=True), default=datetime.utcnow, onupdate=datetime.utcnow)
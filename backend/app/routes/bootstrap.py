@@ -1,16 +1,28 @@
-from app.db.conn import db_session, engine
+from sqlalchemy import event
+from app.db.conn import db_session, get_engine
 from app.db.repository import ClientRepository
 from app.models import Base
 import uuid
 
 LOCAL_CLIENT_ID = uuid.UUID("00000000-0000-0000-0000-000000000001")
 
+_local_client_ready = False
+
 def init_db():
-    Base.metadata.create_all(bind=engine)
+    Base.metadata.create_all(bind=get_engine())
 
 def init_local_client():
     """Initialize a local client for testing/development."""
     with db_session() as db:
-        existing_client = ClientRepository.get_by_id(db, LOCAL_CLIENT_ID)
-        if not existing_client:
-            ClientRepository.create(db, client_id=LOCAL_CLIENT_ID, client_name="local-dev-client")
\ No newline at end of file
+        ensure_local_client(db)
+
+def ensure_local_client(db):
+    """Create the local client once per process; later calls cost no round trip."""
+    if not _local_client_ready:
+        ClientRepository.ensure(db, LOCAL_CLIENT_ID, client_name="local-dev-client")
+        # Only trust it once committed; a rolled back request must try again
+        event.listen(db, "after_commit", _mark_local_client_ready, once=True)
+
+def _mark_local_client_ready(db):
+    global _local_client_ready
+    _local_client_ready = True
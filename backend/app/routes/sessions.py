@@ -1,5 +1,6 @@
-from fastapi import APIRouter, HTTPException
-from app.schemas import SessionAttentionSummaryRequest, StartSessionRequest
+from typing import Optional
+from fastapi import APIRouter, Header, HTTPException
+from app.schema import AttentionSummaryBatchRequest, SessionAttentionSummaryRequest, StartSessionRequest
 from app.db.conn import db_session
 from app.db.repository import SessionRepository, TelemetryRepository
 import app.routes.bootstrap as bootstrap
@@ -7,15 +8,37 @@ import app.routes.bootstrap as bootstrap
 router = APIRouter(prefix="/sessions", tags=["sessions"])
 
 @router.post("/start", status_code=201)
-def start_session(payload: StartSessionRequest):
+def start_session(payload: StartSessionRequest, idempotency_key: Optional[str] = Header(default=None, max_length=64)):
     with db_session() as db:
-        session = SessionRepository.create(db, client_id=bootstrap.LOCAL_CLIENT_ID, session_topic=payload.session_topic)
-        TelemetryRepository.create(db, session_id=session.session_id)
+        bootstrap.ensure_local_client(db)
+        session, created = SessionRepository.create_idempotent(
+            db, client_id=bootstrap.LOCAL_CLIENT_ID, session_topic=payload.session_topic,
+            idempotency_key=idempotency_key)
+        if created:
+            TelemetryRepository.create(db, session_id=session.session_id)
         return {
             "session_id": str(session.session_id),
             "topic": session.session_topic,
             "status": session.status.value,
-            "created_at": session.created_at.isoformat() if session.created_at else None}
+            "created_at": session.created_at.isoformat() if session.created_at else None,
+            "replayed": not created}
+
+@router.get("/history", status_code=200)
+def get_session_history(limit: int = 50):
+    with db_session(read_only=True) as db:
+        sessions = SessionRepository.list_history(db, client_id=bootstrap.LOCAL_CLIENT_ID, limit=min(limit, 500))
+        return [
+            {
+                "session_id": str(s.session_id),
+                "topic": s.session_topic,
+                "status": s.status.value,
+                "seconds_focused": s.seconds_focused,
+                "seconds_distracted": s.seconds_distracted,
+                "avg_attention": s.avg_attention,
+                "created_at": s.created_at.isoformat() if s.created_at else None,
+            }
+            for s in sessions
+        ]
 
 @router.get("/current", status_code=200)
 def get_current_session():
@@ -29,24 +52,52 @@ def get_current_session():
                 "status": current.status.value}
 
 @router.post("/attention-summary", status_code=200)
-def save_attention_summary(payload: SessionAttentionSummaryRequest):
-    with db_session() as db:
-        current = SessionRepository.get_by_id(db, session_id=payload.session_id)
+def save_attention_summary(payload: SessionAttentionSummaryRequest,
+                           idempotency_key: Optional[str] = Header(default=None, max_length=64)):
+    with db_session(consistency_key=str(payload.session_id)) as db:
+        result = SessionRepository.apply_attention_summary(
+            db,
+            session_id=payload.session_id,
+            seconds_focused=payload.seconds_focused,
+            seconds_distracted=payload.seconds_distracted,
+            avg_attention=payload.avg_attention,
+            idempotency_key=idempotency_key,
+        )
 
-        if not current:
+        if not result:
             raise HTTPException(status_code=404, detail="No active session to attach summary")
-        
-        current.seconds_focused = payload.seconds_focused
-        current.seconds_distracted = payload.seconds_distracted
-        current.avg_attention = payload.avg_attention
-        # current.samples_count = payload.samples_count
-        db.flush()
-        TelemetryRepository.create(db, session_id=current.session_id)
+        summary, applied = result
 
         return {
-            "message": "Attention summary saved.",
-            "session_id": str(current.session_id),
-            "seconds_focused": current.seconds_focused,
-            "seconds_distracted": current.seconds_distracted,
-            "avg_attention": current.avg_attention,
-        }
\ No newline at end of file
+            "message": "Attention summary saved." if applied else "Attention summary already saved.",
+            "session_id": str(summary["session_id"]),
+            "seconds_focused": summary["seconds_focused"],
+            "seconds_distracted": summary["seconds_distracted"],
+            "avg_attention": summary["avg_attention"],
+        }
+
+@router.post("/attention-summary/batch", status_code=200)
+def save_attention_summaries(payload: AttentionSummaryBatchRequest):
+    """
+    Apply queued summaries from a client's outbox in one transaction
+
+    Each item reports "applied", "duplicate" (its idempotency key was seen
+    before) or "not_found", so the client knows which ones it can drop.
+    """
+    results = []
+    with db_session() as db:
+        for item in payload.items:
+            result = SessionRepository.apply_attention_summary(
+                db,
+                session_id=item.session_id,
+                seconds_focused=item.seconds_focused,
+                seconds_distracted=item.seconds_distracted,
+                avg_attention=item.avg_attention,
+                idempotency_key=item.idempotency_key,
+            )
+            if result is None:
+                status = "not_found"
+            else:
+                status = "applied" if result[1] else "duplicate"
+            results.append({"idempotency_key": item.idempotency_key, "status": status})
+    return {"results": results}
@@ -1,4 +1,5 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
+from typing import List
 from uuid import UUID
 
 class StartSessionRequest(BaseModel):
@@ -10,3 +11,10 @@ class SessionAttentionSummaryRequest(BaseModel):
     seconds_distracted: int   
     avg_attention: float
     # samples_count: int
+
+
+class AttentionSummaryBatchItem(SessionAttentionSummaryRequest):
+    idempotency_key: str = Field(max_length=64)
+
+class AttentionSummaryBatchRequest(BaseModel):
+    items: List[AttentionSummaryBatchItem] = Field(max_length=500)
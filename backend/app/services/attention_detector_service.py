@@ -6,13 +6,56 @@ import cv2
 import numpy as np
 import threading
 import time
-from typing import Optional, Tuple
+from typing import Callable, Dict, List, Optional, Tuple
+
+from app.config import Settings
+from app.services.face_detectors import FaceDetector, HaarFaceDetector, create_face_detector
+from app.services.metrics import metrics
+
+STAGES = ("change_check", "cvtColor", "face_detection", "eye_cascade", "scoring")
+_STAGE_SECONDS = metrics.histogram(
+    "attention_detection_stage_seconds", "Time per detection stage", ("stage",),
+    buckets=(0.0001, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25))
+_STAGE_CHILDREN = {stage: _STAGE_SECONDS.labels(stage) for stage in STAGES}
+_FRAMES = metrics.counter("attention_frames_total", "Frames scored, by result", ("result",))
+_FRAME_RESULTS = {result: _FRAMES.labels(result) for result in ("attentive", "distracted", "no_face")}
+_SCORE = metrics.gauge("attention_score", "Latest attention score (0-100)")
+_ERRORS = metrics.counter(
+    "attention_detection_errors_total", "Frames whose detection raised, by face detector backend", ("detector",))
+# Consecutive failures after which a non-Haar backend is swapped for Haar
+MAX_CONSECUTIVE_ERRORS = 10
+_REUSED = metrics.counter(
+    "attention_frames_reused_total", "Frames that reused the previous result because the scene hadn't changed")
+
+# Change signature: every 4th pixel of the green channel, area-averaged down
+# to 40x30, which evens out sensor noise for a fraction of a cvtColor
+SIGNATURE_SIZE = (40, 30)
+SIGNATURE_STRIDE = 4
+
+
+def _lap(timings: Dict[str, float], stage: str, start: float) -> float:
+    """Record the time since start under stage and return the new start"""
+    now = time.perf_counter()
+    timings[stage] = now - start
+    return now
 
 
 class AttentionDetectorService:
-    """Service for detecting user attention using OpenCV"""
+    """
+    Service for detecting user attention using OpenCV
     
-    def __init__(self):
+    Args:
+        change_threshold: Mean absolute difference (gray levels) between
+            downsampled frames below which the last result is reused; 0
+            runs full detection on every frame
+        refresh_interval: Seconds after which a full detection runs even if
+            the scene looks unchanged
+        face_detector: Face detector backend; defaults to Settings.FACE_DETECTOR
+    """
+    
+    def __init__(self, change_threshold: float = Settings.ATTENTION_CHANGE_THRESHOLD,
+                 refresh_interval: float = Settings.ATTENTION_REFRESH_SECONDS,
+                 face_detector: Optional[FaceDetector] = None):
         self.cap = None
         self.running = False
         self.detection_thread = None
@@ -20,14 +63,63 @@ class AttentionDetectorService:
         self.current_percentage = 0
         self.is_attentive = False
         self.last_update_time = 0
+        self.face_detected = False
+        
+        # Called with a state dict whenever attentiveness or face presence changes
+        self._listeners: List[Callable[[dict], None]] = []
         
-        # OpenCV classifiers
-        self.face_cascade = cv2.CascadeClassifier(
-            cv2.data.haarcascades + 'haarcascade_frontalface_default.xml'
-        )
-        self.eye_cascade = cv2.CascadeClassifier(
-            cv2.data.haarcascades + 'haarcascade_eye.xml'
-        )
+        # Face detector and eye cascade (loaded on first use, see _load_classifiers)
+        self.face_detector = face_detector
+        self.eye_cascade = None
+        self._classifier_lock = threading.Lock()
+        
+        # Last fully analyzed frame, for skipping detection on static scenes
+        self.change_threshold = change_threshold
+        self.refresh_interval = refresh_interval
+        self._last_signature: Optional[np.ndarray] = None
+        self._last_result: Tuple[bool, float] = (False, 0)
+        self._last_analyzed_at = 0.0
+    
+    def _load_classifiers(self):
+        """Load the models once; parsing cascade XML or DNN weights takes tens of ms"""
+        if self.eye_cascade is not None:
+            return
+        with self._classifier_lock:
+            if self.eye_cascade is not None:
+                return
+            if self.face_detector is None:
+                self.face_detector = create_face_detector()
+            self.face_detector.load()
+            self.eye_cascade = cv2.CascadeClassifier(
+                cv2.data.haarcascades + 'haarcascade_eye.xml'
+            )
+    
+    def warmup(self):
+        """Preload classifiers so the first detection doesn't pay for it"""
+        self._load_classifiers()
+    
+    def subscribe(self, listener: Callable[[dict], None]):
+        """
+        Register a callback for attention state changes
+        
+        Listeners run on the detection thread, only when is_attentive or face
+        presence flips (not on every frame), and must return quickly.
+        """
+        if listener not in self._listeners:
+            self._listeners.append(listener)
+    
+    def unsubscribe(self, listener: Callable[[dict], None]):
+        if listener in self._listeners:
+            self._listeners.remove(listener)
+    
+    def _notify(self):
+        event = self.get_status()
+        event["face_detected"] = self.face_detected
+        for listener in list(self._listeners):
+            try:
+                listener(event)
+            except Exception as e:
+                print(f"Attention listener error: {e}")
     
     def start_detection(self) -> bool:
         """Start attention detection"""
@@ -46,12 +138,13 @@ class AttentionDetectorService:
             self.cap.set(cv2.CAP_PROP_FRAME_HEIGHT, 480)
             
             self.running = True
+            self._last_signature = None
             self.current_status = "Starting"
             self.current_percentage = 0
             self.is_attentive = False
             
             # Start detection thread
-            self.detection_thread = threading.Thread(target=self._detection_loop, daemon=True)
+            self.detection_thread = threading.Thread(target=self._detection_loop, name="attention-detection", daemon=True)
             self.detection_thread.start()
             
             return True
@@ -71,9 +164,12 @@ class AttentionDetectorService:
         self.current_status = "Stopped"
         self.current_percentage = 0
         self.is_attentive = False
+        self.face_detected = False
+        self._notify()
     
     def _detection_loop(self):
         """Main detection loop running in background thread"""
+        failures = 0
         while self.running:
             if self.cap is None or not self.cap.isOpened():
                 time.sleep(0.1)
@@ -84,47 +180,137 @@ class AttentionDetectorService:
                 time.sleep(0.1)
                 continue
             
-            # Detect attention
-            is_attentive, score, _ = self.detect_attention(frame)
+            # Detect attention; a failing frame (e.g. a broken DNN model) mustn't end the loop
+            timings = {}
+            try:
+                is_attentive, score, _ = self.detect_attention(frame, timings)
+            except Exception as e:
+                failures += 1
+                _ERRORS.labels(getattr(self.face_detector, "name", "unknown")).inc()
+                if failures == 1:
+                    print(f"Attention detection error: {e}")
+                if failures >= MAX_CONSECUTIVE_ERRORS and not isinstance(self.face_detector, HaarFaceDetector):
+                    print(f"Face detector {self.face_detector.name!r} keeps failing, switching to Haar cascades")
+                    detector = HaarFaceDetector()
+                    detector.load()
+                    self.face_detector = detector
+                    failures = 0
+                time.sleep(0.1)
+                continue
+            failures = 0
+            for stage, seconds in timings.items():
+                _STAGE_CHILDREN[stage].observe(seconds)
+            _FRAME_RESULTS["attentive" if is_attentive else "distracted" if score > 0 else "no_face"].inc()
+            _SCORE.set(score)
             
             # Update state
+            changed = is_attentive != self.is_attentive or (score > 0) != self.face_detected
             self.is_attentive = is_attentive
+            self.face_detected = score > 0
             self.current_percentage = min(100, max(0, int(score)))
             self.current_status = "Paying Attention" if is_attentive else "Not Paying Attention"
             self.last_update_time = time.time()
+            if changed and self._listeners:
+                self._notify()
             
             time.sleep(0.1)  # ~10 FPS
     
-    def detect_attention(self, frame) -> Tuple[bool, float, np.ndarray]:
+    def detect_attention(self, frame, timings: Optional[Dict[str, float]] = None) -> Tuple[bool, float, np.ndarray]:
         """
         Detect if person is paying attention
         
+        When the frame barely differs from the last analyzed one (and that
+        was less than refresh_interval ago), the cascades are skipped and
+        the last result is returned.
+        
+        Args:
+            frame: BGR frame
+            timings: Optional dict that receives the seconds spent in each stage
+                that ran (change_check, cvtColor, face_detection, eye_cascade, scoring)
+        
         Returns:
             Tuple of (is_attentive, attention_score, processed_frame)
         """
-        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        self._load_classifiers()
+        start = time.perf_counter() if timings is not None else 0.0
         
-        # Detect faces
-        faces = self.face_cascade.detectMultiScale(gray, 1.3, 5)
+        signature = None
+        if self.change_threshold > 0:
+            signature = self._signature(frame)
+            unchanged = self._unchanged(signature)
+            if timings is not None:
+                start = _lap(timings, "change_check", start)
+            if unchanged:
+                _REUSED.inc()
+                is_attentive, attention_score = self._last_result
+                return is_attentive, attention_score, frame
         
-        if len(faces) == 0:
-            return False, 0, frame  # No face detected
+        gray = self._to_gray(frame)
+        if timings is not None:
+            start = _lap(timings, "cvtColor", start)
         
-        # Get the largest face (assuming it's the main person)
-        largest_face = max(faces, key=lambda rect: rect[2] * rect[3])
-        x, y, w, h = largest_face
+        face = self._largest_face(frame, gray)
+        if timings is not None:
+            start = _lap(timings, "face_detection", start)
         
-        # Region of Interest for eyes
-        roi_gray = gray[y:y+h, x:x+w]
+        if face is None:
+            self._remember(signature, False, 0)
+            return False, 0, frame  # No face detected
         
-        # Detect eyes
-        eyes = self.eye_cascade.detectMultiScale(roi_gray, 1.1, 3)
+        eyes = self._detect_eyes(gray, face)
+        if timings is not None:
+            start = _lap(timings, "eye_cascade", start)
         
-        # Calculate attention metrics
-        eye_count = len(eyes)
+        is_attentive, attention_score = self._score(face, len(eyes), frame.shape)
+        if timings is not None:
+            _lap(timings, "scoring", start)
+        
+        self._remember(signature, is_attentive, attention_score)
+        return is_attentive, attention_score, frame
+    
+    def _signature(self, frame) -> np.ndarray:
+        """Small grayscale thumbnail of the frame for change detection"""
+        sampled = frame[::SIGNATURE_STRIDE, ::SIGNATURE_STRIDE]
+        if sampled.ndim == 3:
+            sampled = sampled[:, :, 1]
+        return cv2.resize(sampled, SIGNATURE_SIZE, interpolation=cv2.INTER_AREA)
+    
+    def _unchanged(self, signature: np.ndarray) -> bool:
+        """Whether the last result still holds for a frame with this signature"""
+        if self._last_signature is None or time.monotonic() - self._last_analyzed_at >= self.refresh_interval:
+            return False
+        # Compared with the last analyzed frame, not the previous one, so slow drift still adds up
+        difference = cv2.norm(signature, self._last_signature, cv2.NORM_L1) / signature.size
+        return difference < self.change_threshold
+    
+    def _remember(self, signature: Optional[np.ndarray], is_attentive: bool, attention_score: float):
+        if signature is None:
+            return
+        self._last_signature = signature
+        self._last_result = (is_attentive, attention_score)
+        self._last_analyzed_at = time.monotonic()
+    
+    def _to_gray(self, frame) -> np.ndarray:
+        return cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+    
+    def _largest_face(self, frame, gray) -> Optional[Tuple[int, int, int, int]]:
+        """Largest detected face (assuming it's the main person), or None"""
+        faces = self.face_detector.detect(gray if self.face_detector.input_gray else frame)
+        if not faces:
+            return None
+        return max(faces, key=lambda face: face[2] * face[3])[:4]
+    
+    def _detect_eyes(self, gray, face) -> np.ndarray:
+        """Eyes inside the face's region of interest"""
+        x, y, w, h = face
+        return self.eye_cascade.detectMultiScale(gray[y:y+h, x:x+w], 1.1, 3)
+    
+    def _score(self, face, eye_count: int, frame_shape) -> Tuple[bool, int]:
+        """Attention score from face position, face size and visible eyes"""
+        x, y, w, h = face
         
         # Face position and size (center and size relative to frame)
-        frame_height, frame_width = frame.shape[:2]
+        frame_height, frame_width = frame_shape[:2]
         face_center_x = x + w // 2
         face_center_y = y + h // 2
         
@@ -174,9 +360,7 @@ class AttentionDetectorService:
         attention_score = sum(factors.values())
         
         # Determine if paying attention (threshold: 60%)
-        is_attentive = attention_score >= 60
-        
-        return is_attentive, attention_score, frame
+        return attention_score >= 60, attention_score
     
     def get_status(self) -> dict:
         """Get current attention detection status"""
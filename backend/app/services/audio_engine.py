@@ -0,0 +1,213 @@
+"""
+Local audio engine
+Serves pre-transcoded ambient tracks from disk through memory maps (pages
+come straight from the OS page cache, no per-request reads or copies) and
+synthesizes BINAURAL and SILENCE on the fly. Works offline and starts
+instantly.
+
+Tracks live in Settings.AUDIO_ASSETS_DIR as <audio_type>.wav (PCM16,
+used for gapless looping streams) and/or <audio_type>.<mp3|ogg|opus|m4a>
+(served as-is with HTTP range support).
+"""
+import mmap
+import struct
+import threading
+from pathlib import Path
+from typing import Dict, Iterator, Optional, Tuple
+
+from app.config import Settings
+from app.services.audio_generator import (
+    create_generator, stream_blocks, wav_header, with_header,
+    SAMPLE_RATE, CHANNELS, SAMPLE_WIDTH,
+)
+from app.services.music import AudioType
+
+MEDIA_TYPES = {
+    ".wav": "audio/wav",
+    ".mp3": "audio/mpeg",
+    ".ogg": "audio/ogg",
+    ".opus": "audio/ogg",
+    ".m4a": "audio/mp4",
+}
+
+# Audio types produced by a generator instead of a file
+SYNTHESIZED = {AudioType.BINAURAL.value, AudioType.SILENCE.value}
+# Only these names are ever looked up on disk
+KNOWN_AUDIO_TYPES = {audio_type.value for audio_type in AudioType}
+
+
+class RangeNotSatisfiable(Exception):
+    """Requested byte range lies outside the file"""
+
+
+class LocalTrack:
+    """A memory-mapped audio file"""
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.media_type = MEDIA_TYPES.get(path.suffix.lower(), "application/octet-stream")
+        with open(path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self.size = len(self._mmap)
+        self.view = memoryview(self._mmap)
+
+        # PCM layout, only for WAV files
+        self.data_offset = self.data_length = None
+        self.sample_rate = self.channels = self.sample_width = None
+        if path.suffix.lower() == ".wav":
+            self._parse_wav()
+
+    @property
+    def loopable(self) -> bool:
+        return self.data_offset is not None and self.data_length >= self.channels * self.sample_width
+
+    def _parse_wav(self):
+        if self._mmap[:4] != b"RIFF" or self._mmap[8:12] != b"WAVE":
+            raise ValueError(f"{self.path} is not a RIFF/WAVE file")
+        pos = 12
+        while pos + 8 <= self.size:
+            chunk_id = self._mmap[pos:pos + 4]
+            chunk_size = struct.unpack_from("<I", self._mmap, pos + 4)[0]
+            if chunk_id == b"fmt ":
+                fmt, channels, rate, _, _, bits = struct.unpack_from("<HHIIHH", self._mmap, pos + 8)
+                if fmt != 1:
+                    raise ValueError(f"{self.path} is not PCM")
+                self.channels, self.sample_rate, self.sample_width = channels, rate, bits // 8
+            elif chunk_id == b"data":
+                self.data_offset = pos + 8
+                self.data_length = min(chunk_size, self.size - self.data_offset)
+                break
+            pos += 8 + chunk_size + (chunk_size & 1)
+
+    def byte_range(self, range_header: Optional[str]) -> Tuple[int, int]:
+        """
+        Resolve a single "bytes=start-end" Range header to [start, end)
+
+        Returns the whole file when there is no (usable) header.
+
+        Raises:
+            RangeNotSatisfiable: if the range starts past the end of the file
+        """
+        if not range_header or not range_header.startswith("bytes=") or "," in range_header:
+            return 0, self.size
+        start_s, _, end_s = range_header[6:].strip().partition("-")
+        try:
+            if start_s:
+                start = int(start_s)
+                end = int(end_s) + 1 if end_s else self.size
+            else:
+                # Suffix range: the last N bytes
+                start, end = max(self.size - int(end_s), 0), self.size
+        except ValueError:
+            return 0, self.size
+        if start >= self.size or start >= end:
+            raise RangeNotSatisfiable(f"bytes */{self.size}")
+        return start, min(end, self.size)
+
+    def iter_range(self, start: int, end: int, chunk_bytes: int) -> Iterator[memoryview]:
+        for pos in range(start, end, chunk_bytes):
+            yield self.view[pos:min(pos + chunk_bytes, end)]
+
+    def iter_loop(self, chunk_bytes: int, total_bytes: Optional[int] = None) -> Iterator[memoryview]:
+        """
+        Loop the PCM data gaplessly: the chunk that crosses the end of the
+        track is followed directly by the start, with no silence or header
+        """
+        block_align = self.channels * self.sample_width
+        # Whole frames only, and at least one (a smaller setting would never advance)
+        chunk_bytes = max(block_align, chunk_bytes - chunk_bytes % block_align)
+        data_end = self.data_offset + self.data_length - self.data_length % block_align
+        pos = self.data_offset
+        remaining = total_bytes
+        while remaining is None or remaining > 0:
+            size = min(chunk_bytes, data_end - pos)
+            if remaining is not None:
+                size = min(size, remaining)
+                remaining -= size
+            yield self.view[pos:pos + size]
+            pos += size
+            if pos >= data_end:
+                pos = self.data_offset
+
+    def close(self):
+        self.view.release()
+        self._mmap.close()
+
+
+class AudioEngine:
+    """Local playback backend: memory-mapped tracks plus synthesized signals"""
+
+    def __init__(self, assets_dir: Path, chunk_bytes: int = 64 * 1024):
+        self.assets_dir = Path(assets_dir)
+        self.chunk_bytes = chunk_bytes
+        # (audio type, loopable) -> file, and one mapping per file
+        self._paths: Dict[Tuple[str, bool], Optional[Path]] = {}
+        self._tracks: Dict[Path, LocalTrack] = {}
+        self._lock = threading.Lock()
+
+    def track(self, audio_type: str, loopable: bool = False) -> Optional[LocalTrack]:
+        """
+        Open (once) and return the track for an audio type, if one exists
+
+        Unknown audio types return None without touching the disk or the
+        cache, so clients can't grow it with arbitrary names.
+        """
+        if audio_type not in KNOWN_AUDIO_TYPES:
+            return None
+        key = (audio_type, loopable)
+        if key in self._paths:
+            path = self._paths[key]
+            return self._tracks[path] if path is not None else None
+        with self._lock:
+            if key not in self._paths:
+                suffixes = [".wav"] if loopable else list(MEDIA_TYPES)
+                path = next(
+                    (self.assets_dir / f"{audio_type}{s}" for s in suffixes
+                     if (self.assets_dir / f"{audio_type}{s}").is_file()),
+                    None,
+                )
+                if path is not None:
+                    path = path.resolve()
+                    if path not in self._tracks:
+                        self._tracks[path] = LocalTrack(path)
+                self._paths[key] = path
+            path = self._paths[key]
+        return self._tracks[path] if path is not None else None
+
+    def has_source(self, audio_type: str) -> bool:
+        return audio_type in SYNTHESIZED or self.track(audio_type) is not None
+
+    def stream(self, audio_type: str, duration_seconds: Optional[float] = None) -> Optional[Iterator[bytes]]:
+        """
+        Continuous WAV stream for an audio type: a looping PCM track or a
+        synthesized signal. Endless unless duration_seconds is given.
+
+        Returns:
+            Iterator of byte chunks (header first), or None if unavailable
+        """
+        if audio_type in SYNTHESIZED:
+            total_frames = int(duration_seconds * SAMPLE_RATE) if duration_seconds else None
+            data_bytes = total_frames * CHANNELS * SAMPLE_WIDTH if total_frames is not None else None
+            generator = create_generator(audio_type)
+            return with_header(wav_header(data_bytes=data_bytes), stream_blocks(generator, total_frames))
+
+        track = self.track(audio_type, loopable=True)
+        if track is None or not track.loopable:
+            return None
+        block_align = track.channels * track.sample_width
+        total_bytes = (
+            int(duration_seconds * track.sample_rate) * block_align if duration_seconds else None
+        )
+        header = wav_header(track.sample_rate, track.channels, track.sample_width, total_bytes)
+        return with_header(header, track.iter_loop(self.chunk_bytes, total_bytes))
+
+    def warmup(self):
+        """Map every available track so the first request doesn't open files"""
+        for audio_type in AudioType:
+            if audio_type.value not in SYNTHESIZED:
+                self.track(audio_type.value)
+                self.track(audio_type.value, loopable=True)
+
+
+# Create singleton instance
+audio_engine = AudioEngine(Settings.AUDIO_ASSETS_DIR, Settings.AUDIO_STREAM_CHUNK_BYTES)
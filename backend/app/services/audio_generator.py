@@ -0,0 +1,253 @@
+"""
+Audio generators
+Synthesizes study audio (binaural beats, white/pink/brown noise, silence)
+in fixed-size PCM16 blocks with vectorized NumPy. Generators carry their
+phase/filter state between blocks, so output is continuous however it is
+chunked, and each listener costs a few preallocated block buffers no
+matter how long it plays.
+"""
+import struct
+from abc import ABC, abstractmethod
+from typing import Iterator, List, Optional
+
+import numpy as np
+
+SAMPLE_RATE = 44100
+CHANNELS = 2
+SAMPLE_WIDTH = 2                                # bytes (PCM16)
+BLOCK_FRAMES = 4410                             # 100 ms per block
+UNKNOWN_LENGTH = 0xFFFFFFFF                     # WAV size field for endless streams
+
+TWO_PI = 2 * np.pi
+NOISE_COLORS = ("white", "pink", "brown")
+
+
+def wav_header(sample_rate: int = SAMPLE_RATE, channels: int = CHANNELS,
+               sample_width: int = SAMPLE_WIDTH, data_bytes: Optional[int] = None) -> bytes:
+    """
+    RIFF/WAVE header for PCM data
+
+    Args:
+        data_bytes: Length of the data chunk, or None for an endless stream.
+            Lengths past the 32-bit size fields (about 6.7 hours of 44.1 kHz
+            stereo) are written as unknown, like an endless stream.
+    """
+    block_align = channels * sample_width
+    if data_bytes is not None and 36 + data_bytes >= UNKNOWN_LENGTH:
+        data_bytes = None
+    data_size = UNKNOWN_LENGTH if data_bytes is None else data_bytes
+    riff_size = UNKNOWN_LENGTH if data_bytes is None else 36 + data_bytes
+    return (
+        b"RIFF" + struct.pack("<I", riff_size) + b"WAVE"
+        + b"fmt " + struct.pack("<IHHIIHH", 16, 1, channels, sample_rate,
+                                sample_rate * block_align, block_align, sample_width * 8)
+        + b"data" + struct.pack("<I", data_size)
+    )
+
+
+class SignalGenerator(ABC):
+    """
+    Base class: subclasses add their signal into a float (frames, 2) block
+    in the -1.0..1.0 range; next_block() turns the mix into PCM16 bytes
+    """
+
+    def __init__(self, volume: float = 0.3, sample_rate: int = SAMPLE_RATE, block_frames: int = BLOCK_FRAMES):
+        self.volume = float(np.clip(volume, 0.0, 1.0))
+        self.sample_rate = sample_rate
+        self.block_frames = block_frames
+        self._mix = np.empty((block_frames, CHANNELS), dtype=np.float64)
+        self._out = np.empty((block_frames, CHANNELS), dtype=np.int16)
+
+    @abstractmethod
+    def render(self, out: np.ndarray):
+        """Add this generator's next block_frames frames into out"""
+
+    def next_block(self) -> bytes:
+        self._mix.fill(0.0)
+        self.render(self._mix)
+        np.clip(self._mix, -1.0, 1.0, out=self._mix)
+        self._mix *= 32767
+        np.copyto(self._out, self._mix, casting="unsafe")
+        return self._out.tobytes()
+
+
+class SilenceGenerator(SignalGenerator):
+    """Digital silence; every block is the same preallocated buffer"""
+
+    def __init__(self, block_frames: int = BLOCK_FRAMES, **kwargs):
+        super().__init__(block_frames=block_frames, **kwargs)
+        self._block = bytes(block_frames * CHANNELS * SAMPLE_WIDTH)
+
+    def render(self, out: np.ndarray):
+        pass
+
+    def next_block(self) -> bytes:
+        return self._block
+
+
+class BinauralGenerator(SignalGenerator):
+    """
+    Binaural beat: a carrier tone on the left channel and carrier + beat
+    frequency on the right
+
+    Args:
+        carrier: Carrier frequency in Hz
+        beat: Beat (difference) frequency in Hz, e.g. 10 for alpha
+        volume: Output level, 0.0-1.0
+    """
+
+    def __init__(self, carrier: float = 200.0, beat: float = 10.0, volume: float = 0.3, **kwargs):
+        super().__init__(volume=volume, **kwargs)
+        self._step = np.array([carrier, carrier + beat], dtype=np.float64) * TWO_PI / self.sample_rate
+        self._phase = np.zeros(2, dtype=np.float64)
+        self._ramp = np.arange(self.block_frames, dtype=np.float64)[:, None]
+        self._work = np.empty((self.block_frames, 2), dtype=np.float64)
+
+    def render(self, out: np.ndarray):
+        np.multiply(self._ramp, self._step, out=self._work)
+        self._work += self._phase
+        np.sin(self._work, out=self._work)
+        self._work *= self.volume
+        out += self._work
+
+        # Carry the phase into the next block, wrapped to avoid precision loss
+        self._phase = (self._phase + self._step * self.block_frames) % TWO_PI
+
+
+class NoiseGenerator(SignalGenerator):
+    """
+    White, pink or brown noise (same signal on both channels)
+
+    Pink uses the Voss-McCartney algorithm: octave rows that each hold a
+    random value for 2**k samples, vectorized per block with the held
+    values carried across block boundaries. Brown is white noise through a
+    leaky integrator, evaluated in closed form over short sub-blocks.
+    """
+
+    PINK_ROWS = 16
+    BROWN_LEAK = 0.995
+    SUB_BLOCK = 512
+    # Roughly normalizes each color to the same loudness at a given volume
+    GAIN = {"white": 0.25, "pink": 0.25 / np.sqrt(PINK_ROWS + 1), "brown": 0.25 * np.sqrt(1 - BROWN_LEAK ** 2)}
+
+    def __init__(self, color: str = "pink", volume: float = 0.3, seed: Optional[int] = None, **kwargs):
+        super().__init__(volume=volume, **kwargs)
+        if color not in NOISE_COLORS:
+            raise ValueError(f"Unknown noise color: {color}")
+        self.color = color
+        self._rng = np.random.default_rng(seed)
+        self._gain = self.GAIN[color] * self.volume
+        self._sample_index = 0
+        self._white = np.empty(self.block_frames, dtype=np.float64)
+        self._mono = np.empty(self.block_frames, dtype=np.float64)
+
+        if color == "pink":
+            self._rows = self._rng.standard_normal(self.PINK_ROWS)
+            self._ramp = np.arange(self.block_frames, dtype=np.int64)
+            # Work buffers, so a block allocates nothing
+            self._positions = np.empty(self.block_frames, dtype=np.int64)
+            self._segment = np.empty(self.block_frames, dtype=np.int64)
+            self._values = np.empty(self.block_frames + 1, dtype=np.float64)
+            self._held = np.empty(self.block_frames, dtype=np.float64)
+        elif color == "brown":
+            self._level = 0.0
+            k = np.arange(self.SUB_BLOCK, dtype=np.float64)
+            self._decay = self.BROWN_LEAK ** k                   # a^n
+            self._inv_decay = self.BROWN_LEAK ** -k              # a^-n
+
+    def _pink(self, white: np.ndarray, mono: np.ndarray):
+        np.copyto(mono, white)
+        start = self._sample_index
+        positions, segment = self._positions, self._segment
+        np.add(self._ramp, start, out=positions)
+        for k in range(self.PINK_ROWS):
+            np.right_shift(positions, k, out=segment)
+            segment -= start >> k
+            values = self._values[:int(segment[-1]) + 1]
+            self._rng.standard_normal(out=values)
+            if start & ((1 << k) - 1):
+                # Block starts mid-hold: keep the value from the previous block
+                values[0] = self._rows[k]
+            np.take(values, segment, out=self._held)
+            mono += self._held
+            self._rows[k] = values[-1]
+
+    def _brown(self, white: np.ndarray, mono: np.ndarray):
+        # y[n] = a*y[n-1] + x[n]  =>  y[n] = a^n * (a*y[-1] + sum_{k<=n} x[k] * a^-k)
+        for pos in range(0, self.block_frames, self.SUB_BLOCK):
+            x = white[pos:pos + self.SUB_BLOCK]
+            n = len(x)
+            # Computed in place in the output slice
+            y = mono[pos:pos + n]
+            np.multiply(x, self._inv_decay[:n], out=y)
+            np.cumsum(y, out=y)
+            y += self.BROWN_LEAK * self._level
+            y *= self._decay[:n]
+            self._level = y[-1]
+
+    def render(self, out: np.ndarray):
+        white = self._rng.standard_normal(self.block_frames, out=self._white)
+        if self.color == "white":
+            np.copyto(self._mono, white)
+        elif self.color == "pink":
+            self._pink(white, self._mono)
+        else:
+            self._brown(white, self._mono)
+        self._sample_index += self.block_frames
+        self._mono *= self._gain
+        out += self._mono[:, None]
+
+
+class MixGenerator(SignalGenerator):
+    """Sum of several generators sharing one output buffer"""
+
+    def __init__(self, generators: List[SignalGenerator], **kwargs):
+        super().__init__(volume=1.0, **kwargs)
+        self.generators = generators
+
+    def render(self, out: np.ndarray):
+        for generator in self.generators:
+            generator.render(out)
+
+
+def stream_blocks(generator, total_frames: Optional[int] = None) -> Iterator[bytes]:
+    """Yield blocks from a generator, trimming the last one to total_frames"""
+    frame_bytes = CHANNELS * SAMPLE_WIDTH
+    remaining = None if total_frames is None else total_frames * frame_bytes
+    while remaining is None or remaining > 0:
+        block = generator.next_block()
+        if remaining is not None:
+            block = block[:remaining]
+            remaining -= len(block)
+        yield block
+
+
+def with_header(header: bytes, chunks: Iterator) -> Iterator:
+    """Prepend a container header to a chunk stream"""
+    yield header
+    yield from chunks
+
+
+def create_generator(signal: str, carrier: float = 200.0, beat: float = 10.0, volume: float = 0.3,
+                     noise: Optional[str] = None, noise_volume: float = 0.1) -> SignalGenerator:
+    """
+    Build a generator from per-client parameters
+
+    Args:
+        signal: "binaural", "silence" or a noise color ("white", "pink", "brown")
+        carrier, beat: Binaural frequencies in Hz
+        volume: Level of the main signal, 0.0-1.0
+        noise: Optional noise color mixed under a binaural signal
+        noise_volume: Level of that noise bed
+    """
+    if signal == "silence":
+        return SilenceGenerator()
+    if signal in NOISE_COLORS:
+        return NoiseGenerator(signal, volume=volume)
+    if signal != "binaural":
+        raise ValueError(f"Unknown signal: {signal}")
+
+    binaural = BinauralGenerator(carrier=carrier, beat=beat, volume=volume)
+    if noise is None:
+        return binaural
+    return MixGenerator([binaural, NoiseGenerator(noise, volume=noise_volume)])
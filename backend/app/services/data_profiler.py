@@ -0,0 +1,335 @@
+"""
+Data profiler
+Deterministic pre-analysis for visualization requests: column types,
+cardinalities, ranges and a stratified sample, plus rule-based chart
+selection so that common queries never need a model call.
+"""
+import json
+import re
+from datetime import date, datetime, timezone
+from typing import Any, Dict, List, Optional
+
+NUMERIC = "numeric"
+BOOLEAN = "boolean"
+DATETIME = "datetime"
+CATEGORICAL = "categorical"
+TEXT = "text"
+EMPTY = "empty"
+
+# A string column with at most this many distinct values is categorical
+MAX_CATEGORIES = 20
+# Pie charts stop being readable past this many slices
+MAX_PIE_SLICES = 8
+
+_INTENT_KEYWORDS = {
+    "trend": ("over time", "trend", "progress", "history", "timeline", "daily", "weekly", "per day"),
+    "share": ("distribution", "breakdown", "proportion", "share", "split", "ratio", "vs distracted",
+              "focus performance", "how much time"),
+    "compare": ("compare", "comparison", "versus", " vs ", "rank", "top", "best", "worst", "across", "each"),
+    "correlate": ("correlat", "relationship", "against", "scatter", "depend"),
+}
+
+_DURATION_HINTS = ("seconds", "minutes", "count", "time")
+
+
+def normalize_records(data: Any) -> List[Dict[str, Any]]:
+    """
+    Coerce the shapes the API receives into a list of row dicts
+
+    Supports a list of dicts, a dict of equal-length column lists, a dict
+    wrapping a single list of dicts (e.g. {"sessions": [...]}) and a flat
+    dict of scalars (treated as one row).
+    """
+    if isinstance(data, list):
+        return [row if isinstance(row, dict) else {"value": row} for row in data]
+
+    if not isinstance(data, dict) or not data:
+        return []
+
+    list_values = [v for v in data.values() if isinstance(v, list)]
+    if len(data) == 1 and list_values and all(isinstance(r, dict) for r in list_values[0]):
+        return list(list_values[0])
+
+    if len(list_values) == len(data):
+        length = len(list_values[0])
+        if all(len(v) == length for v in list_values):
+            keys = list(data)
+            return [{k: data[k][i] for k in keys} for i in range(length)]
+
+    return [data]
+
+
+def _as_utc(value: datetime) -> datetime:
+    # Naive values are taken as UTC, so mixed columns stay comparable
+    if value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc)
+
+
+def _parse_datetime(value: Any) -> Optional[datetime]:
+    """Dates and ISO 8601 strings as UTC-aware datetimes, else None"""
+    if isinstance(value, datetime):
+        return _as_utc(value)
+    if isinstance(value, date):
+        return datetime(value.year, value.month, value.day, tzinfo=timezone.utc)
+    if isinstance(value, str) and len(value) >= 8 and value[:4].isdigit():
+        try:
+            return _as_utc(datetime.fromisoformat(value.replace("Z", "+00:00")))
+        except ValueError:
+            return None
+    return None
+
+
+def _column_type(values: List[Any], row_count: int) -> str:
+    present = [v for v in values if v is not None]
+    if not present:
+        return EMPTY
+    if all(isinstance(v, bool) for v in present):
+        return BOOLEAN
+    if all(isinstance(v, (int, float)) and not isinstance(v, bool) for v in present):
+        return NUMERIC
+    if all(_parse_datetime(v) is not None for v in present):
+        return DATETIME
+    distinct = len(set(map(str, present)))
+    if distinct <= max(MAX_CATEGORIES, row_count // 2) and all(isinstance(v, str) and len(v) <= 80 for v in present):
+        return CATEGORICAL
+    return TEXT
+
+
+def _profile_column(values: List[Any], row_count: int) -> Dict[str, Any]:
+    col_type = _column_type(values, row_count)
+    present = [v for v in values if v is not None]
+    info: Dict[str, Any] = {
+        "type": col_type,
+        "nulls": len(values) - len(present),
+        "cardinality": len(set(map(str, present))),
+    }
+
+    if col_type == NUMERIC:
+        info["min"] = min(present)
+        info["max"] = max(present)
+        info["mean"] = round(sum(present) / len(present), 3)
+    elif col_type == DATETIME:
+        parsed = [_parse_datetime(v) for v in present]
+        info["min"] = min(parsed).isoformat()
+        info["max"] = max(parsed).isoformat()
+    elif col_type in (CATEGORICAL, BOOLEAN):
+        counts: Dict[str, int] = {}
+        for v in present:
+            counts[str(v)] = counts.get(str(v), 0) + 1
+        info["top"] = sorted(counts.items(), key=lambda kv: -kv[1])[:5]
+
+    return info
+
+
+def _stratified_sample(rows: List[Dict[str, Any]], columns: Dict[str, Dict], size: int) -> List[Dict[str, Any]]:
+    """Sample rows evenly across the lowest-cardinality categorical column"""
+    if len(rows) <= size:
+        return rows
+
+    strata_candidates = [
+        name for name, info in columns.items()
+        if info["type"] in (CATEGORICAL, BOOLEAN) and 1 < info["cardinality"] <= size
+    ]
+    if not strata_candidates:
+        step = len(rows) / size
+        return [rows[int(i * step)] for i in range(size)]
+
+    strata_col = min(strata_candidates, key=lambda name: columns[name]["cardinality"])
+    groups: Dict[str, List[Dict[str, Any]]] = {}
+    for row in rows:
+        groups.setdefault(str(row.get(strata_col)), []).append(row)
+
+    # Round-robin across groups so every stratum is represented
+    sample: List[Dict[str, Any]] = []
+    depth = 0
+    while len(sample) < size:
+        added = False
+        for group in groups.values():
+            if depth < len(group):
+                sample.append(group[depth])
+                added = True
+                if len(sample) == size:
+                    break
+        if not added:
+            break
+        depth += 1
+    return sample
+
+
+def profile_data(data: Any, sample_size: int = 20) -> Dict[str, Any]:
+    """
+    Profile a visualization payload without serializing it
+
+    Returns:
+        dict with row_count, per-column type/cardinality/range info and a
+        stratified sample of at most sample_size rows
+    """
+    rows = normalize_records(data)
+    names: List[str] = []
+    for row in rows:
+        for key in row:
+            if key not in names:
+                names.append(key)
+
+    columns = {
+        name: _profile_column([row.get(name) for row in rows], len(rows))
+        for name in names
+    }
+
+    return {
+        "row_count": len(rows),
+        "columns": columns,
+        "sample": _stratified_sample(rows, columns, sample_size),
+        "_rows": rows,
+    }
+
+
+def summarize_profile(profile: Dict[str, Any], sample_rows: int = 5) -> str:
+    """Compact JSON schema summary used as model input"""
+    summary = {
+        "row_count": profile["row_count"],
+        "columns": profile["columns"],
+        "sample": profile["sample"][:sample_rows],
+    }
+    return json.dumps(summary, separators=(",", ":"), default=str)
+
+
+def _intents(query: str) -> List[str]:
+    q = f" {query.lower()} "
+    return [intent for intent, words in _INTENT_KEYWORDS.items() if any(w in q for w in words)]
+
+
+def _pick_measure(candidates: List[str], query: str) -> str:
+    """Numeric column the query most likely refers to"""
+    tokens = set(re.findall(r"[a-z]+", query.lower()))
+    for name in candidates:
+        if tokens & set(name.lower().split("_")):
+            return name
+    for name in candidates:
+        if "attention" in name.lower():
+            return name
+    return candidates[0]
+
+
+def _title(name: str) -> str:
+    return name.replace("_", " ").title()
+
+
+def _range_insight(name: str, info: Dict[str, Any]) -> str:
+    return f"{_title(name)} ranges from {info['min']} to {info['max']} (mean {info['mean']})"
+
+
+def select_chart(profile: Dict[str, Any], query: str) -> Optional[Dict[str, Any]]:
+    """
+    Rule-based chart selection
+
+    Returns:
+        A chart spec in the same shape the model is asked for, or None when
+        the data/query combination is ambiguous and needs the model
+    """
+    columns = profile["columns"]
+    rows = profile["_rows"]
+    if not rows:
+        return None
+
+    by_type: Dict[str, List[str]] = {}
+    for name, info in columns.items():
+        by_type.setdefault(info["type"], []).append(name)
+    numeric = by_type.get(NUMERIC, [])
+    datetimes = by_type.get(DATETIME, [])
+    categorical = by_type.get(CATEGORICAL, []) + by_type.get(BOOLEAN, [])
+    intents = _intents(query)
+
+    if not numeric:
+        return None
+
+    # Single summary row, e.g. focused/distracted seconds for one session
+    if len(rows) == 1:
+        row = rows[0]
+        durations = [n for n in numeric if any(h in n.lower() for h in _DURATION_HINTS)]
+        if len(durations) >= 2 and "trend" not in intents:
+            total = sum(row[n] or 0 for n in durations) or 1
+            return {
+                "chart_type": "pie",
+                "x_axis": "field",
+                "y_axis": "value",
+                "fields": durations,
+                "title": "Time Distribution",
+                "insights": [f"{_title(n)}: {row[n]} ({100 * (row[n] or 0) / total:.1f}%)" for n in durations],
+                "color_field": None,
+                "source": "rules",
+            }
+        if len(numeric) >= 2 and ("compare" in intents or not intents):
+            return {
+                "chart_type": "bar",
+                "x_axis": "field",
+                "y_axis": "value",
+                "fields": numeric,
+                "title": "Session Metrics",
+                "insights": [f"{_title(n)}: {row[n]}" for n in numeric],
+                "color_field": None,
+                "source": "rules",
+            }
+        return None
+
+    if len(intents) > 1:
+        return None
+    intent = intents[0] if intents else None
+
+    if datetimes and intent in (None, "trend"):
+        x, y = datetimes[0], _pick_measure(numeric, query)
+        # Rows without a timestamp sort last and don't count as the period's end
+        stamped = [(_parse_datetime(r.get(x)), r) for r in rows]
+        ordered = [r for dt, r in sorted(stamped, key=lambda pair: (pair[0] is None, pair[0])) if dt is not None]
+        first, last = (ordered[0].get(y), ordered[-1].get(y)) if ordered else (None, None)
+        insights = [_range_insight(y, columns[y])]
+        if isinstance(first, (int, float)) and isinstance(last, (int, float)):
+            insights.append(f"{_title(y)} went from {first} to {last} over the period")
+        return {
+            "chart_type": "line",
+            "x_axis": x,
+            "y_axis": y,
+            "title": f"{_title(y)} Over Time",
+            "insights": insights,
+            "color_field": categorical[0] if categorical else None,
+            "source": "rules",
+        }
+
+    if categorical and intent in (None, "compare", "share"):
+        x, y = categorical[0], _pick_measure(numeric, query)
+        if intent == "share" and columns[x]["cardinality"] > MAX_PIE_SLICES:
+            return None
+        valued = [r for r in rows if isinstance(r.get(y), (int, float))]
+        if not valued:
+            return None
+        best = max(valued, key=lambda r: r[y])
+        worst = min(valued, key=lambda r: r[y])
+        return {
+            "chart_type": "pie" if intent == "share" else "bar",
+            "x_axis": x,
+            "y_axis": y,
+            "title": f"{_title(y)} by {_title(x)}",
+            "insights": [
+                f"Highest {_title(y)}: {best.get(x)} ({best[y]})",
+                f"Lowest {_title(y)}: {worst.get(x)} ({worst[y]})",
+                _range_insight(y, columns[y]),
+            ],
+            "color_field": None,
+            "source": "rules",
+        }
+
+    if len(numeric) >= 2 and intent == "correlate":
+        y = _pick_measure(numeric, query)
+        x = next(n for n in numeric if n != y)
+        return {
+            "chart_type": "scatter",
+            "x_axis": x,
+            "y_axis": y,
+            "title": f"{_title(y)} vs {_title(x)}",
+            "insights": [_range_insight(x, columns[x]), _range_insight(y, columns[y])],
+            "color_field": categorical[0] if categorical else None,
+            "source": "rules",
+        }
+
+    return None
@@ -0,0 +1,50 @@
+"""
+Event hub
+Fans server-side events (Pomodoro phase changes, ...) out to connected
+WebSocket clients. Each client gets a small bounded queue; a client that
+stops reading loses its oldest events instead of slowing down publishers.
+"""
+import asyncio
+from typing import Optional, Set
+
+
+class EventSubscription:
+    """Queue of events for one client, optionally filtered to one session"""
+
+    def __init__(self, session_id: Optional[str] = None, max_queued: int = 100):
+        self.session_id = session_id
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=max_queued)
+
+    def offer(self, event: dict):
+        if self.session_id is not None and event.get("session_id") not in (None, self.session_id):
+            return
+        if self.queue.full():
+            self.queue.get_nowait()
+        self.queue.put_nowait(event)
+
+
+class EventHub:
+    """Publish/subscribe for events; must be used from the event loop thread"""
+
+    def __init__(self, max_queued: int = 100):
+        self.max_queued = max_queued
+        self._subscriptions: Set[EventSubscription] = set()
+
+    def subscribe(self, session_id: Optional[str] = None) -> EventSubscription:
+        subscription = EventSubscription(session_id, self.max_queued)
+        self._subscriptions.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: EventSubscription):
+        self._subscriptions.discard(subscription)
+
+    def publish(self, event: dict):
+        for subscription in self._subscriptions:
+            subscription.offer(event)
+
+    def __len__(self) -> int:
+        return len(self._subscriptions)
+
+
+# Create singleton instance
+event_hub = EventHub()
@@ -0,0 +1,239 @@
+"""
+Face detector backends
+The attention detector asks a FaceDetector for face boxes; the eye check
+and scoring stay the same whichever backend finds the face.
+
+- haar: OpenCV's frontal face Haar cascade (default, no model files needed)
+- dnn: OpenCV DNN SSD face detector on the CPU (res10_300x300 Caffe model,
+  or any cv2.dnn model with the same [1, 1, N, 7] detection output). A
+  single shared instance serves every stream, and frames that arrive while
+  a forward pass is running are batched into the next one.
+"""
+import os
+import queue
+import threading
+import time
+from abc import ABC, abstractmethod
+from concurrent.futures import Future
+from typing import List, Optional, Sequence, Tuple
+
+import cv2
+import numpy as np
+
+from app.config import Settings
+
+# (x, y, w, h, confidence)
+Face = Tuple[int, int, int, int, float]
+
+
+class FaceDetector(ABC):
+    """Base class; detect_batch takes BGR frames, or gray ones if input_gray"""
+
+    name = ""
+    input_gray = False
+
+    def load(self):
+        """Load models; safe to call more than once"""
+
+    @abstractmethod
+    def detect_batch(self, images: Sequence[np.ndarray]) -> List[List[Face]]:
+        """Faces found in each image, in input order"""
+
+    def detect(self, image: np.ndarray) -> List[Face]:
+        return self.detect_batch([image])[0]
+
+
+class HaarFaceDetector(FaceDetector):
+    """Frontal face Haar cascade; one instance per stream, cascades aren't shared across threads"""
+
+    name = "haar"
+    input_gray = True
+
+    def __init__(self, scale_factor: float = 1.3, min_neighbors: int = 5):
+        self.scale_factor = scale_factor
+        self.min_neighbors = min_neighbors
+        self.cascade = None
+
+    def load(self):
+        if self.cascade is None:
+            self.cascade = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
+
+    def detect_batch(self, images: Sequence[np.ndarray]) -> List[List[Face]]:
+        # Cascades have no batched mode
+        return [
+            [(int(x), int(y), int(w), int(h), 1.0)
+             for x, y, w, h in self.cascade.detectMultiScale(gray, self.scale_factor, self.min_neighbors)]
+            for gray in images
+        ]
+
+
+class DnnFaceDetector(FaceDetector):
+    """
+    SSD face detector run with cv2.dnn on the CPU
+
+    Args:
+        model_path: Weights (e.g. res10_300x300_ssd_iter_140000.caffemodel)
+        config_path: Network description (e.g. deploy.prototxt), if the format needs one
+        input_size: Side of the square network input
+        confidence: Minimum detection confidence
+        threads: OpenCV worker threads (process-wide); 0 keeps OpenCV's default
+    """
+
+    name = "dnn"
+
+    def __init__(self, model_path: str, config_path: Optional[str] = None, input_size: int = 300,
+                 confidence: float = 0.5, threads: int = 0):
+        self.model_path = str(model_path)
+        self.config_path = str(config_path) if config_path else ""
+        self.input_size = input_size
+        self.confidence = confidence
+        self.threads = threads
+        self.net = None
+        self._lock = threading.Lock()
+
+    def load(self):
+        with self._lock:
+            if self.net is not None:
+                return
+            if self.threads > 0:
+                cv2.setNumThreads(self.threads)
+            net = cv2.dnn.readNet(self.model_path, self.config_path)
+            net.setPreferableBackend(cv2.dnn.DNN_BACKEND_OPENCV)
+            net.setPreferableTarget(cv2.dnn.DNN_TARGET_CPU)
+            self.net = net
+
+    def detect_batch(self, images: Sequence[np.ndarray]) -> List[List[Face]]:
+        """One forward pass over all images"""
+        if not images:
+            return []
+        size = (self.input_size, self.input_size)
+        # Mean BGR values the res10 model was trained with
+        blob = cv2.dnn.blobFromImages(list(images), 1.0, size, (104.0, 177.0, 123.0), swapRB=False, crop=False)
+        with self._lock:
+            self.net.setInput(blob)
+            detections = self.net.forward()
+
+        faces: List[List[Face]] = [[] for _ in images]
+        # Rows are [image index, label, confidence, x1, y1, x2, y2] with coordinates in 0-1
+        for index, _, confidence, x1, y1, x2, y2 in detections.reshape(-1, 7):
+            if confidence < self.confidence or not 0 <= index < len(images):
+                continue
+            height, width = images[int(index)].shape[:2]
+            left, top = max(0, int(x1 * width)), max(0, int(y1 * height))
+            right, bottom = min(width, int(x2 * width)), min(height, int(y2 * height))
+            if right > left and bottom > top:
+                faces[int(index)].append((left, top, right - left, bottom - top, float(confidence)))
+        return faces
+
+
+class BatchingFaceDetector(FaceDetector):
+    """
+    Coalesces detect() calls from several threads (one per stream) into
+    batched detect_batch() calls on a worker thread
+
+    Args:
+        detector: Backend that benefits from batching
+        max_batch: Most frames per forward pass
+        max_wait: Seconds to hold a batch open for more frames; 0 only
+            batches frames that queued up during the previous pass
+        timeout: Seconds detect() waits for its result before raising
+    """
+
+    def __init__(self, detector: FaceDetector, max_batch: int = 8, max_wait: float = 0.0, timeout: float = 5.0):
+        self.detector = detector
+        self.name = detector.name
+        self.input_gray = detector.input_gray
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.timeout = timeout
+        self._queue: "queue.SimpleQueue[Tuple[np.ndarray, Future]]" = queue.SimpleQueue()
+        self._worker: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def load(self):
+        self.detector.load()
+        with self._lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._run, name=f"face-{self.name}-batcher", daemon=True)
+                self._worker.start()
+
+    def detect_batch(self, images: Sequence[np.ndarray]) -> List[List[Face]]:
+        return self.detector.detect_batch(images)
+
+    def detect(self, image: np.ndarray) -> List[Face]:
+        """Raises concurrent.futures.TimeoutError if no result arrives within timeout"""
+        worker = self._worker
+        if worker is None or not worker.is_alive():
+            # Never loaded, or the worker died: (re)start it rather than wait forever
+            self.load()
+        future: Future = Future()
+        self._queue.put((image, future))
+        return future.result(timeout=self.timeout)
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.max_wait
+            while len(batch) < self.max_batch:
+                try:
+                    remaining = deadline - time.monotonic()
+                    batch.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                results = self.detector.detect_batch([image for image, _ in batch])
+            except Exception as e:
+                print(f"Face detection failed for a batch of {len(batch)}: {e}")
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+            for (_, future), faces in zip(batch, results):
+                future.set_result(faces)
+
+
+def dnn_model_available(model_path=None, config_path=None) -> bool:
+    model_path = model_path or Settings.FACE_DNN_MODEL
+    config_path = Settings.FACE_DNN_CONFIG if config_path is None else config_path
+    return os.path.isfile(model_path) and (not config_path or os.path.isfile(config_path))
+
+
+def create_dnn_detector(model_path=None, config_path=None, threads: Optional[int] = None) -> DnnFaceDetector:
+    """A DnnFaceDetector configured from Settings, with optional overrides"""
+    return DnnFaceDetector(
+        model_path or Settings.FACE_DNN_MODEL,
+        Settings.FACE_DNN_CONFIG if config_path is None else config_path,
+        input_size=Settings.FACE_DNN_INPUT_SIZE,
+        confidence=Settings.FACE_DNN_CONFIDENCE,
+        threads=Settings.FACE_DETECTOR_THREADS if threads is None else threads,
+    )
+
+
+_shared_dnn: Optional[BatchingFaceDetector] = None
+_shared_lock = threading.Lock()
+
+
+def create_face_detector(name: Optional[str] = None) -> FaceDetector:
+    """
+    The detector backend for one stream
+
+    Args:
+        name: "haar" or "dnn"; defaults to Settings.FACE_DETECTOR
+
+    Returns:
+        A new Haar detector, or the process-wide batching DNN detector. Falls
+        back to Haar when the DNN model files are missing.
+    """
+    global _shared_dnn
+    name = (name or Settings.FACE_DETECTOR).lower()
+    if name == "dnn":
+        if not dnn_model_available():
+            print(f"Face detector: DNN model not found at {Settings.FACE_DNN_MODEL}, using Haar cascades")
+            return HaarFaceDetector()
+        with _shared_lock:
+            if _shared_dnn is None:
+                _shared_dnn = BatchingFaceDetector(
+                    create_dnn_detector(), Settings.FACE_BATCH_MAX, Settings.FACE_BATCH_WAIT_MS / 1000)
+            return _shared_dnn
+    if name != "haar":
+        print(f"Face detector: unknown backend {name!r}, using Haar cascades")
+    return HaarFaceDetector()
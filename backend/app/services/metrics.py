@@ -0,0 +1,343 @@
+"""
+Metrics registry
+Counters, gauges and fixed-bucket histograms, exported in the Prometheus
+text format at /metrics. Hot-path updates take no lock: counters and
+histograms keep one cell per thread, each written only by its own thread,
+and a scrape sums the cells. A scrape may therefore miss an update that is
+in flight, never a completed one.
+"""
+import bisect
+import functools
+import math
+import threading
+import time
+from abc import ABC, abstractmethod
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+# Seconds; covers sub-millisecond repository calls up to slow model requests
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    if value == int(value) and abs(value) < 1e15:
+        return str(int(value))
+    return repr(float(value))
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _label_text(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class _ShardedCells:
+    """One mutable cell per thread; only the owning thread writes to it"""
+
+    __slots__ = ("_cells", "_lock", "_factory")
+
+    def __init__(self, factory: Callable[[], list]):
+        self._cells: Dict[int, list] = {}
+        self._lock = threading.Lock()
+        self._factory = factory
+
+    def cell(self) -> list:
+        cell = self._cells.get(threading.get_ident())
+        if cell is None:
+            with self._lock:
+                cell = self._factory()
+                # Copy on write, so a scrape iterating the cells never sees the dict change
+                cells = dict(self._cells)
+                cells[threading.get_ident()] = cell
+                self._cells = cells
+        return cell
+
+    def all(self) -> Iterable[list]:
+        return self._cells.values()
+
+
+class _CounterChild:
+    __slots__ = ("_shards",)
+
+    def __init__(self):
+        self._shards = _ShardedCells(lambda: [0.0])
+
+    def inc(self, amount: float = 1.0):
+        self._shards.cell()[0] += amount
+
+    def value(self) -> float:
+        return sum(cell[0] for cell in self._shards.all())
+
+
+class _GaugeChild:
+    __slots__ = ("_value", "_function", "_lock")
+
+    def __init__(self):
+        self._value = 0.0
+        self._function: Optional[Callable[[], float]] = None
+        self._lock = threading.Lock()
+
+    def set(self, value: float):
+        self._value = value
+
+    def inc(self, amount: float = 1.0):
+        with self._lock:
+            self._value += amount
+
+    def dec(self, amount: float = 1.0):
+        self.inc(-amount)
+
+    def set_function(self, function: Callable[[], float]):
+        """Read the value from function at scrape time instead"""
+        self._function = function
+
+    def value(self) -> float:
+        return float(self._function()) if self._function is not None else self._value
+
+
+class _HistogramChild:
+    __slots__ = ("_bounds", "_shards")
+
+    def __init__(self, bounds: Tuple[float, ...]):
+        self._bounds = bounds
+        # cell = [count per bucket (+Inf last), sum]
+        self._shards = _ShardedCells(lambda: [[0] * (len(bounds) + 1), 0.0])
+
+    def observe(self, value: float):
+        cell = self._shards.cell()
+        cell[0][bisect.bisect_left(self._bounds, value)] += 1
+        cell[1] += value
+
+    def time(self) -> "_Timer":
+        """Context manager observing the duration of its block"""
+        return _Timer(self)
+
+    def snapshot(self) -> Tuple[List[int], float]:
+        counts = [0] * (len(self._bounds) + 1)
+        total = 0.0
+        for bucket_counts, value_sum in self._shards.all():
+            for i, c in enumerate(bucket_counts):
+                counts[i] += c
+            total += value_sum
+        return counts, total
+
+
+class _Timer:
+    __slots__ = ("_histogram", "_started")
+
+    def __init__(self, histogram: _HistogramChild):
+        self._histogram = histogram
+
+    def __enter__(self):
+        self._started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self._histogram.observe(time.perf_counter() - self._started)
+        return False
+
+
+class _Metric(ABC):
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[Tuple[str, ...], object] = {}
+        self._lock = threading.Lock()
+        if not self.labelnames:
+            # Unlabeled metrics act as their only child
+            child = self.labels()
+            for method in ("inc", "dec", "set", "set_function", "observe", "time", "value"):
+                if hasattr(child, method):
+                    setattr(self, method, getattr(child, method))
+
+    @abstractmethod
+    def _new_child(self):
+        """A fresh child holding one label combination's value"""
+
+    def labels(self, *values, **named):
+        """
+        The child for one combination of label values
+
+        Look children up once and keep them for hot paths; each lookup is a
+        dict access.
+        """
+        if named:
+            values = tuple(named[name] for name in self.labelnames)
+        key = tuple(str(v) for v in values)
+        child = self._children.get(key)
+        if child is None:
+            if len(key) != len(self.labelnames):
+                raise ValueError(f"{self.name} expects labels {self.labelnames}, got {key}")
+            with self._lock:
+                child = self._children.get(key)
+                if child is None:
+                    child = self._new_child()
+                    # Copy on write, like the per-thread cells
+                    self._children = {**self._children, key: child}
+        return child
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {_escape(self.documentation)}", f"# TYPE {self.name} {self.kind}"]
+        for key, child in sorted(self._children.items()):
+            lines.extend(self._render_child(key, child))
+        return lines
+
+    def _render_child(self, key, child) -> List[str]:
+        return [f"{self.name}{_label_text(self.labelnames, key)} {_format_value(child.value())}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def _new_child(self):
+        return _CounterChild()
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def _new_child(self):
+        return _GaugeChild()
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.bounds = tuple(sorted(float(b) for b in buckets if not math.isinf(b)))
+        super().__init__(name, documentation, labelnames)
+
+    def _new_child(self):
+        return _HistogramChild(self.bounds)
+
+    def _render_child(self, key, child) -> List[str]:
+        counts, total = child.snapshot()
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.bounds + (math.inf,), counts):
+            cumulative += count
+            le = f'le="{_format_value(bound)}"'
+            lines.append(f"{self.name}_bucket{_label_text(self.labelnames, key, le)} {cumulative}")
+        labels = _label_text(self.labelnames, key)
+        lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+        lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class MetricsRegistry:
+    """Named metrics; registering an existing name returns the same metric"""
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def _register(self, cls, name: str, documentation: str, labelnames: Sequence[str], **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, documentation, labelnames, **kwargs)
+            elif type(metric) is not cls or metric.labelnames != tuple(labelnames):
+                raise ValueError(f"Metric {name} is already registered with a different type or labels")
+            return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._register(Counter, name, documentation, labelnames)
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self._register(Gauge, name, documentation, labelnames)
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram, name, documentation, labelnames, buckets=buckets)
+
+    def render(self) -> str:
+        """All metrics in the Prometheus text exposition format (0.0.4)"""
+        lines = []
+        for name in sorted(self._metrics):
+            try:
+                lines.extend(self._metrics[name].render())
+            except Exception as e:
+                # A failing gauge callback shouldn't take the whole scrape down
+                print(f"Metrics: could not collect {name}: {e}")
+        return "\n".join(lines) + "\n"
+
+
+def timed(histogram: _HistogramChild, errors: Optional[_CounterChild] = None):
+    """
+    Decorator observing each call's duration in histogram (and counting
+    exceptions in errors)
+    """
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            except Exception:
+                if errors is not None:
+                    errors.inc()
+                raise
+            finally:
+                histogram.observe(time.perf_counter() - started)
+        return wrapper
+    return decorator
+
+
+# Create singleton instance
+metrics = MetricsRegistry()
+
+HTTP_REQUESTS = metrics.counter(
+    "http_requests_total", "HTTP requests by method, route and status", ("method", "route", "status"))
+HTTP_SECONDS = metrics.histogram(
+    "http_request_duration_seconds", "Time until the response started, by method and route", ("method", "route"))
+HTTP_IN_PROGRESS = metrics.gauge("http_requests_in_progress", "HTTP requests being handled")
+
+
+class HTTPMetricsMiddleware:
+    """
+    ASGI middleware counting requests and timing them until the response
+    starts (streaming bodies keep going after that). Requests are labeled
+    with the route template, e.g. /api/pomodoro/{session_id}, so ids don't
+    multiply the series.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        started = time.perf_counter()
+        status = 500
+        method = scope["method"]
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                HTTP_SECONDS.labels(method, _route(scope)).observe(time.perf_counter() - started)
+            await send(message)
+
+        HTTP_IN_PROGRESS.inc()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            HTTP_IN_PROGRESS.dec()
+            HTTP_REQUESTS.labels(method, _route(scope), status).inc()
+
+
+def _route(scope) -> str:
+    # The router stores the matched route in the scope
+    route = scope.get("route")
+    return getattr(route, "path", None) or "unmatched"
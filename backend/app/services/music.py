@@ -3,11 +3,19 @@ Music service for playing background audio during study sessions.
 Supports various audio types: lofi, nature, classical, ambient, binaural, silence.
 """
 import os
-import subprocess
 import platform
-from typing import Optional, Dict
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Optional, Dict, Iterable, List
 from enum import Enum
 
+from app.config import Settings
+
+# Key used when a caller doesn't pass a session id (single-user clients)
+DEFAULT_SESSION = "default"
+
 
 class AudioType(str, Enum):
     """Supported audio types"""
@@ -19,13 +27,162 @@ class AudioType(str, Enum):
     SILENCE = "silence"
 
 
+class PlaybackState:
+    """Playback state of one study session"""
+    
+    __slots__ = ("session_id", "is_playing", "audio_type", "volume", "duration_minutes", "updated_at", "last_access")
+    
+    def __init__(self, session_id: str):
+        self.session_id = session_id
+        self.is_playing = False
+        self.audio_type: Optional[str] = None
+        self.volume = 100
+        self.duration_minutes: Optional[int] = None
+        self.updated_at = time.time()
+        self.last_access = time.monotonic()
+
+
+class MusicSessionRegistry:
+    """
+    Session-keyed playback states with O(1) lookups and idle eviction
+    
+    States are kept in access order, so evicting idle sessions only looks at
+    the least recently used end. With persistence enabled, changes are
+    written to the music_playback table by a background thread in batches
+    and evicted sessions are reloaded from it on their next access.
+    """
+    
+    def __init__(self, idle_ttl: float = 3600, max_sessions: int = 10000, persist: bool = False):
+        self.idle_ttl = idle_ttl
+        self.max_sessions = max_sessions
+        self.persist = persist
+        self._states: "OrderedDict[str, PlaybackState]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._dirty: Dict[str, PlaybackState] = {}
+        self._flush_event = threading.Event()
+        self._flush_thread: Optional[threading.Thread] = None
+    
+    def get(self, session_id: str) -> PlaybackState:
+        """Return the session's state, creating (or reloading) it if needed"""
+        now = time.monotonic()
+        with self._lock:
+            state = self._states.get(session_id)
+            if state is not None:
+                self._states.move_to_end(session_id)
+                state.last_access = now
+                return state
+        
+        state = self._load(session_id) or PlaybackState(session_id)
+        with self._lock:
+            # Another thread may have created it meanwhile
+            existing = self._states.get(session_id)
+            if existing is not None:
+                return existing
+            self._states[session_id] = state
+            self._evict_locked(now)
+        return state
+    
+    def peek(self, session_ids: Iterable[str]) -> Dict[str, Optional[PlaybackState]]:
+        """Batch lookup that doesn't create states for unknown sessions"""
+        with self._lock:
+            found = {sid: self._states.get(sid) for sid in session_ids}
+        missing = [sid for sid, state in found.items() if state is None]
+        if missing:
+            found.update(self._load_many(missing))
+        return found
+    
+    def mark_changed(self, state: PlaybackState):
+        state.updated_at = time.time()
+        if not self.persist or not self._persistable(state.session_id):
+            return
+        with self._lock:
+            self._dirty[state.session_id] = state
+            if self._flush_thread is None:
+                self._flush_thread = threading.Thread(target=self._flush_loop, name="music-persist", daemon=True)
+                self._flush_thread.start()
+        self._flush_event.set()
+    
+    def __len__(self) -> int:
+        return len(self._states)
+    
+    def _evict_locked(self, now: float):
+        while self._states:
+            oldest_id, oldest = next(iter(self._states.items()))
+            if len(self._states) <= self.max_sessions and now - oldest.last_access < self.idle_ttl:
+                break
+            del self._states[oldest_id]
+    
+    @staticmethod
+    def _persistable(session_id: str) -> bool:
+        try:
+            uuid.UUID(session_id)
+            return True
+        except (ValueError, TypeError):
+            return False
+    
+    def _load(self, session_id: str) -> Optional[PlaybackState]:
+        return self._load_many([session_id]).get(session_id)
+    
+    def _load_many(self, session_ids: List[str]) -> Dict[str, Optional[PlaybackState]]:
+        loaded: Dict[str, Optional[PlaybackState]] = {sid: None for sid in session_ids}
+        ids = [uuid.UUID(sid) for sid in session_ids if self._persistable(sid)]
+        if not self.persist or not ids:
+            return loaded
+        
+        from app.db.conn import db_session
+        from app.db.repository import MusicPlaybackRepository
+        try:
+            with db_session() as db:
+                for row in MusicPlaybackRepository.get_many(db, ids):
+                    state = PlaybackState(str(row.session_id))
+                    state.is_playing = row.is_playing
+                    state.audio_type = row.audio_type
+                    state.volume = row.volume if row.volume is not None else 100
+                    state.duration_minutes = row.duration_minutes
+                    loaded[state.session_id] = state
+        except Exception as e:
+            print(f"Could not load music state: {e}")
+        return loaded
+    
+    def _flush_loop(self):
+        from app.db.conn import db_session
+        from app.db.repository import MusicPlaybackRepository
+        
+        while True:
+            self._flush_event.wait()
+            # Let a burst of changes accumulate into one batch
+            time.sleep(0.5)
+            self._flush_event.clear()
+            with self._lock:
+                batch, self._dirty = list(self._dirty.values()), {}
+            if not batch:
+                continue
+            try:
+                with db_session() as db:
+                    MusicPlaybackRepository.upsert_many(db, [
+                        {
+                            "session_id": uuid.UUID(state.session_id),
+                            "audio_type": state.audio_type,
+                            "is_playing": state.is_playing,
+                            "volume": state.volume,
+                            "duration_minutes": state.duration_minutes,
+                        }
+                        for state in batch
+                    ])
+            except Exception as e:
+                print(f"Could not persist music state: {e}")
+                with self._lock:
+                    for state in batch:
+                        self._dirty.setdefault(state.session_id, state)
+                time.sleep(5)
+                self._flush_event.set()
+
+
 class MusicService:
     """Service to manage music playback during study sessions"""
     
-    def __init__(self):
-        self.current_process: Optional[subprocess.Popen] = None
-        self.is_playing = False
-        self.current_audio_type: Optional[str] = None
+    def __init__(self, sessions: Optional[MusicSessionRegistry] = None):
+        self.sessions = sessions if sessions is not None else MusicSessionRegistry()
         
         # Map audio types to YouTube URLs or local file paths
         # Using YouTube URLs for now - can be replaced with local files or streaming services
@@ -38,26 +195,34 @@ class MusicService:
             AudioType.SILENCE: None,  # No audio
         }
     
-    def start_music(self, audio_type: str, duration_minutes: Optional[int] = None) -> Dict[str, any]:
+    def _state(self, session_id: Optional[str]) -> PlaybackState:
+        return self.sessions.get(session_id or DEFAULT_SESSION)
+    
+    def start_music(self, audio_type: str, duration_minutes: Optional[int] = None,
+                    session_id: Optional[str] = None) -> Dict[str, any]:
         """
         Start playing music based on audio type
         
         Args:
             audio_type: Type of audio to play (lofi, nature, classical, ambient, binaural, silence)
             duration_minutes: Optional duration in minutes
+            session_id: Study session whose playback to change (default: shared session)
             
         Returns:
             Dict with status and message
         """
         try:
+            state = self._state(session_id)
+            
             # Stop any currently playing music
-            if self.is_playing:
-                self.stop_music()
+            if state.is_playing:
+                self.stop_music(session_id)
             
             # Handle silence
             if audio_type == AudioType.SILENCE.value or not audio_type:
-                self.is_playing = False
-                self.current_audio_type = None
+                state.is_playing = False
+                state.audio_type = None
+                self.sessions.mark_changed(state)
                 return {
                     "status": "success",
                     "message": "Silence mode - no audio will play",
@@ -72,6 +237,11 @@ class MusicService:
                     "audio_type": None
                 }
             
+            if Settings.MUSIC_BACKEND == "local":
+                local = self._start_local(state, audio_type, duration_minutes)
+                if local is not None:
+                    return local
+            
             # Get audio source - convert string to AudioType enum
             try:
                 audio_type_enum = AudioType(audio_type)
@@ -95,8 +265,10 @@ class MusicService:
                     "audio_type": None
                 }
             
-            self.is_playing = True
-            self.current_audio_type = audio_type
+            state.is_playing = True
+            state.audio_type = audio_type
+            state.duration_minutes = duration_minutes
+            self.sessions.mark_changed(state)
             
             return {
                 "status": "success",
@@ -114,6 +286,35 @@ class MusicService:
                 "audio_type": None
             }
     
+    def _start_local(self, state: PlaybackState, audio_type: str,
+                     duration_minutes: Optional[int]) -> Optional[Dict[str, any]]:
+        """
+        Start playback from the local audio engine, if it has this audio type
+        
+        Returns:
+            Dict with status and stream URLs, or None to fall back to YouTube
+        """
+        from app.services.audio_engine import audio_engine
+        
+        if not audio_engine.has_source(audio_type):
+            return None
+        
+        state.is_playing = True
+        state.audio_type = audio_type
+        state.duration_minutes = duration_minutes
+        self.sessions.mark_changed(state)
+        
+        result = {
+            "status": "success",
+            "message": f"Started playing {audio_type} music",
+            "audio_type": audio_type,
+            "stream_url": f"/api/music/stream/{audio_type}",
+            "duration_minutes": duration_minutes
+        }
+        if audio_engine.track(audio_type) is not None:
+            result["track_url"] = f"/api/music/tracks/{audio_type}"
+        return result
+    
     def _extract_youtube_id(self, url: str) -> Optional[str]:
         """
         Extract YouTube video ID from URL
@@ -133,7 +334,7 @@ class MusicService:
         except Exception:
             return None
     
-    def pause_music(self) -> Dict[str, any]:
+    def pause_music(self, session_id: Optional[str] = None) -> Dict[str, any]:
         """
         Pause currently playing music
         
@@ -141,11 +342,13 @@ class MusicService:
             Dict with status and message
         """
         try:
-            self.is_playing = False
+            state = self._state(session_id)
+            state.is_playing = False
+            self.sessions.mark_changed(state)
             return {
                 "status": "success",
                 "message": "Music paused",
-                "audio_type": self.current_audio_type
+                "audio_type": state.audio_type
             }
         except Exception as e:
             return {
@@ -153,7 +356,7 @@ class MusicService:
                 "message": f"Failed to pause music: {str(e)}"
             }
     
-    def resume_music(self) -> Dict[str, any]:
+    def resume_music(self, session_id: Optional[str] = None) -> Dict[str, any]:
         """
         Resume paused music
         
@@ -161,12 +364,14 @@ class MusicService:
             Dict with status and message
         """
         try:
-            if self.current_audio_type:
-                self.is_playing = True
+            state = self._state(session_id)
+            if state.audio_type:
+                state.is_playing = True
+                self.sessions.mark_changed(state)
                 return {
                     "status": "success",
                     "message": "Music resumed",
-                    "audio_type": self.current_audio_type
+                    "audio_type": state.audio_type
                 }
             else:
                 return {
@@ -179,7 +384,7 @@ class MusicService:
                 "message": f"Failed to resume music: {str(e)}"
             }
     
-    def stop_music(self) -> Dict[str, any]:
+    def stop_music(self, session_id: Optional[str] = None) -> Dict[str, any]:
         """
         Stop currently playing music
         
@@ -187,14 +392,11 @@ class MusicService:
             Dict with status and message
         """
         try:
-            if self.current_process:
-                self.current_process.terminate()
-                self.current_process.wait()
-                self.current_process = None
-            
-            self.is_playing = False
-            previous_type = self.current_audio_type
-            self.current_audio_type = None
+            state = self._state(session_id)
+            state.is_playing = False
+            previous_type = state.audio_type
+            state.audio_type = None
+            self.sessions.mark_changed(state)
             
             return {
                 "status": "success",
@@ -207,20 +409,55 @@ class MusicService:
                 "message": f"Failed to stop music: {str(e)}"
             }
     
-    def get_status(self) -> Dict[str, any]:
+    def set_volume(self, level: int, session_id: Optional[str] = None) -> Dict[str, any]:
         """
-        Get current music playback status
+        Set playback volume (0-100); clients apply it to their player
         
         Returns:
-            Dict with current status
+            Dict with status and message
         """
+        state = self._state(session_id)
+        state.volume = max(0, min(100, int(level)))
+        self.sessions.mark_changed(state)
         return {
-            "is_playing": self.is_playing,
-            "audio_type": self.current_audio_type,
-            "audio_source": self.audio_sources.get(self.current_audio_type) if self.current_audio_type else None
+            "status": "success",
+            "message": f"Volume set to {state.volume}%",
+            "volume": state.volume
         }
+    
+    def _status(self, state: Optional[PlaybackState]) -> Dict[str, any]:
+        audio_type = state.audio_type if state else None
+        return {
+            "is_playing": state.is_playing if state else False,
+            "audio_type": audio_type,
+            "volume": state.volume if state else 100,
+            "audio_source": self.audio_sources.get(audio_type) if audio_type else None
+        }
+    
+    def get_status(self, session_id: Optional[str] = None) -> Dict[str, any]:
+        """
+        Get current music playback status
+        
+        Returns:
+            Dict with current status
+        """
+        return self._status(self._state(session_id))
+    
+    def get_statuses(self, session_ids: Iterable[str]) -> Dict[str, Dict[str, any]]:
+        """
+        Get playback status for many sessions in one call
+        
+        Unknown sessions report as not playing and are not created.
+        
+        Returns:
+            Dict of session id -> status
+        """
+        return {sid: self._status(state) for sid, state in self.sessions.peek(session_ids).items()}
 
 
 # Create singleton instance
-music_service = MusicService()
-
+music_service = MusicService(MusicSessionRegistry(
+    idle_ttl=Settings.MUSIC_SESSION_IDLE_TTL,
+    max_sessions=Settings.MUSIC_MAX_SESSIONS,
+    persist=Settings.MUSIC_PERSIST_STATE,
+))
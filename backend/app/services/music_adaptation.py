@@ -0,0 +1,217 @@
+"""
+Music adaptation
+Adjusts music to the student's attention: ducks the volume when they drift
+off, switches to focus audio if the distraction lasts, restores things when
+they're back and pauses while they're away or on a break.
+
+Fully event-driven: the controller subscribes to attention state changes
+from the existing detection loop and uses event-loop timers (call_later,
+like the Pomodoro scheduler) for hysteresis, so it costs no thread while
+the state is stable and never reads the camera. All state lives on the
+event loop; detection events are handed over with call_soon_threadsafe.
+"""
+import asyncio
+import time
+from typing import Dict, Optional
+
+from app.config import Settings
+
+# Timers belonging to each attention state
+DISTRACTED_ACTIONS = ("duck", "switch", "away")
+ATTENTIVE_ACTIONS = ("restore", "return")
+
+
+class MusicAdaptationController:
+    """
+    Args:
+        music: MusicService to control
+        duck_after: Seconds of sustained distraction before ducking
+        switch_after: Seconds of sustained distraction before switching audio type
+        restore_after: Seconds of sustained attention before undoing duck/switch
+        away_after: Seconds without a face before pausing
+        min_interval: Minimum seconds between two adaptations (rate limit)
+        duck_volume: Volume (0-100) while ducked
+        focus_audio_type: Audio type to switch to on long distraction
+    """
+
+    def __init__(self, music, duck_after: float = 10, switch_after: float = 120, restore_after: float = 5,
+                 away_after: float = 60, min_interval: float = 15, duck_volume: int = 40,
+                 focus_audio_type: str = "binaural"):
+        self.music = music
+        self.duck_after = duck_after
+        self.switch_after = switch_after
+        self.restore_after = restore_after
+        self.away_after = away_after
+        self.min_interval = min_interval
+        self.duck_volume = duck_volume
+        self.focus_audio_type = focus_audio_type
+
+        self.session_id: Optional[str] = None
+        self.enabled = False
+        self.on_break = False
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._timers: Dict[str, asyncio.TimerHandle] = {}
+        self._last_action_at = 0.0
+        self._last_action: Optional[str] = None
+        # What to restore once attention is back
+        self._saved_volume: Optional[int] = None
+        self._saved_audio_type: Optional[str] = None
+        self._paused_by_us = False
+
+    def attach(self, detector, session_id: Optional[str] = None):
+        """Start adapting the given session's music to detector events (call from the event loop)"""
+        self._loop = asyncio.get_running_loop()
+        if session_id != self.session_id:
+            # Nothing queued or saved for the previous session may touch this one
+            self._cancel()
+            self._saved_volume = None
+            self._saved_audio_type = None
+            self._paused_by_us = False
+        self.session_id = session_id
+        self.enabled = True
+        detector.subscribe(self.on_attention_change)
+
+    def detach(self, detector):
+        """Stop adapting (call from the event loop)"""
+        detector.unsubscribe(self.on_attention_change)
+        self.enabled = False
+        self._cancel()
+
+    # Event handlers
+
+    def on_attention_change(self, event: dict):
+        """Attention listener: runs on the detection thread, only on state flips"""
+        loop = self._loop
+        if self.enabled and loop is not None and not loop.is_closed():
+            loop.call_soon_threadsafe(self._handle_change, event)
+
+    def _handle_change(self, event: dict):
+        """
+        A flip only resets the other state's timers. Distraction timers keep
+        counting through brief attentive flickers and are cleared once the
+        restore timer confirms sustained attention, so flickering detection
+        output still reaches switch_after.
+        """
+        if not self.enabled or self.on_break:
+            return
+        if event.get("status") == "Stopped":
+            self._cancel()
+            return
+        if event.get("is_attentive"):
+            self._schedule("restore", self.restore_after, restart=False)
+            if self._paused_by_us:
+                self._schedule("return", self.restore_after, restart=False)
+        else:
+            self._cancel(ATTENTIVE_ACTIONS)
+            self._schedule("duck", self.duck_after, restart=False)
+            self._schedule("switch", self.switch_after, restart=False)
+            if event.get("face_detected"):
+                self._cancel(("away",))
+            else:
+                self._schedule("away", self.away_after, restart=False)
+
+    def set_break(self, on_break: bool):
+        """Pause for a break and resume after it (called by the Pomodoro scheduler, on the event loop)"""
+        if on_break == self.on_break:
+            return
+        self.on_break = on_break
+        self._cancel()
+        if not self.enabled:
+            return
+        if on_break:
+            self._pause("break")
+        elif self._paused_by_us:
+            self._resume("break_over")
+
+    # Actions
+
+    def _schedule(self, action: str, delay: float, restart: bool = True):
+        """Start action's timer; with restart=False an already pending one keeps its deadline"""
+        if action in self._timers:
+            if not restart:
+                return
+            self._timers.pop(action).cancel()
+        self._timers[action] = self._loop.call_later(delay, self._fire, action)
+
+    def _cancel(self, actions=None):
+        # Everything runs on the loop, so a cancelled handle never fires
+        for action in list(self._timers) if actions is None else actions:
+            handle = self._timers.pop(action, None)
+            if handle is not None:
+                handle.cancel()
+
+    def _fire(self, action: str):
+        self._timers.pop(action, None)
+        if not self.enabled:
+            return
+        if action == "restore":
+            # Attention held for restore_after: the distraction is over
+            self._cancel(DISTRACTED_ACTIONS)
+
+        # Rate limit: push the action back instead of dropping it
+        wait = self._last_action_at + self.min_interval - time.monotonic()
+        if wait > 0:
+            self._schedule(action, wait)
+            return
+
+        status = self.music.get_status(self.session_id)
+        if action == "duck" and status["is_playing"] and self._saved_volume is None:
+            self._saved_volume = status["volume"]
+            self.music.set_volume(min(self.duck_volume, status["volume"]), self.session_id)
+            self._record(action)
+        elif action == "switch" and status["is_playing"] and status["audio_type"] != self.focus_audio_type:
+            if self._saved_audio_type is None:
+                self._saved_audio_type = status["audio_type"]
+            # start_music keeps the session's (possibly ducked) volume
+            self.music.start_music(self.focus_audio_type, session_id=self.session_id)
+            self._record(action)
+        elif action == "restore" and (self._saved_audio_type or self._saved_volume is not None):
+            if self._saved_audio_type is not None:
+                self.music.start_music(self._saved_audio_type, session_id=self.session_id)
+                self._saved_audio_type = None
+            if self._saved_volume is not None:
+                self.music.set_volume(self._saved_volume, self.session_id)
+                self._saved_volume = None
+            self._record(action)
+        elif action == "away":
+            self._pause(action)
+        elif action == "return" and self._paused_by_us:
+            self._resume(action)
+
+    def _pause(self, reason: str):
+        if self.music.get_status(self.session_id)["is_playing"]:
+            self.music.pause_music(self.session_id)
+            self._paused_by_us = True
+            self._record(reason)
+
+    def _resume(self, reason: str):
+        self.music.resume_music(self.session_id)
+        self._paused_by_us = False
+        self._record(reason)
+
+    def _record(self, action: str):
+        self._last_action = action
+        self._last_action_at = time.monotonic()
+
+    def status(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "session_id": self.session_id,
+            "on_break": self.on_break,
+            "ducked": self._saved_volume is not None,
+            "switched_from": self._saved_audio_type,
+            "paused": self._paused_by_us,
+            "last_action": self._last_action,
+            "pending": sorted(self._timers),
+        }
+
+
+def create_music_adaptation() -> MusicAdaptationController:
+    from app.services.music import music_service
+
+    return MusicAdaptationController(
+        music_service,
+        duck_after=Settings.MUSIC_ADAPT_DUCK_AFTER,
+        switch_after=Settings.MUSIC_ADAPT_SWITCH_AFTER,
+        min_interval=Settings.MUSIC_ADAPT_MIN_INTERVAL,
+    )
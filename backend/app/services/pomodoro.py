@@ -0,0 +1,344 @@
+"""
+Pomodoro scheduler
+Runs every session's work/break phases on the server. All timers share one
+heap and one asyncio task that sleeps until the earliest deadline, so
+thousands of concurrent sessions cost a heap entry each rather than a
+thread or task each. Phase changes are published as events (see
+app.services.events) and, with persistence enabled, written to the
+pomodoro_cycles table in batches.
+"""
+import asyncio
+import heapq
+import itertools
+import uuid
+from datetime import datetime, timezone
+from typing import Callable, Dict, List, Optional
+
+from app.config import Settings
+from app.models import PomodoroPhase
+
+
+class PhasePlan:
+    """One planned phase: WORK (with its task) or BREAK"""
+
+    __slots__ = ("phase", "seconds", "task")
+
+    def __init__(self, phase: PomodoroPhase, seconds: float, task: Optional[str] = None):
+        self.phase = phase
+        self.seconds = seconds
+        self.task = task
+
+
+def build_plan(pomodoro_sessions: Optional[list] = None, work_minutes: int = 25, short_break_minutes: int = 5,
+               long_break_minutes: int = 15, long_break_every: int = 4) -> List[PhasePlan]:
+    """
+    Expand the onboarding's pomodoro sessions into alternating phases
+
+    Args:
+        pomodoro_sessions: Items like {"id": 1, "task": "...", "duration": 25};
+            a single default work phase when empty
+        long_break_every: Every n-th break is a long one
+
+    Returns:
+        Work phases with breaks in between (none after the last one)
+    """
+    items = pomodoro_sessions or [{"duration": work_minutes}]
+    plan = []
+    for i, item in enumerate(items):
+        if i > 0:
+            long_break = long_break_every > 0 and i % long_break_every == 0
+            minutes = long_break_minutes if long_break else short_break_minutes
+            plan.append(PhasePlan(PomodoroPhase.BREAK, float(minutes) * 60))
+        duration = item.get("duration") or work_minutes
+        plan.append(PhasePlan(PomodoroPhase.WORK, float(duration) * 60, item.get("task")))
+    return plan
+
+
+class PomodoroTimer:
+    """Scheduling state of one session"""
+
+    __slots__ = ("session_id", "plan", "index", "cycle_id", "started_at", "deadline", "remaining", "generation")
+
+    def __init__(self, session_id: str, plan: List[PhasePlan]):
+        self.session_id = session_id
+        self.plan = plan
+        self.index = 0
+        self.cycle_id: Optional[uuid.UUID] = None
+        self.started_at: Optional[datetime] = None
+        self.deadline: Optional[float] = None          # loop time; None while paused
+        self.remaining: Optional[float] = None         # seconds left while paused
+        # Bumped on every reschedule; heap entries with an older value are stale
+        self.generation = 0
+
+    @property
+    def current(self) -> PhasePlan:
+        return self.plan[self.index]
+
+    def to_dict(self, now: float) -> dict:
+        phase = self.current
+        remaining = self.remaining if self.deadline is None else max(self.deadline - now, 0.0)
+        return {
+            "session_id": self.session_id,
+            "phase": phase.phase.value,
+            "task": phase.task,
+            "index": self.index,
+            "total_phases": len(self.plan),
+            "duration_seconds": phase.seconds,
+            "remaining_seconds": round(remaining, 1),
+            "paused": self.deadline is None,
+        }
+
+
+class PomodoroScheduler:
+    """
+    Args:
+        persist: Write phases to the pomodoro_cycles table
+        flush_interval: Seconds between batched writes
+    """
+
+    def __init__(self, persist: bool = False, flush_interval: float = 2.0, **plan_defaults):
+        self.persist = persist
+        self.flush_interval = flush_interval
+        self.plan_defaults = plan_defaults
+        self._timers: Dict[str, PomodoroTimer] = {}
+        self._heap: list = []                       # (deadline, seq, session_id, generation)
+        self._seq = itertools.count()
+        self._listeners: List[Callable[[dict], None]] = []
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._flush_task: Optional[asyncio.Task] = None
+        self._dirty: Dict[uuid.UUID, dict] = {}
+        self.transitions = 0
+
+    def subscribe(self, listener: Callable[[dict], None]):
+        """Call listener(event) on the event loop for every phase change"""
+        if listener not in self._listeners:
+            self._listeners.append(listener)
+
+    # Public API (call from the event loop)
+
+    def start(self, session_id: str, pomodoro_sessions: Optional[list] = None) -> dict:
+        """Start (or restart) a session's schedule at its first work phase"""
+        self._ensure_running()
+        if session_id in self._timers:
+            self._end_phase(self._timers[session_id], completed=False)
+        timer = PomodoroTimer(session_id, build_plan(pomodoro_sessions, **self.plan_defaults))
+        self._timers[session_id] = timer
+        self._begin_phase(timer, "started")
+        return timer.to_dict(self._now())
+
+    def pause(self, session_id: str) -> Optional[dict]:
+        timer = self._timers.get(session_id)
+        if timer is None:
+            return None
+        if timer.deadline is not None:
+            timer.remaining = max(timer.deadline - self._now(), 0.0)
+            timer.deadline = None
+            timer.generation += 1
+            self._emit(timer, "paused")
+        return timer.to_dict(self._now())
+
+    def resume(self, session_id: str) -> Optional[dict]:
+        timer = self._timers.get(session_id)
+        if timer is None:
+            return None
+        if timer.deadline is None:
+            self._schedule(timer, timer.remaining)
+            timer.remaining = None
+            self._emit(timer, "resumed")
+        return timer.to_dict(self._now())
+
+    def skip(self, session_id: str) -> Optional[dict]:
+        """End the current phase now and move on to the next one"""
+        timer = self._timers.get(session_id)
+        if timer is None:
+            return None
+        self._advance(timer)
+        return timer.to_dict(self._now()) if session_id in self._timers else None
+
+    def stop(self, session_id: str) -> bool:
+        timer = self._timers.pop(session_id, None)
+        if timer is None:
+            return False
+        timer.generation += 1
+        self._end_phase(timer, completed=False)
+        self._emit(timer, "stopped")
+        return True
+
+    def get(self, session_id: str) -> Optional[dict]:
+        timer = self._timers.get(session_id)
+        return timer.to_dict(self._now()) if timer else None
+
+    def stats(self) -> dict:
+        return {
+            "sessions": len(self._timers),
+            "heap_size": len(self._heap),
+            "transitions": self.transitions,
+            "pending_writes": len(self._dirty),
+        }
+
+    async def shutdown(self):
+        for task in (self._task, self._flush_task):
+            if task is not None:
+                task.cancel()
+        self._task = self._flush_task = None
+        if self._dirty:
+            batch, self._dirty = list(self._dirty.values()), {}
+            # Final write in a worker thread; the loop may still be serving other shutdown work
+            await asyncio.to_thread(self._write, batch)
+
+    # Scheduling
+
+    @staticmethod
+    def _now() -> float:
+        return asyncio.get_running_loop().time()
+
+    def _ensure_running(self):
+        if self._task is None or self._task.done():
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.get_running_loop().create_task(self._run())
+        if self.persist and (self._flush_task is None or self._flush_task.done()):
+            self._flush_task = asyncio.get_running_loop().create_task(self._flush_loop())
+
+    def _schedule(self, timer: PomodoroTimer, seconds: float):
+        timer.generation += 1
+        timer.deadline = self._now() + seconds
+        earliest = self._heap[0][0] if self._heap else None
+        heapq.heappush(self._heap, (timer.deadline, next(self._seq), timer.session_id, timer.generation))
+        if earliest is None or timer.deadline < earliest:
+            self._wakeup.set()
+
+    async def _run(self):
+        while True:
+            # Drop entries made stale by pause/restart/stop
+            while self._heap and not self._is_current(self._heap[0]):
+                heapq.heappop(self._heap)
+            timeout = self._heap[0][0] - self._now() if self._heap else None
+            if timeout is None or timeout > 0:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            now = self._now()
+            while self._heap and self._heap[0][0] <= now:
+                entry = heapq.heappop(self._heap)
+                if self._is_current(entry):
+                    try:
+                        self._advance(self._timers[entry[2]])
+                    except Exception as e:
+                        print(f"Pomodoro transition failed for {entry[2]}: {e}")
+
+    def _is_current(self, entry: tuple) -> bool:
+        timer = self._timers.get(entry[2])
+        return timer is not None and timer.generation == entry[3]
+
+    # Transitions
+
+    def _advance(self, timer: PomodoroTimer):
+        self.transitions += 1
+        self._end_phase(timer, completed=True)
+        if timer.index + 1 >= len(timer.plan):
+            timer.generation += 1
+            del self._timers[timer.session_id]
+            self._emit(timer, "finished")
+            return
+        timer.index += 1
+        self._begin_phase(timer, "phase_changed")
+
+    def _begin_phase(self, timer: PomodoroTimer, reason: str):
+        timer.cycle_id = uuid.uuid4()
+        timer.started_at = datetime.now(timezone.utc)
+        timer.remaining = None
+        self._schedule(timer, timer.current.seconds)
+        self._record(timer, ended_at=None, completed=False)
+        self._emit(timer, reason)
+
+    def _end_phase(self, timer: PomodoroTimer, completed: bool):
+        if timer.cycle_id is not None:
+            self._record(timer, ended_at=datetime.now(timezone.utc), completed=completed)
+
+    def _emit(self, timer: PomodoroTimer, reason: str):
+        event = {"type": "pomodoro", "event": reason, **timer.to_dict(self._now())}
+        if reason in ("finished", "stopped"):
+            event["phase"] = None
+        for listener in self._listeners:
+            try:
+                listener(event)
+            except Exception as e:
+                print(f"Pomodoro listener failed: {e}")
+
+    # Persistence
+
+    def _record(self, timer: PomodoroTimer, ended_at: Optional[datetime], completed: bool):
+        if not self.persist:
+            return
+        try:
+            session_uuid = uuid.UUID(timer.session_id)
+        except ValueError:
+            return
+        # Keyed by cycle, so a phase that starts and ends between flushes is one write
+        self._dirty[timer.cycle_id] = {
+            "cycle_id": timer.cycle_id,
+            "session_id": session_uuid,
+            "phase": timer.current.phase,
+            "total_duration": int(timer.current.seconds),
+            "started_at": timer.started_at,
+            "ended_at": ended_at,
+            "completed": completed,
+        }
+
+    async def _flush_loop(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            if self._dirty:
+                batch, self._dirty = self._dirty, {}
+                failed = await asyncio.get_running_loop().run_in_executor(None, self._write, list(batch.values()))
+                if failed:
+                    # Keep newer states recorded while the write was in flight
+                    for cycle_id, cycle in batch.items():
+                        self._dirty.setdefault(cycle_id, cycle)
+
+    @staticmethod
+    def _write(batch: List[dict]) -> bool:
+        """Write one batch; returns True if it failed"""
+        from app.db.conn import db_session
+        from app.db.repository import PomodoroCycleRepository
+        try:
+            with db_session() as db:
+                PomodoroCycleRepository.upsert_many(db, batch)
+            return False
+        except Exception as e:
+            print(f"Could not persist pomodoro cycles: {e}")
+            return True
+
+
+def _pause_music_on_break(event: dict):
+    from app.services.registry import services
+
+    # Runs on the event loop: never load the controller here, one that isn't loaded has nothing to adapt
+    if event["event"] not in ("started", "phase_changed", "finished", "stopped") or not services.is_loaded("music_adaptation"):
+        return
+    adaptation = services.music_adaptation
+    if adaptation.session_id not in (None, event["session_id"]):
+        return
+    adaptation.set_break(event["phase"] == PomodoroPhase.BREAK.value)
+
+
+def create_pomodoro_scheduler() -> PomodoroScheduler:
+    from app.services.events import event_hub
+
+    scheduler = PomodoroScheduler(
+        persist=Settings.POMODORO_PERSIST,
+        flush_interval=Settings.POMODORO_FLUSH_INTERVAL,
+        work_minutes=Settings.POMODORO_WORK_MINUTES,
+        short_break_minutes=Settings.POMODORO_SHORT_BREAK_MINUTES,
+        long_break_minutes=Settings.POMODORO_LONG_BREAK_MINUTES,
+        long_break_every=Settings.POMODORO_LONG_BREAK_EVERY,
+    )
+    scheduler.subscribe(event_hub.publish)
+    if Settings.MUSIC_ADAPTATION_ENABLED:
+        scheduler.subscribe(_pause_music_on_break)
+    return scheduler
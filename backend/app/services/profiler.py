@@ -0,0 +1,144 @@
+"""
+Sampling profiler
+Samples the stacks of every thread in the worker (event loop, thread pool,
+detection loop, ...) with sys._current_frames() at a fixed interval, for a
+bounded time, and aggregates them into collapsed stacks: one line per
+distinct stack, "thread;outer frame;...;inner frame count", the input
+format of flamegraph.pl and speedscope. Standard library only, and
+nothing runs between profiles.
+"""
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Dict, Optional
+
+from app.config import Settings
+
+# Leaf frames of threads that are blocked waiting rather than working
+IDLE_LEAVES = {
+    ("threading.py", "wait"),
+    ("threading.py", "_wait_for_tstate_lock"),
+    ("selectors.py", "select"),
+    ("queue.py", "get"),
+    ("thread.py", "_worker"),
+    ("socket.py", "accept"),
+}
+
+
+class ProfilerBusyError(Exception):
+    """Raised when a profile is requested while another one is running"""
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    path = code.co_filename
+    # Last two path components are enough to tell modules apart
+    short = os.path.join(os.path.basename(os.path.dirname(path)), os.path.basename(path))
+    return f"{getattr(code, 'co_qualname', code.co_name)} ({short})"
+
+
+class SamplingProfiler:
+    """
+    Args:
+        max_seconds: Longest profile a caller may ask for
+    """
+
+    def __init__(self, max_seconds: float = 60.0):
+        self.max_seconds = max_seconds
+        self._lock = threading.Lock()
+        self.last_profile_at: Optional[float] = None
+
+    def profile(self, seconds: float, interval: float = 0.005, include_idle: bool = False) -> dict:
+        """
+        Sample all threads for a while (blocks the calling thread)
+
+        Args:
+            seconds: How long to sample, capped at max_seconds
+            interval: Seconds between samples
+            include_idle: Keep samples of threads blocked in waits/selects
+
+        Returns:
+            Dict with the collapsed stack counts and sampling statistics
+
+        Raises:
+            ProfilerBusyError: If another profile is in progress
+        """
+        if not self._lock.acquire(blocking=False):
+            raise ProfilerBusyError("A profile is already running")
+        try:
+            return self._sample(min(seconds, self.max_seconds), max(interval, 0.001), include_idle)
+        finally:
+            self._lock.release()
+
+    def _sample(self, seconds: float, interval: float, include_idle: bool) -> dict:
+        me = threading.get_ident()
+        stacks: Counter = Counter()
+        samples = 0
+        idle_skipped = 0
+        overhead = 0.0
+        started = time.perf_counter()
+        deadline = started + seconds
+        names: Dict[int, str] = {}
+
+        while True:
+            tick = time.perf_counter()
+            if tick >= deadline:
+                break
+            names.update((t.ident, t.name) for t in threading.enumerate() if t.ident not in names)
+            for ident, frame in sys._current_frames().items():
+                if ident == me:
+                    continue
+                code = frame.f_code
+                if not include_idle and (os.path.basename(code.co_filename), code.co_name) in IDLE_LEAVES:
+                    idle_skipped += 1
+                    continue
+                labels = []
+                while frame is not None:
+                    labels.append(_frame_label(frame))
+                    frame = frame.f_back
+                labels.append(names.get(ident, f"thread-{ident}"))
+                stacks[";".join(reversed(labels))] += 1
+            samples += 1
+            spent = time.perf_counter() - tick
+            overhead += spent
+            time.sleep(max(0.0, interval - spent))
+
+        elapsed = time.perf_counter() - started
+        self.last_profile_at = time.time()
+        return {
+            "seconds": round(elapsed, 3),
+            "interval": interval,
+            "samples": samples,
+            "idle_skipped": idle_skipped,
+            # Share of one core spent walking stacks while profiling
+            "sampler_overhead": round(overhead / elapsed, 4) if elapsed else 0.0,
+            "stacks": dict(stacks),
+        }
+
+
+def collapsed(result: dict) -> str:
+    """Collapsed-stack text (flamegraph.pl / speedscope input), heaviest stacks first"""
+    lines = [f"{stack} {count}" for stack, count in sorted(result["stacks"].items(), key=lambda kv: -kv[1])]
+    return "\n".join(lines) + "\n"
+
+
+def top_functions(result: dict, limit: int = 25) -> list:
+    """Functions by samples spent in them (self), with samples under them (total)"""
+    own, total = Counter(), Counter()
+    for stack, count in result["stacks"].items():
+        frames = stack.split(";")[1:]  # drop the thread name
+        if not frames:
+            continue
+        own[frames[-1]] += count
+        for frame in set(frames):
+            total[frame] += count
+    return [
+        {"function": name, "self": own[name], "total": total[name]}
+        for name, _ in own.most_common(limit)
+    ]
+
+
+# Create singleton instance
+profiler = SamplingProfiler(Settings.PROFILER_MAX_SECONDS)
@@ -0,0 +1,147 @@
+"""
+Service registry
+Defers importing and constructing heavy services (OpenCV, Gemini SDKs,
+pandas/plotly) until first use, or until a background warmup after the
+server has started accepting connections.
+"""
+import asyncio
+import importlib
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, Optional, Union
+
+
+class ServiceRegistry:
+    """
+    Lazily loaded, thread-safe named services
+
+    Each service loads under its own lock, so a slow import only blocks
+    callers waiting for that same service. Async code should resolve
+    services with aget(), which loads them in a worker thread.
+    """
+
+    def __init__(self):
+        self._targets: Dict[str, Union[str, Callable[[], Any]]] = {}
+        self._instances: Dict[str, Any] = {}
+        self._load_times: Dict[str, float] = {}
+        # Guards the dicts above; never held while a service loads
+        self._lock = threading.Lock()
+        self._load_locks: Dict[str, threading.RLock] = {}
+
+    def register(self, name: str, target: Union[str, Callable[[], Any]]):
+        """
+        Register a service without loading it
+
+        Args:
+            name: Service name, also usable as an attribute (registry.<name>)
+            target: "module.path:attribute" for a module-level instance, or
+                a zero-argument factory called on first use
+        """
+        with self._lock:
+            self._targets[name] = target
+            self._instances.pop(name, None)
+            self._load_locks.setdefault(name, threading.RLock())
+
+    def override(self, name: str, instance: Any):
+        """Install a ready-made instance, e.g. a stub in benchmarks or tests"""
+        with self._lock:
+            self._targets.setdefault(name, lambda: instance)
+            self._instances[name] = instance
+            self._load_locks.setdefault(name, threading.RLock())
+
+    def get(self, name: str) -> Any:
+        if name in self._instances:
+            return self._instances[name]
+
+        load_lock = self._load_locks.get(name)
+        if load_lock is None:
+            raise KeyError(f"Unknown service: {name}")
+        with load_lock:
+            if name in self._instances:
+                return self._instances[name]
+
+            started = time.perf_counter()
+            target = self._targets[name]
+            if isinstance(target, str):
+                module_path, attr = target.split(":")
+                instance = getattr(importlib.import_module(module_path), attr)
+            else:
+                instance = target()
+            with self._lock:
+                self._load_times[name] = time.perf_counter() - started
+                self._instances[name] = instance
+            return instance
+
+    async def aget(self, name: str) -> Any:
+        """get() for async code: a service that isn't loaded yet loads in a worker thread"""
+        if name in self._instances:
+            return self._instances[name]
+        return await asyncio.to_thread(self.get, name)
+
+    def __getattr__(self, name: str) -> Any:
+        if name.startswith("_"):
+            raise AttributeError(name)
+        try:
+            return self.get(name)
+        except KeyError as e:
+            raise AttributeError(name) from e
+
+    def is_loaded(self, name: str) -> bool:
+        return name in self._instances
+
+    def warmup(self, names: Optional[Iterable[str]] = None) -> Dict[str, float]:
+        """
+        Load services (and run their optional warmup() hook) ahead of first use
+
+        Returns:
+            Dict of service name -> seconds spent loading
+        """
+        timings = {}
+        for name in list(names if names is not None else self._targets):
+            started = time.perf_counter()
+            try:
+                instance = self.get(name)
+                hook = getattr(instance, "warmup", None)
+                if callable(hook):
+                    hook()
+            except Exception as e:
+                print(f"Warning: warmup of {name} failed: {e}")
+                continue
+            timings[name] = time.perf_counter() - started
+        return timings
+
+    def status(self) -> Dict[str, Dict[str, Any]]:
+        return {
+            name: {
+                "loaded": name in self._instances,
+                "load_seconds": self._load_times.get(name),
+            }
+            for name in self._targets
+        }
+
+
+def _create_music_adaptation():
+    from app.services.music_adaptation import create_music_adaptation
+    return create_music_adaptation()
+
+
+def _create_pomodoro_scheduler():
+    from app.services.pomodoro import create_pomodoro_scheduler
+    return create_pomodoro_scheduler()
+
+
+def _create_gemini_client():
+    from app.client import create_gemini_client
+    return create_gemini_client()
+
+
+# Create singleton instance
+services = ServiceRegistry()
+services.register("gemini_client", _create_gemini_client)
+services.register("music_service", "app.services.music:music_service")
+services.register("music_adaptation", _create_music_adaptation)
+services.register("pomodoro_scheduler", _create_pomodoro_scheduler)
+services.register("event_hub", "app.services.events:event_hub")
+services.register("audio_engine", "app.services.audio_engine:audio_engine")
+services.register("attention_detector_service", "app.services.attention_detector_service:attention_detector_service")
+services.register("visualization_job_queue", "app.services.visualization_jobs:visualization_job_queue")
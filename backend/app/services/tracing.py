@@ -0,0 +1,340 @@
+"""
+Request tracing
+A small span API: each sampled request gets a trace whose spans (HTTP
+handling, auth, model setup, Gemini streaming, DB queries, ...) are
+linked through a context variable, so work done in the thread pool or in
+a streaming response's task lands in the right trace. Finished traces go
+to an in-memory ring buffer (see /admin/traces) and, optionally, to a
+file of OTLP/JSON lines that OpenTelemetry tooling can import.
+
+Unsampled requests carry a no-op span, so instrumented code costs a
+context variable lookup and nothing else.
+"""
+import json
+import os
+import queue
+import random
+import re
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Iterable, List, Optional
+
+from app.config import Settings
+
+# OTLP span kinds
+INTERNAL, SERVER, CLIENT = 1, 2, 3
+MAX_EVENTS_PER_SPAN = 128
+# W3C traceparent: version-trace id-parent span id-flags, lowercase hex
+TRACEPARENT = re.compile(r"^[0-9a-f]{2}-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})$")
+
+
+class Trace:
+    __slots__ = ("trace_id", "root", "spans", "finished")
+
+    def __init__(self, trace_id: str):
+        self.trace_id = trace_id
+        self.root: Optional["Span"] = None
+        self.spans: List["Span"] = []
+        self.finished = False
+
+    def duration_ms(self) -> float:
+        if self.root is None or self.root.end_ns is None:
+            return 0.0
+        return (self.root.end_ns - self.root.start_ns) / 1e6
+
+
+class Span:
+    __slots__ = ("tracer", "trace", "span_id", "parent_id", "name", "kind",
+                 "start_ns", "end_ns", "attributes", "events", "error")
+
+    sampled = True
+
+    def __init__(self, tracer, trace: Trace, name: str, parent_id: Optional[str], kind: int, attributes: dict):
+        self.tracer = tracer
+        self.trace = trace
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent_id
+        self.name = name
+        self.kind = kind
+        self.start_ns = time.time_ns()
+        self.end_ns: Optional[int] = None
+        self.attributes = attributes
+        self.events: list = []
+        self.error: Optional[str] = None
+
+    def set(self, key: str, value):
+        self.attributes[key] = value
+
+    def add_event(self, name: str, **attributes):
+        if len(self.events) < MAX_EVENTS_PER_SPAN:
+            self.events.append((name, time.time_ns(), attributes))
+
+    def record_error(self, error: BaseException):
+        self.error = f"{type(error).__name__}: {error}"
+
+    def end(self):
+        """
+        Finish the span. A trace is exported when its root ends, so spans
+        still running then (e.g. thread-pool work outliving the request)
+        are dropped rather than added to a trace already handed out.
+        """
+        if self.end_ns is not None:
+            return
+        self.end_ns = time.time_ns()
+        if self.trace.finished:
+            return
+        self.trace.spans.append(self)
+        if self is self.trace.root:
+            self.trace.finished = True
+            self.tracer._finish(self.trace)
+
+
+class _NoopSpan:
+    """Stands in for spans of unsampled requests"""
+
+    sampled = False
+    trace = None
+
+    def set(self, key, value):
+        pass
+
+    def add_event(self, name, **attributes):
+        pass
+
+    def record_error(self, error):
+        pass
+
+    def end(self):
+        pass
+
+
+NOOP_SPAN = _NoopSpan()
+_current: ContextVar = ContextVar("current_span", default=None)
+
+
+class Tracer:
+    """
+    Args:
+        sample_rate: Fraction of new traces to record (0-1)
+        buffer_size: Finished traces kept in memory
+        export_path: File to append finished traces to as OTLP/JSON lines
+        service_name: Reported as the service.name resource attribute
+    """
+
+    def __init__(self, sample_rate: float = 0.1, buffer_size: int = 200,
+                 export_path: Optional[str] = None, service_name: str = "ai-companion-backend"):
+        self.sample_rate = sample_rate
+        self.export_path = export_path
+        self.service_name = service_name
+        self._buffer: deque = deque(maxlen=buffer_size)
+        self._export_queue: "queue.SimpleQueue[Trace]" = queue.SimpleQueue()
+        self._writer: Optional[threading.Thread] = None
+        self._writer_lock = threading.Lock()
+
+    def current(self):
+        return _current.get()
+
+    def start_span(self, name: str, kind: int = INTERNAL, parent=None, **attributes):
+        """
+        Start a span under the current one (or a new, possibly sampled-out
+        trace) without making it current; call end() when done. Use this for
+        work that spans yields, such as streaming generators.
+        """
+        parent = parent if parent is not None else _current.get()
+        if parent is None:
+            if random.random() >= self.sample_rate:
+                return NOOP_SPAN
+            return self._root(Trace(os.urandom(16).hex()), name, None, kind, attributes)
+        if not parent.sampled:
+            return NOOP_SPAN
+        return Span(self, parent.trace, name, parent.span_id, kind, attributes)
+
+    def start_child(self, name: str, kind: int = INTERNAL, **attributes):
+        """Like start_span, but never starts a trace: None outside sampled requests"""
+        parent = _current.get()
+        if parent is None or not parent.sampled:
+            return None
+        return Span(self, parent.trace, name, parent.span_id, kind, attributes)
+
+    def start_remote(self, name: str, traceparent: Optional[str], kind: int = SERVER, **attributes):
+        """
+        Start a root span, continuing the caller's trace if a W3C traceparent
+        header was sent (and following its sampling decision)
+        """
+        match = TRACEPARENT.match(traceparent.strip().lower()) if traceparent else None
+        # All-zero ids are invalid; like malformed headers they start a fresh trace
+        if match is None or not int(match.group(1), 16) or not int(match.group(2), 16):
+            return self.start_span(name, kind, **attributes)
+        trace_id, parent_id, flags = match.groups()
+        if not int(flags, 16) & 1:
+            return NOOP_SPAN
+        return self._root(Trace(trace_id), name, parent_id, kind, attributes)
+
+    def _root(self, trace: Trace, name: str, parent_id: Optional[str], kind: int, attributes: dict) -> Span:
+        span = Span(self, trace, name, parent_id, kind, attributes)
+        trace.root = span
+        return span
+
+    @contextmanager
+    def activate(self, span):
+        """Make span the current span inside the block"""
+        token = _current.set(span)
+        try:
+            yield span
+        finally:
+            _current.reset(token)
+
+    @contextmanager
+    def span(self, name: str, kind: int = INTERNAL, **attributes):
+        """Current span for the duration of the block; exceptions are recorded on it"""
+        span = self.start_span(name, kind, **attributes)
+        token = _current.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.record_error(e)
+            raise
+        finally:
+            _current.reset(token)
+            span.end()
+
+    def _finish(self, trace: Trace):
+        self._buffer.append(trace)
+        if self.export_path:
+            self._export_queue.put(trace)
+            if self._writer is None:
+                with self._writer_lock:
+                    if self._writer is None:
+                        self._writer = threading.Thread(target=self._write_loop, name="trace-export", daemon=True)
+                        self._writer.start()
+
+    def _write_loop(self):
+        while True:
+            traces = [self._export_queue.get()]
+            # Batch whatever else finished meanwhile into the same write
+            while len(traces) < 100:
+                try:
+                    traces.append(self._export_queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                with open(self.export_path, "a") as f:
+                    f.write(json.dumps(self.to_otlp(traces), separators=(",", ":")) + "\n")
+            except OSError as e:
+                print(f"Trace export to {self.export_path} failed: {e}")
+
+    def recent(self, limit: int = 50, min_ms: float = 0.0) -> List[Trace]:
+        """Most recent finished traces first, optionally only the slow ones"""
+        traces = [t for t in reversed(self._buffer) if t.duration_ms() >= min_ms]
+        return traces[:limit]
+
+    def to_otlp(self, traces: Iterable[Trace]) -> dict:
+        """Traces as an OTLP/JSON ExportTraceServiceRequest"""
+        return {
+            "resourceSpans": [{
+                "resource": {"attributes": _otlp_attributes({"service.name": self.service_name, "process.pid": os.getpid()})},
+                "scopeSpans": [{
+                    "scope": {"name": "app.services.tracing"},
+                    "spans": [_otlp_span(span) for trace in traces for span in trace.spans],
+                }],
+            }],
+        }
+
+
+def _otlp_value(value) -> dict:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+def _otlp_attributes(attributes: dict) -> list:
+    return [{"key": k, "value": _otlp_value(v)} for k, v in attributes.items() if v is not None]
+
+
+def _otlp_span(span: Span) -> dict:
+    otlp = {
+        "traceId": span.trace.trace_id,
+        "spanId": span.span_id,
+        "name": span.name,
+        "kind": span.kind,
+        "startTimeUnixNano": str(span.start_ns),
+        "endTimeUnixNano": str(span.end_ns),
+        "attributes": _otlp_attributes(span.attributes),
+        "events": [
+            {"name": name, "timeUnixNano": str(at), "attributes": _otlp_attributes(attrs)}
+            for name, at, attrs in span.events
+        ],
+        # 1 = OK, 2 = ERROR
+        "status": {"code": 2, "message": span.error} if span.error else {"code": 1},
+    }
+    if span.parent_id:
+        otlp["parentSpanId"] = span.parent_id
+    return otlp
+
+
+# Create singleton instance
+tracer = Tracer(
+    sample_rate=Settings.TRACING_SAMPLE_RATE,
+    buffer_size=Settings.TRACING_BUFFER_SIZE,
+    export_path=Settings.TRACING_EXPORT_PATH,
+)
+
+
+class TracingMiddleware:
+    """
+    ASGI middleware opening a server span per HTTP request (covering the
+    whole response, streaming included) and returning its trace id in an
+    x-trace-id header
+    """
+
+    def __init__(self, app, skip_prefixes=("/metrics", "/admin", "/health")):
+        self.app = app
+        self.skip_prefixes = skip_prefixes
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"].startswith(self.skip_prefixes):
+            return await self.app(scope, receive, send)
+
+        headers = dict(scope["headers"])
+        traceparent = headers.get(b"traceparent")
+        span = tracer.start_remote(
+            f"{scope['method']} {scope['path']}", traceparent.decode() if traceparent else None,
+            **{"http.method": scope["method"], "http.target": scope["path"]})
+        if not span.sampled:
+            # Current no-op span keeps nested spans from sampling a trace of their own
+            token = _current.set(span)
+            try:
+                return await self.app(scope, receive, send)
+            finally:
+                _current.reset(token)
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                span.set("http.status_code", message["status"])
+                if message["status"] >= 500:
+                    span.error = f"HTTP {message['status']}"
+                message = dict(message, headers=list(message.get("headers", [])) + [
+                    (b"x-trace-id", span.trace.trace_id.encode())])
+            await send(message)
+
+        token = _current.set(span)
+        try:
+            await self.app(scope, receive, send_wrapper)
+        except BaseException as e:
+            span.record_error(e)
+            raise
+        finally:
+            _current.reset(token)
+            route = getattr(scope.get("route"), "path", None)
+            if route:
+                # Route template keeps span names low-cardinality
+                span.name = f"{scope['method']} {route}"
+                span.set("http.route", route)
+            span.end()
@@ -0,0 +1,207 @@
+"""
+Visualization job queue
+Runs Gemini-backed visualization analysis on a bounded worker pool so API
+requests get a job id back immediately instead of waiting on the model.
+"""
+import asyncio
+import hashlib
+import json
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Dict, Optional
+
+from app.config import Settings
+
+
+class JobQueueFullError(Exception):
+    """Raised when the number of queued + running jobs hits the limit"""
+
+
+class JobStatus:
+    PENDING = "pending"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+
+
+class AnalysisJob:
+    """One visualization analysis request and its outcome"""
+
+    __slots__ = ("job_id", "key", "query", "status", "result", "error",
+                 "created_at", "finished_at", "future")
+
+    def __init__(self, key: str, query: str):
+        self.job_id = uuid.uuid4().hex
+        self.key = key
+        self.query = query
+        self.status = JobStatus.PENDING
+        self.result: Optional[dict] = None
+        self.error: Optional[str] = None
+        self.created_at = time.time()
+        self.finished_at: Optional[float] = None
+        self.future: Optional[Future] = None
+
+    @property
+    def finished(self) -> bool:
+        return self.status in (JobStatus.DONE, JobStatus.FAILED)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "job_id": self.job_id,
+            "status": self.status,
+            "query": self.query,
+            "result": self.result,
+            "error": self.error,
+            "created_at": self.created_at,
+            "finished_at": self.finished_at,
+        }
+
+
+class VisualizationJobQueue:
+    """Bounded, deduplicating, caching job queue for visualization analysis"""
+
+    def __init__(
+        self,
+        max_workers: int = 2,
+        max_pending: int = 32,
+        cache_ttl: float = 600,
+        max_jobs: int = 1024,
+    ):
+        self.max_pending = max_pending
+        self.cache_ttl = cache_ttl
+        self.max_jobs = max_jobs
+
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="viz-analysis"
+        )
+        self._lock = threading.Lock()
+        self._jobs: "OrderedDict[str, AnalysisJob]" = OrderedDict()
+        self._active_by_key: Dict[str, AnalysisJob] = {}
+        self._cache: "OrderedDict[str, AnalysisJob]" = OrderedDict()
+        self._active = 0
+
+    @staticmethod
+    def job_key(data: dict, query: str) -> str:
+        """Stable fingerprint of a (data, query) pair used for dedup and caching"""
+        payload = json.dumps([data, query], sort_keys=True, separators=(",", ":"), default=str)
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    def submit(self, data: dict, query: str) -> AnalysisJob:
+        """
+        Queue an analysis job and return without waiting for the model
+
+        Identical in-flight requests share one job; identical requests that
+        finished successfully within the cache TTL return the cached job.
+        Hashing the payload for the key is proportional to its size, so call
+        this from a worker thread rather than the event loop. Profiling and
+        the rule-based chart check happen once, on the job's worker.
+
+        Raises:
+            JobQueueFullError: if max_pending jobs are already queued or running
+        """
+        key = self.job_key(data, query)
+
+        with self._lock:
+            cached = self._cache.get(key)
+            if cached is not None:
+                if time.time() - cached.finished_at <= self.cache_ttl:
+                    self._cache.move_to_end(key)
+                    self._jobs[cached.job_id] = cached
+                    self._jobs.move_to_end(cached.job_id)
+                    self._evict_finished_locked()
+                    return cached
+                del self._cache[key]
+
+            active = self._active_by_key.get(key)
+            if active is not None:
+                return active
+
+            if self._active >= self.max_pending:
+                raise JobQueueFullError(
+                    f"Visualization queue is full ({self.max_pending} jobs in progress)"
+                )
+
+            job = AnalysisJob(key, query)
+            self._jobs[job.job_id] = job
+            self._active_by_key[key] = job
+            self._active += 1
+            self._evict_finished_locked()
+
+        job.future = self._executor.submit(self._run, job, data)
+        return job
+
+    def get(self, job_id: str) -> Optional[AnalysisJob]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    async def wait(self, job_id: str, timeout: float) -> Optional[AnalysisJob]:
+        """Wait (without blocking the event loop) for a job to finish or the timeout"""
+        job = self.get(job_id)
+        if job is None or job.finished or job.future is None:
+            return job
+        try:
+            await asyncio.wait_for(asyncio.shield(asyncio.wrap_future(job.future)), timeout)
+        except asyncio.TimeoutError:
+            pass
+        return job
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "active": self._active,
+                "max_pending": self.max_pending,
+                "tracked_jobs": len(self._jobs),
+                "cached_results": len(self._cache),
+            }
+
+    def warmup(self):
+        """Import the analysis stack ahead of the first model-bound job"""
+        import app.services.visualization_service  # noqa: F401
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def _run(self, job: AnalysisJob, data: dict):
+        # Imported here: the Gemini SDK and pandas/plotly are slow to import
+        from app.services.visualization_service import VisualizationService
+
+        job.status = JobStatus.RUNNING
+        try:
+            job.result = VisualizationService.analyze_data_with_gemini(data, job.query)
+            status = JobStatus.DONE
+        except Exception as e:
+            print(f"Visualization analysis failed: {e}")
+            job.error = str(e)
+            status = JobStatus.FAILED
+
+        job.finished_at = time.time()
+        with self._lock:
+            job.status = status
+            self._active -= 1
+            self._active_by_key.pop(job.key, None)
+            if status == JobStatus.DONE:
+                self._cache[job.key] = job
+                self._cache.move_to_end(job.key)
+                while len(self._cache) > self.max_jobs:
+                    self._cache.popitem(last=False)
+
+    def _evict_finished_locked(self):
+        """Drop the oldest finished jobs once the job table exceeds max_jobs"""
+        if len(self._jobs) <= self.max_jobs:
+            return
+        for job_id in list(self._jobs):
+            if len(self._jobs) <= self.max_jobs:
+                break
+            if self._jobs[job_id].finished:
+                del self._jobs[job_id]
+
+
+# Create singleton instance
+visualization_job_queue = VisualizationJobQueue(
+    max_workers=Settings.VISUALIZATION_MAX_WORKERS,
+    max_pending=Settings.VISUALIZATION_MAX_PENDING,
+    cache_ttl=Settings.VISUALIZATION_CACHE_TTL,
+)
@@ -1,6 +1,11 @@
 import google.generativeai as genai
+from app.client import GEMINI_REQUESTS, GEMINI_SECONDS
 from app.config import Settings
+from app.services.metrics import metrics, timed
+from app.services.data_profiler import profile_data, select_chart, summarize_profile
+from typing import Optional
 import json
+import re
 import pandas as pd
 import plotly.graph_objects as go
 import plotly.express as px
@@ -8,12 +13,34 @@ from io import BytesIO
 import base64
 genai.configure(api_key=Settings.GEMINI_API_KEY)
 
+_JSON_FENCE = re.compile(r"```(?:json)?\s*(.*?)```", re.DOTALL)
+
+_CHART_SECONDS = metrics.histogram("chart_render_seconds", "Time to render a chart to PNG", ("chart",))
+
 class VisualizationService:
     """Generate visualizations from database data using Gemini"""
+    @staticmethod
+    def recommend_chart(data: dict, query: str, profile: Optional[dict] = None) -> Optional[dict]:
+        """
+        Rule-based chart recommendation from a local data profile
+        
+        Returns:
+            dict with visualization recommendations, or None if the rules
+            can't decide and the model should be asked
+        """
+        if profile is None:
+            profile = profile_data(data)
+        return select_chart(profile, query)
+    
     @staticmethod
     def analyze_data_with_gemini(data: dict, query: str) -> dict:
         """
-        Ask Gemini to analyze data and suggest best visualization
+        Suggest the best visualization, asking Gemini only when needed
+        
+        The data is profiled locally first; common queries are answered by
+        rule-based chart selection. Otherwise Gemini gets a compact schema
+        summary (column types, ranges, a small stratified sample) instead of
+        the raw data.
         
         Args:
             data: Dictionary containing your database data
@@ -22,14 +49,18 @@ class VisualizationService:
         Returns:
             dict with visualization recommendations
         """
+        profile = profile_data(data)
+        recommendation = VisualizationService.recommend_chart(data, query, profile)
+        if recommendation is not None:
+            return recommendation
         
         prompt = f"""
         You are a data visualization expert. Analyze this data and suggest the best chart type.
 
         User Query: {query}
 
-        Data Summary:
-        {json.dumps(data, indent=2, default=str)[:2000]}  # Limit to 2000 chars
+        Data Profile (column types, cardinalities, ranges and a sample of rows):
+        {summarize_profile(profile)}
 
         Based on this data, respond with ONLY a JSON object (no markdown, no explanation):
         {{
@@ -43,15 +74,39 @@ class VisualizationService:
         """
         
         model = genai.GenerativeModel('gemini-2.0-flash-exp')
-        response = model.generate_content(prompt)
+        with GEMINI_SECONDS.labels("visualization").time():
+            try:
+                response = model.generate_content(prompt)
+            except Exception:
+                GEMINI_REQUESTS.labels("visualization", "error").inc()
+                raise
+        GEMINI_REQUESTS.labels("visualization", "ok").inc()
+        
+        result = VisualizationService._parse_model_json(response.text)
+        result["source"] = "gemini"
+        return result
+    
+    @staticmethod
+    def _parse_model_json(text: str) -> dict:
+        """
+        Extract the JSON object from a model response
+        
+        Accepts bare JSON, JSON inside a markdown fence, or JSON surrounded
+        by stray prose; raises ValueError if no object can be decoded.
+        """
+        text = text.strip()
+        fenced = _JSON_FENCE.search(text)
+        if fenced:
+            text = fenced.group(1).strip()
         
-        # Clean and parse response
-        text = response.text.strip()
-        text = text.replace('```json', '').replace('```', '').strip()
+        start, end = text.find('{'), text.rfind('}')
+        if start == -1 or end < start:
+            raise ValueError(f"No JSON object in model response: {text[:200]}")
         
-        return json.loads(text)
+        return json.loads(text[start:end + 1])
     
     @staticmethod
+    @timed(_CHART_SECONDS.labels("attention_over_time"))
     def generate_attention_over_time_chart(session_data: list) -> str:
         """
         Generate line chart showing attention over time
@@ -91,6 +146,7 @@ class VisualizationService:
         return f"data:image/png;base64,{img_base64}"
     
     @staticmethod
+    @timed(_CHART_SECONDS.labels("focus_distribution"))
     def generate_focus_distribution_chart(seconds_focused: int, seconds_distracted: int) -> str:
         """
         Generate pie chart showing focus vs distraction distribution
@@ -114,6 +170,7 @@ class VisualizationService:
         return f"data:image/png;base64,{img_base64}"
     
     @staticmethod
+    @timed(_CHART_SECONDS.labels("session_comparison"))
     def generate_session_comparison_chart(sessions: list) -> str:
         """
         Generate bar chart comparing multiple sessions
@@ -0,0 +1,471 @@
+"""
+Attention detection benchmark
+Runs AttentionDetectorService.detect_attention over a fixed frame set and
+reports per-stage timings (cvtColor, face detection, eye cascade, scoring),
+end-to-end latency percentiles, FPS and memory. Needs no camera or display:
+the default frame set is generated deterministically (empty scenes and
+drawn faces the cascades pick up, at several positions and sizes), and
+recorded frames can be added from an image directory or a video file.
+
+A static-scene pass feeds the same frame with fresh sensor noise to a
+detector with change detection on, to show what reusing results saves
+while a student sits still (full detection is measured with it off).
+
+With --detectors haar,dnn every face detector backend is run over the same
+frames and compared (speed, and how often each finds a face per category),
+and --batch-sizes times the DNN backend's batched forward pass, to choose a
+backend and FACE_BATCH_MAX per host.
+
+Results are written as JSON; with --baseline the run is compared against an
+earlier result and exits non-zero when a metric's median over rounds
+regressed past the threshold plus the round-to-round noise. The run needs
+at least as many --rounds as the baseline.
+
+Usage (from backend/):
+    python benchmarks/detection_benchmark.py --output bench.json
+    python benchmarks/detection_benchmark.py --baseline bench.json --threshold 0.15
+    python benchmarks/detection_benchmark.py --frames-dir recorded/ --video session.mp4
+    python benchmarks/detection_benchmark.py --detectors haar,dnn --batch-sizes 1,2,4,8 --threads 4
+"""
+import argparse
+import hashlib
+import json
+import os
+import platform
+import resource
+import statistics
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.services.attention_detector_service import STAGES, AttentionDetectorService  # noqa: E402
+from app.services.face_detectors import HaarFaceDetector, create_dnn_detector, dnn_model_available  # noqa: E402
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp")
+
+
+def _background(rng, width, height) -> np.ndarray:
+    # Smooth like camera content; per-pixel noise is a pathological case for the cascades
+    noise = rng.integers(0, 160, size=(height, width, 3), dtype=np.uint8)
+    return cv2.GaussianBlur(noise, (0, 0), 15)
+
+
+def _draw_face(frame, cx: int, cy: int, s: float):
+    """A simple frontal face (skin oval, brows, eyes, nose, mouth) the Haar cascades detect"""
+    cv2.ellipse(frame, (cx, cy), (int(80 * s), int(105 * s)), 0, 0, 360, (150, 170, 200), -1)
+    for side in (-1, 1):
+        ex, ey = cx + side * int(35 * s), cy - int(25 * s)
+        cv2.ellipse(frame, (ex, ey - int(18 * s)), (int(22 * s), int(6 * s)), 0, 0, 360, (50, 60, 70), -1)
+        cv2.ellipse(frame, (ex, ey), (int(18 * s), int(9 * s)), 0, 0, 360, (245, 245, 245), -1)
+        cv2.circle(frame, (ex, ey), int(7 * s), (30, 30, 30), -1)
+    cv2.ellipse(frame, (cx, cy + int(15 * s)), (int(8 * s), int(20 * s)), 0, 0, 360, (120, 140, 170), -1)
+    cv2.ellipse(frame, (cx, cy + int(60 * s)), (int(30 * s), int(9 * s)), 0, 0, 360, (70, 70, 140), -1)
+
+
+def synthetic_frames(seed: int = 0, per_category: int = 8, width: int = 640, height: int = 480) -> list:
+    """
+    Deterministic frame set covering every pipeline path
+
+    Returns:
+        List of (category, frame)
+    """
+    rng = np.random.default_rng(seed)
+    layouts = {
+        "empty": None,
+        "face_centered": (0.5, 0.5, 1.0),
+        "face_offset": (0.22, 0.35, 0.9),
+        "face_small": (0.5, 0.5, 0.6),
+        "face_large": (0.5, 0.5, 1.6),
+    }
+    frames = []
+    for category, layout in layouts.items():
+        for _ in range(per_category):
+            frame = _background(rng, width, height)
+            if layout is not None:
+                fx, fy, scale = layout
+                jitter = rng.integers(-12, 13, size=2)
+                _draw_face(frame, int(width * fx) + int(jitter[0]), int(height * fy) + int(jitter[1]), scale)
+                frame = cv2.GaussianBlur(frame, (0, 0), 2)
+            frames.append((category, frame))
+    return frames
+
+
+def recorded_frames(frames_dir: str = None, video: str = None, limit: int = 200) -> list:
+    """Frames from an image directory and/or the first `limit` frames of a video"""
+    frames = []
+    if frames_dir:
+        for path in sorted(Path(frames_dir).iterdir())[:limit]:
+            if path.suffix.lower() in IMAGE_EXTENSIONS:
+                image = cv2.imread(str(path))
+                if image is not None:
+                    frames.append(("recorded", image))
+    if video:
+        cap = cv2.VideoCapture(video)
+        while len(frames) < limit * 2:
+            ret, frame = cap.read()
+            if not ret:
+                break
+            frames.append(("recorded", frame))
+        cap.release()
+    return frames
+
+
+def dataset_fingerprint(frames: list) -> str:
+    digest = hashlib.sha256()
+    for category, frame in frames:
+        digest.update(category.encode())
+        digest.update(frame.tobytes())
+    return digest.hexdigest()[:16]
+
+
+def percentiles(samples: list) -> dict:
+    """Summary statistics in milliseconds"""
+    if not samples:
+        return {"count": 0}
+    ms = np.asarray(samples) * 1000
+    return {
+        "count": len(samples),
+        "mean_ms": round(float(ms.mean()), 4),
+        "p50_ms": round(float(np.percentile(ms, 50)), 4),
+        "p90_ms": round(float(np.percentile(ms, 90)), 4),
+        "p95_ms": round(float(np.percentile(ms, 95)), 4),
+        "p99_ms": round(float(np.percentile(ms, 99)), 4),
+        "max_ms": round(float(ms.max()), 4),
+    }
+
+
+def make_face_detector(name: str, threads: int = 0, dnn_model: str = None, dnn_config: str = None):
+    """A fresh, unshared backend so runs don't interfere"""
+    if name == "haar":
+        return HaarFaceDetector()
+    if name == "dnn":
+        return create_dnn_detector(dnn_model, dnn_config, threads=threads)
+    raise SystemExit(f"Unknown detector {name!r}; choose from haar, dnn")
+
+
+def run_benchmark(frames: list, rounds: int = 5, warmup: int = 1, face_detector=None) -> dict:
+    """
+    Time detect_attention over every frame, `rounds` times
+
+    Returns:
+        Result dict (see module docstring)
+    """
+    face_detector = face_detector or HaarFaceDetector()
+    detector = AttentionDetectorService(change_threshold=0, face_detector=face_detector)
+    detector.warmup()
+    for _ in range(warmup):
+        for _, frame in frames:
+            detector.detect_attention(frame.copy())
+
+    latencies = []
+    stages = {stage: [] for stage in STAGES}
+    by_category = {}
+    faces_by_category = {}
+    attentive = 0
+    # Per-round summaries, so a comparison can tell noise from a real change
+    per_round = {"latency_p50_ms": [], "fps": []}
+    per_round.update({f"stages.{stage}.p50_ms": [] for stage in STAGES})
+    wall = 0.0
+    for _ in range(rounds):
+        # Frames are copied up front so the timed loop measures detection only
+        work = [(category, frame.copy()) for category, frame in frames]
+        round_latencies = []
+        round_stages = {stage: [] for stage in STAGES}
+        started = time.perf_counter()
+        for category, frame in work:
+            timings = {}
+            t0 = time.perf_counter()
+            is_attentive, score, _ = detector.detect_attention(frame, timings)
+            elapsed = time.perf_counter() - t0
+            round_latencies.append(elapsed)
+            by_category.setdefault(category, []).append(elapsed)
+            faces_by_category.setdefault(category, []).append(score > 0)
+            attentive += is_attentive
+            for stage, seconds in timings.items():
+                round_stages[stage].append(seconds)
+        round_wall = time.perf_counter() - started
+        wall += round_wall
+
+        latencies.extend(round_latencies)
+        per_round["latency_p50_ms"].append(percentiles(round_latencies)["p50_ms"])
+        per_round["fps"].append(round(len(work) / round_wall, 2))
+        for stage, samples in round_stages.items():
+            stages[stage].extend(samples)
+            if samples:
+                per_round[f"stages.{stage}.p50_ms"].append(percentiles(samples)["p50_ms"])
+
+    # Allocation tracing slows every call down, so memory gets its own pass
+    tracemalloc.start()
+    for _, frame in frames:
+        detector.detect_attention(frame.copy())
+    _, peak_traced = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        "meta": {
+            "python": platform.python_version(),
+            "opencv": cv2.__version__,
+            "numpy": np.__version__,
+            "machine": platform.machine(),
+            "processor": platform.processor(),
+            "cpu_count": os.cpu_count(),
+            "opencv_threads": cv2.getNumThreads(),
+            "detector": face_detector.name,
+            "frames": len(frames),
+            "rounds": rounds,
+            "dataset": dataset_fingerprint(frames),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        },
+        "fps": round(len(latencies) / wall, 2),
+        "attentive_ratio": round(attentive / len(latencies), 4),
+        # The fastest round's median is the least affected by other load on the machine
+        "latency": dict(percentiles(latencies), best_round_p50_ms=min(per_round["latency_p50_ms"])),
+        "rounds": per_round,
+        "stages": {stage: percentiles(samples) for stage, samples in stages.items()},
+        "categories": {
+            category: dict(percentiles(samples), face_ratio=round(float(np.mean(faces_by_category[category])), 4))
+            for category, samples in by_category.items()
+        },
+        "memory": {
+            "peak_traced_kb": round(peak_traced / 1024, 1),
+            # ru_maxrss is in KB on Linux
+            "max_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        },
+    }
+
+
+def run_static_benchmark(frames: list, count: int = 300, noise: float = 3.0, seed: int = 0) -> dict:
+    """
+    Time detect_attention with change detection on a still scene: one face
+    frame plus Gaussian sensor noise (sigma in gray levels) per frame
+
+    Returns:
+        Latency percentiles, share of frames that reused a result, and the
+        p50 relative to the same frames with change detection off
+    """
+    base = next((frame for category, frame in frames if category == "face_centered"), frames[0][1])
+    rng = np.random.default_rng(seed)
+    variants = [
+        np.clip(base + rng.normal(0, noise, base.shape), 0, 255).astype(np.uint8)
+        for _ in range(16)
+    ]
+
+    full = AttentionDetectorService(change_threshold=0, face_detector=HaarFaceDetector())
+    full.warmup()
+    full_latencies = []
+    for frame in variants:
+        t0 = time.perf_counter()
+        full.detect_attention(frame)
+        full_latencies.append(time.perf_counter() - t0)
+
+    detector = AttentionDetectorService(face_detector=HaarFaceDetector())
+    detector.warmup()
+    latencies, full_runs = [], 0
+    for i in range(count):
+        timings = {}
+        t0 = time.perf_counter()
+        detector.detect_attention(variants[i % len(variants)], timings)
+        latencies.append(time.perf_counter() - t0)
+        full_runs += "face_detection" in timings
+
+    static_p50, full_p50 = statistics.median(latencies), statistics.median(full_latencies)
+    return dict(
+        percentiles(latencies),
+        reuse_ratio=round(1 - full_runs / count, 4),
+        full_detection_p50_ms=round(full_p50 * 1000, 4),
+        relative_cost=round(static_p50 / full_p50, 4),
+    )
+
+
+def run_batch_benchmark(frames: list, face_detector, batch_sizes: list, rounds: int = 3) -> dict:
+    """
+    Throughput of detect_batch at several batch sizes (one forward pass per
+    batch for the DNN backend)
+
+    Returns:
+        {batch size: {fps, per_batch_p50_ms}}
+    """
+    face_detector.load()
+    images = [frame for _, frame in frames]
+    face_detector.detect_batch(images[:max(batch_sizes)])  # warm up
+    results = {}
+    for size in batch_sizes:
+        batches = [images[i:i + size] for i in range(0, len(images) - size + 1, size)] * rounds
+        durations = []
+        for batch in batches:
+            t0 = time.perf_counter()
+            face_detector.detect_batch(batch)
+            durations.append(time.perf_counter() - t0)
+        results[str(size)] = {
+            "fps": round(len(batches) * size / sum(durations), 2),
+            "per_batch_p50_ms": round(statistics.median(durations) * 1000, 4),
+        }
+    return results
+
+
+def summarize_detector(result: dict) -> dict:
+    """The numbers that matter when choosing a backend"""
+    return {
+        "fps": result["fps"],
+        "best_round_p50_ms": result["latency"]["best_round_p50_ms"],
+        "p95_ms": result["latency"]["p95_ms"],
+        "face_detection_p50_ms": result["stages"]["face_detection"].get("p50_ms"),
+        "face_ratio": {category: stats["face_ratio"] for category, stats in result["categories"].items()},
+    }
+
+
+def compare(result: dict, baseline: dict, threshold: float) -> list:
+    """
+    Metrics that got worse than the baseline by more than the allowed change
+
+    Timings are compared as the median over rounds (tail percentiles are
+    reported but too noisy to gate on), and the allowed change
+    is threshold (a fraction) plus the round-to-round noise of either run:
+    half the spread of its per-round values, relative to their median.
+    Baselines written before per-round values were recorded are compared on
+    their overall medians with the threshold alone.
+
+    Returns:
+        List of (metric, baseline value, current value, change, allowed change)
+    """
+    # metric -> lower is better
+    timed = {"latency_p50_ms": True, "fps": False}
+    timed.update({f"stages.{stage}.p50_ms": True for stage in STAGES})
+
+    pairs = []
+    if "rounds" in baseline:
+        for name, lower_is_better in timed.items():
+            old_rounds, new_rounds = baseline["rounds"].get(name), result["rounds"].get(name)
+            if old_rounds and new_rounds:
+                pairs.append((name, old_rounds, new_rounds, lower_is_better))
+    else:
+        pairs.append(("latency_p50_ms", [baseline["latency"].get("p50_ms")], result["rounds"]["latency_p50_ms"], True))
+        for stage in STAGES:
+            name = f"stages.{stage}.p50_ms"
+            pairs.append((name, [baseline["stages"].get(stage, {}).get("p50_ms")], result["rounds"][name], True))
+    pairs.append(("memory.peak_traced_kb", [baseline["memory"]["peak_traced_kb"]],
+                  [result["memory"]["peak_traced_kb"]], True))
+
+    regressions = []
+    for name, old_rounds, new_rounds, lower_is_better in pairs:
+        if not all(old_rounds) or not new_rounds:
+            continue
+        old, new = statistics.median(old_rounds), statistics.median(new_rounds)
+        change = (new - old) / old if lower_is_better else (old - new) / old
+        noise = max((max(old_rounds) - min(old_rounds)) / 2 / old,
+                    (max(new_rounds) - min(new_rounds)) / 2 / new if new else 0.0)
+        allowed = threshold + noise
+        if change > allowed:
+            regressions.append((name, round(old, 4), round(new, 4), change, allowed))
+    return regressions
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rounds", type=int, default=5, help="passes over the frame set")
+    parser.add_argument("--per-category", type=int, default=8, help="synthetic frames per category")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--frames-dir", help="directory of recorded frames to include")
+    parser.add_argument("--video", help="recorded video to take frames from")
+    parser.add_argument("--threads", type=int, default=1,
+                        help="OpenCV threads (default 1, for results comparable across machines)")
+    parser.add_argument("--detectors", default="haar",
+                        help="comma separated face detector backends to compare (haar, dnn); the first is the primary result")
+    parser.add_argument("--batch-sizes", help="comma separated DNN batch sizes to time, e.g. 1,2,4,8")
+    parser.add_argument("--dnn-model", help="DNN weights (default FACE_DNN_MODEL)")
+    parser.add_argument("--dnn-config", help="DNN network description (default FACE_DNN_CONFIG)")
+    parser.add_argument("--output", help="write the result JSON here")
+    parser.add_argument("--baseline", help="earlier result JSON to compare against")
+    parser.add_argument("--threshold", type=float, default=0.15, help="allowed regression, as a fraction")
+    args = parser.parse_args()
+
+    cv2.setNumThreads(args.threads)
+    frames = synthetic_frames(args.seed, args.per_category) + recorded_frames(args.frames_dir, args.video)
+    names = [name.strip().lower() for name in args.detectors.split(",") if name.strip()]
+    if ("dnn" in names or args.batch_sizes) and not dnn_model_available(args.dnn_model, args.dnn_config):
+        print("⚠️  DNN model files not found (see FACE_DNN_MODEL / --dnn-model); skipping the dnn backend")
+        names = [name for name in names if name != "dnn"]
+        args.batch_sizes = None
+    make = lambda name: make_face_detector(name, args.threads, args.dnn_model, args.dnn_config)  # noqa: E731
+    if not names:
+        raise SystemExit("No face detector backend to run")
+
+    print("=" * 60)
+    print(f"DETECTION BENCHMARK: {len(frames)} frames x {args.rounds} rounds")
+    print("=" * 60)
+
+    result = run_benchmark(frames, rounds=args.rounds, face_detector=make(names[0]))
+    result["static_scene"] = run_static_benchmark(frames)
+    if len(names) > 1:
+        result["detectors"] = {names[0]: summarize_detector(result)}
+        for name in names[1:]:
+            other = run_benchmark(frames, rounds=args.rounds, face_detector=make(name))
+            result["detectors"][name] = summarize_detector(other)
+    if args.batch_sizes:
+        sizes = [int(size) for size in args.batch_sizes.split(",")]
+        result["dnn_batching"] = run_batch_benchmark(frames, make("dnn"), sizes)
+
+    latency = result["latency"]
+    print(f"\nEnd to end: {result['fps']:.1f} FPS | p50 {latency['p50_ms']:.2f} ms | "
+          f"p95 {latency['p95_ms']:.2f} ms | p99 {latency['p99_ms']:.2f} ms")
+    print("\nStages (frames that reached the stage):")
+    for stage, stats in result["stages"].items():
+        if stats["count"]:
+            print(f"  {stage:<15} n={stats['count']:<5} mean {stats['mean_ms']:8.3f} ms  "
+                  f"p50 {stats['p50_ms']:8.3f} ms  p95 {stats['p95_ms']:8.3f} ms")
+    print(f"\nCategories ({result['meta']['detector']}):")
+    for category, stats in result["categories"].items():
+        print(f"  {category:<14} p50 {stats['p50_ms']:8.3f} ms  p95 {stats['p95_ms']:8.3f} ms  "
+              f"face found {stats['face_ratio']:.0%}")
+    if "detectors" in result:
+        print("\nDetector backends:")
+        for name, summary in result["detectors"].items():
+            found = ", ".join(f"{c} {r:.0%}" for c, r in summary["face_ratio"].items())
+            print(f"  {name:<5} {summary['fps']:7.1f} FPS  best p50 {summary['best_round_p50_ms']:8.3f} ms  "
+                  f"face detection p50 {summary['face_detection_p50_ms']:8.3f} ms  | {found}")
+    if "dnn_batching" in result:
+        print("\nDNN batching:")
+        for size, stats in result["dnn_batching"].items():
+            print(f"  batch {size:>3}  {stats['fps']:7.1f} FPS  {stats['per_batch_p50_ms']:8.3f} ms per batch")
+    static = result["static_scene"]
+    print(f"\nStatic scene: p50 {static['p50_ms']:.3f} ms ({static['relative_cost']:.1%} of full detection), "
+          f"{static['reuse_ratio']:.0%} of frames reused a result")
+    print(f"\nMemory: peak traced {result['memory']['peak_traced_kb']:.0f} KB, "
+          f"max RSS {result['memory']['max_rss_kb'] / 1024:.0f} MB")
+
+    if args.output:
+        Path(args.output).write_text(json.dumps(result, indent=2))
+        print(f"\nResults written to {args.output}")
+
+    if not args.baseline:
+        return 0
+
+    baseline = json.loads(Path(args.baseline).read_text())
+    if baseline["meta"].get("dataset") != result["meta"]["dataset"]:
+        print("\n⚠️  Baseline was measured on a different frame set; comparison may not be meaningful")
+    baseline_rounds = baseline["meta"].get("rounds", 0)
+    if args.rounds < baseline_rounds:
+        # Fewer rounds give noisier medians and would flag noise as regressions
+        print(f"\n❌ Baseline was measured over {baseline_rounds} rounds; "
+              f"rerun with --rounds {baseline_rounds} or more to compare")
+        return 2
+    if "rounds" not in baseline:
+        print("\n⚠️  Baseline has no per-round values; comparing overall medians with the threshold alone")
+    regressions = compare(result, baseline, args.threshold)
+    print(f"\nCompared with {args.baseline} (threshold {args.threshold:.0%} plus round-to-round noise):")
+    if regressions:
+        for name, old, new, change, allowed in regressions:
+            print(f"  ❌ {name}: {old} -> {new} ({change:+.0%} worse, {allowed:.0%} allowed)")
+        return 1
+    print("  ✅ No regressions")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,293 @@
+"""
+HTTP load benchmark for the backend
+Runs app.main in-process behind httpx's ASGI transport, with a temporary
+SQLite database (or --database-url, e.g. a local Postgres) and a stubbed
+Gemini client whose stream sleeps like the real SDK blocks on the network.
+Each endpoint is driven by --concurrency concurrent clients; the report has
+throughput, p50/p95/p99 latency and event-loop lag (how late a 10 ms timer
+fires while the endpoint is under load), plus SSE time to first byte for
+/chat/stream.
+
+Clients and app share one event loop, so numbers include client overhead
+and are best compared between runs on the same machine.
+
+Usage (from backend/):
+    python benchmarks/load_benchmark.py
+    python benchmarks/load_benchmark.py --concurrency 50 --requests 2000 --endpoints chat_stream,music_status
+    python benchmarks/load_benchmark.py --database-url postgresql://localhost/companion_bench --output load.json
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+
+class _Chunk:
+    def __init__(self, text: str):
+        self.text = text
+
+
+class StubGeminiModels:
+    def __init__(self, chunks: int, first_chunk_delay: float, chunk_delay: float):
+        self.chunks = chunks
+        self.first_chunk_delay = first_chunk_delay
+        self.chunk_delay = chunk_delay
+
+    def generate_content_stream(self, model, contents, config=None):
+        # Blocking sleeps, like the SDK's synchronous stream waiting on the network
+        time.sleep(self.first_chunk_delay)
+        for i in range(self.chunks):
+            if i:
+                time.sleep(self.chunk_delay)
+            yield _Chunk(f"token{i} ")
+
+
+class StubGeminiClient:
+    """Stand-in for google.genai.Client with a canned, timed response stream"""
+
+    def __init__(self, chunks: int = 20, first_chunk_delay: float = 0.05, chunk_delay: float = 0.005):
+        self.models = StubGeminiModels(chunks, first_chunk_delay, chunk_delay)
+
+
+class FirstByteTimer:
+    """
+    ASGI wrapper recording when each request's first body bytes are sent
+
+    httpx's ASGI transport hands back a response only once it is complete,
+    so time to first byte is taken on the server side, keyed by the
+    x-bench-id request header.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self.first_byte = {}
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        bench_id = dict(scope["headers"]).get(b"x-bench-id")
+        if bench_id is None:
+            return await self.app(scope, receive, send)
+
+        async def timed_send(message):
+            if message["type"] == "http.response.body" and message.get("body") and bench_id not in self.first_byte:
+                self.first_byte[bench_id] = time.perf_counter()
+            await send(message)
+
+        await self.app(scope, receive, timed_send)
+
+
+class LoopLagMonitor:
+    """Measures how late a periodic timer fires, i.e. how long the loop was blocked"""
+
+    def __init__(self, interval: float = 0.01):
+        self.interval = interval
+        self.samples = []
+        self._task = None
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            expected = loop.time() + self.interval
+            await asyncio.sleep(self.interval)
+            self.samples.append(max(0.0, loop.time() - expected))
+
+    def start(self):
+        self.samples = []
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+
+
+def summarize(samples: list) -> dict:
+    """Percentiles in milliseconds"""
+    if not samples:
+        return {"count": 0}
+    ms = np.asarray(samples) * 1000
+    return {
+        "count": len(samples),
+        "mean_ms": round(float(ms.mean()), 3),
+        "p50_ms": round(float(np.percentile(ms, 50)), 3),
+        "p95_ms": round(float(np.percentile(ms, 95)), 3),
+        "p99_ms": round(float(np.percentile(ms, 99)), 3),
+        "max_ms": round(float(ms.max()), 3),
+    }
+
+
+def build_scenarios(session_ids: list) -> dict:
+    """Endpoint name -> function(i) returning (method, url, request kwargs)"""
+    pick = lambda i: session_ids[i % len(session_ids)]  # noqa: E731
+    return {
+        "attention_status": lambda i: ("GET", "/api/attention/status", {}),
+        "sessions_current": lambda i: ("GET", "/sessions/current", {}),
+        "session_start": lambda i: ("POST", "/api/session/start", {"json": {
+            "subject": f"Load test {i}", "duration": 25, "audio_type": "lofi"}}),
+        "music_start": lambda i: ("POST", "/api/music/start", {"json": {
+            "audio_type": "lofi", "session_id": pick(i)}}),
+        "music_pause": lambda i: ("POST", "/api/music/pause", {"params": {"session_id": pick(i)}}),
+        "music_resume": lambda i: ("POST", "/api/music/resume", {"params": {"session_id": pick(i)}}),
+        "music_status": lambda i: ("GET", "/api/music/status", {"params": {"session_id": pick(i)}}),
+        "music_status_batch": lambda i: ("POST", "/api/music/status/batch", {"json": {
+            "session_ids": [pick(i + k) for k in range(10)]}}),
+        "chat_stream": lambda i: ("POST", "/chat/stream", {
+            "json": {"session_id": pick(i), "message": "Explain spaced repetition"},
+            "headers": {"Authorization": "Bearer load-test"}}),
+    }
+
+
+async def run_endpoint(client, timer: FirstByteTimer, name: str, scenario, requests: int, concurrency: int) -> dict:
+    latencies, ttfb = [], []
+    statuses = {}
+    counter = itertools.count()
+    monitor = LoopLagMonitor()
+
+    async def worker():
+        while (i := next(counter)) < requests:
+            method, url, kwargs = scenario(i)
+            bench_id = f"{name}-{i}".encode()
+            headers = dict(kwargs.pop("headers", {}), **{"x-bench-id": bench_id.decode()})
+            started = time.perf_counter()
+            try:
+                response = await client.request(method, url, headers=headers, **kwargs)
+                status = response.status_code
+            except Exception as e:
+                status = type(e).__name__
+            latencies.append(time.perf_counter() - started)
+            statuses[status] = statuses.get(status, 0) + 1
+            first_byte = timer.first_byte.pop(bench_id, None)
+            if first_byte is not None:
+                ttfb.append(first_byte - started)
+
+    monitor.start()
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    await monitor.stop()
+
+    result = {
+        "requests": requests,
+        "concurrency": concurrency,
+        "throughput_rps": round(requests / elapsed, 1),
+        "statuses": {str(k): v for k, v in statuses.items()},
+        "latency": summarize(latencies),
+        "loop_lag": summarize(monitor.samples),
+    }
+    if name == "chat_stream":
+        result["ttfb"] = summarize(ttfb)
+    return result
+
+
+async def run(args) -> dict:
+    # Settings are read at import time, so configure the environment first
+    if args.database_url:
+        os.environ["STORAGE_MODE"] = "central"
+        os.environ["DATABASE_URL"] = args.database_url
+    else:
+        os.environ["STORAGE_MODE"] = "embedded"
+        os.environ["SQLITE_PATH"] = os.path.join(tempfile.mkdtemp(prefix="load-bench-"), "bench.db")
+        os.environ["SYNC_DATABASE_URL"] = ""  # no background sync to a central database
+    os.environ["WARMUP_SERVICES"] = ""
+    os.environ["MUSIC_PERSIST_STATE"] = "false"
+
+    import httpx
+    from app.db.conn import get_engine
+    from app.main import app
+    from app.models import Base
+    from app.services.registry import services
+
+    get_engine()
+    if args.database_url:
+        Base.metadata.create_all(get_engine())
+    services.override("gemini_client", StubGeminiClient(
+        chunks=args.chat_chunks, first_chunk_delay=args.chat_first_chunk_ms / 1000,
+        chunk_delay=args.chat_chunk_ms / 1000))
+
+    timer = FirstByteTimer(app)
+    transport = httpx.ASGITransport(app=timer)
+    limits = httpx.Limits(max_connections=None, max_keepalive_connections=None)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", limits=limits, timeout=60) as client:
+        # Sessions for the per-session endpoints to address
+        session_ids = []
+        for i in range(args.sessions):
+            r = await client.post("/api/session/start", json={"subject": f"Seed {i}", "duration": 25, "audio_type": "lofi"})
+            r.raise_for_status()
+            session_ids.append(r.json()["session_id"])
+
+        scenarios = build_scenarios(session_ids)
+        names = args.endpoints.split(",") if args.endpoints else list(scenarios)
+        results = {}
+        for name in names:
+            if name not in scenarios:
+                raise SystemExit(f"Unknown endpoint {name!r}; choose from {', '.join(scenarios)}")
+            requests = max(args.requests // 4, args.concurrency) if name == "chat_stream" else args.requests
+            results[name] = await run_endpoint(client, timer, name, scenarios[name], requests, args.concurrency)
+            print_result(name, results[name])
+
+    if services.is_loaded("pomodoro_scheduler"):
+        await services.pomodoro_scheduler.shutdown()
+
+    return {
+        "meta": {
+            "database": "postgres" if args.database_url else "sqlite",
+            "concurrency": args.concurrency,
+            "requests": args.requests,
+            "cpu_count": os.cpu_count(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        },
+        "endpoints": results,
+    }
+
+
+def print_result(name: str, result: dict):
+    latency, lag = result["latency"], result["loop_lag"]
+    line = (f"  {name:<20} {result['throughput_rps']:>8.1f} req/s  p50 {latency['p50_ms']:8.2f}  "
+            f"p95 {latency['p95_ms']:8.2f}  p99 {latency['p99_ms']:8.2f} ms  "
+            f"loop lag p99 {lag.get('p99_ms', 0):7.2f} ms")
+    if "ttfb" in result and result["ttfb"]["count"]:
+        line += f"  TTFB p50 {result['ttfb']['p50_ms']:.2f} / p99 {result['ttfb']['p99_ms']:.2f} ms"
+    errors = {k: v for k, v in result["statuses"].items() if not k.startswith("2")}
+    if errors:
+        line += f"  non-2xx {errors}"
+    print(line)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", type=int, default=20, help="concurrent clients per endpoint")
+    parser.add_argument("--requests", type=int, default=500, help="requests per endpoint (a quarter for chat)")
+    parser.add_argument("--endpoints", help="comma separated subset of endpoints to drive")
+    parser.add_argument("--sessions", type=int, default=50, help="study sessions created up front")
+    parser.add_argument("--database-url", help="use this database instead of a temporary SQLite file")
+    parser.add_argument("--chat-chunks", type=int, default=20, help="chunks in each stubbed Gemini response")
+    parser.add_argument("--chat-first-chunk-ms", type=float, default=50)
+    parser.add_argument("--chat-chunk-ms", type=float, default=5)
+    parser.add_argument("--output", help="write results as JSON here")
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print(f"LOAD BENCHMARK: concurrency {args.concurrency}, {args.requests} requests per endpoint")
+    print("=" * 60)
+    result = asyncio.run(run(args))
+
+    if args.output:
+        Path(args.output).write_text(json.dumps(result, indent=2))
+        print(f"\nResults written to {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
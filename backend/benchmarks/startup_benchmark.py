@@ -0,0 +1,125 @@
+"""
+Startup benchmark for the backend
+Measures `import app.main` with `python -X importtime` and, optionally, how
+long a fresh uvicorn worker takes to answer /health. Exits non-zero when a
+budget is exceeded so it can gate CI.
+
+Usage (from backend/):
+    python benchmarks/startup_benchmark.py
+    python benchmarks/startup_benchmark.py --runs 5 --budget-ms 800 --health
+"""
+import argparse
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import urllib.request
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+
+def parse_importtime(stderr: str) -> dict:
+    """
+    Parse `-X importtime` output
+
+    Returns:
+        Dict of module name -> (self_us, cumulative_us)
+    """
+    modules = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        _, self_us, cumulative_us, name = [part.strip() for part in line.replace("import time:", "|", 1).split("|")]
+        modules[name] = (int(self_us), int(cumulative_us))
+    return modules
+
+
+def measure_import(module: str) -> dict:
+    env = dict(os.environ, PYTHONDONTWRITEBYTECODE="0")
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=BACKEND_DIR,
+        env=env,
+        capture_output=True,
+        text=True,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"Importing {module} failed:\n{result.stderr[-2000:]}")
+    return parse_importtime(result.stderr)
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def measure_health(timeout: float = 30.0) -> float:
+    """Seconds from spawning uvicorn until /health returns 200"""
+    port = free_port()
+    started = time.perf_counter()
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=BACKEND_DIR,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    try:
+        while time.perf_counter() - started < timeout:
+            try:
+                with urllib.request.urlopen(f"http://127.0.0.1:{port}/health", timeout=1) as r:
+                    if r.status == 200:
+                        return time.perf_counter() - started
+            except OSError:
+                time.sleep(0.01)
+        raise RuntimeError(f"/health not ready after {timeout}s")
+    finally:
+        proc.terminate()
+        proc.wait()
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--module", default="app.main")
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--top", type=int, default=15, help="slowest modules to list")
+    parser.add_argument("--budget-ms", type=float, default=1000, help="median import time budget")
+    parser.add_argument("--health", action="store_true", help="also time a uvicorn worker to a ready /health")
+    parser.add_argument("--health-budget-ms", type=float, default=1500)
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print(f"STARTUP BENCHMARK: import {args.module}")
+    print("=" * 60)
+
+    totals = []
+    last = {}
+    for i in range(args.runs):
+        last = measure_import(args.module)
+        total_ms = last[args.module][1] / 1000
+        totals.append(total_ms)
+        print(f"  run {i + 1}: {total_ms:.1f} ms")
+
+    median_ms = statistics.median(totals)
+    print(f"\nMedian import time: {median_ms:.1f} ms (budget {args.budget_ms:.0f} ms)")
+
+    print(f"\nSlowest {args.top} modules by cumulative time (last run):")
+    for name, (self_us, cumulative_us) in sorted(last.items(), key=lambda kv: -kv[1][1])[1:args.top + 1]:
+        print(f"  {cumulative_us / 1000:8.1f} ms  (self {self_us / 1000:6.1f} ms)  {name}")
+
+    failed = median_ms > args.budget_ms
+
+    if args.health:
+        health_ms = measure_health() * 1000
+        print(f"\nTime to ready /health: {health_ms:.1f} ms (budget {args.health_budget_ms:.0f} ms)")
+        failed = failed or health_ms > args.health_budget_ms
+
+    print("\n" + ("❌ Over budget" if failed else "✅ Within budget"))
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,80 +1,372 @@
 # backend/google_assistant_service.py
 
-import google.auth.transport.grpc
-import google.auth.transport.requests
-import google.oauth2.credentials
-from google.assistant.embedded.v1alpha2 import (
-    embedded_assistant_pb2,
-    embedded_assistant_pb2_grpc
-)
+import asyncio
+import itertools
 import json
 import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+
+ASSISTANT_API_ENDPOINT = 'embeddedassistant.googleapis.com'
+TOKEN_URI = 'https://oauth2.googleapis.com/token'
+
+# Refresh the access token this many seconds before it expires
+TOKEN_REFRESH_MARGIN = 300
+# Retry delay when a background refresh fails
+TOKEN_RETRY_DELAY = 30
+
+# Keep the shared channel warm so commands don't pay for reconnects
+KEEPALIVE_OPTIONS = [
+    ('grpc.keepalive_time_ms', 30000),
+    ('grpc.keepalive_timeout_ms', 10000),
+    ('grpc.keepalive_permit_without_calls', 1),
+    ('grpc.http2.max_pings_without_data', 0),
+]
+
+# Commands in flight at once over the shared channel
+MAX_IN_FLIGHT = int(os.getenv('ASSISTANT_MAX_IN_FLIGHT', '2'))
+# Default per-command deadline in seconds, measured from submission
+COMMAND_DEADLINE = float(os.getenv('ASSISTANT_COMMAND_DEADLINE', '10'))
+
+
+class StubAssistantBackend:
+    """Local stand-in for the Assistant API, for tests and offline development"""
+
+    def __init__(self, responses: Optional[Dict[str, str]] = None, latency: float = 0.0):
+        self.responses = responses or {}
+        self.latency = latency
+        self.commands: List[str] = []
+
+    def assist(self, command: str, timeout: Optional[float] = None) -> Optional[str]:
+        self.commands.append(command)
+        if self.latency:
+            time.sleep(self.latency)
+        return self.responses.get(command, "Command sent")
+
+    def close(self):
+        pass
+
+
+class GrpcAssistantBackend:
+    """Google Assistant over one shared, keepalive gRPC channel
+
+    Nothing touches the network until the first command (or connect()); the
+    OAuth token is then refreshed in the background before it expires.
+    """
+
+    def __init__(self, credentials_path: str):
+        self.credentials_path = credentials_path
+        self.credentials = None
+        self._channel = None
+        self._assistant = None
+        self._refresh_timer: Optional[threading.Timer] = None
+        self._lock = threading.Lock()
+
+    def connect(self):
+        if self._assistant is not None:
+            return
+        with self._lock:
+            if self._assistant is not None:
+                return
+
+            import google.auth.transport.grpc
+            import google.auth.transport.requests
+            import google.oauth2.credentials
+            from google.assistant.embedded.v1alpha2 import embedded_assistant_pb2_grpc
+
+            if not os.path.exists(self.credentials_path):
+                raise ValueError("Google Assistant credentials not found!")
+
+            with open(self.credentials_path, 'r') as f:
+                credentials_data = json.load(f)
+
+            # authenticate_google.py stores the access token as "token"
+            self.credentials = google.oauth2.credentials.Credentials(
+                token=credentials_data.get('token') or credentials_data.get('access_token'),
+                refresh_token=credentials_data.get('refresh_token'),
+                token_uri=credentials_data.get('token_uri', TOKEN_URI),
+                client_id=credentials_data['client_id'],
+                client_secret=credentials_data['client_secret']
+            )
+
+            http_request = google.auth.transport.requests.Request()
+            if not self.credentials.valid:
+                self.credentials.refresh(http_request)
+
+            self._channel = google.auth.transport.grpc.secure_authorized_channel(
+                self.credentials,
+                http_request,
+                ASSISTANT_API_ENDPOINT,
+                options=KEEPALIVE_OPTIONS,
+            )
+            self._assistant = embedded_assistant_pb2_grpc.EmbeddedAssistantStub(self._channel)
+            self._schedule_refresh()
+
+    def _schedule_refresh(self, delay: Optional[float] = None):
+        if not self.credentials.refresh_token:
+            # Nothing to refresh with; retrying would fail the same way forever
+            print("Assistant credentials have no refresh_token; re-run authenticate_google.py once the token expires")
+            return
+        if delay is None:
+            expiry = self.credentials.expiry
+            if expiry is None:
+                return
+            delay = (expiry - datetime.utcnow()).total_seconds() - TOKEN_REFRESH_MARGIN
+        self._refresh_timer = threading.Timer(max(delay, 5), self._refresh)
+        self._refresh_timer.daemon = True
+        self._refresh_timer.start()
+
+    def _refresh(self):
+        import google.auth.transport.requests
+
+        try:
+            self.credentials.refresh(google.auth.transport.requests.Request())
+            self._schedule_refresh()
+        except Exception as e:
+            print(f"Assistant token refresh failed: {e}")
+            self._schedule_refresh(TOKEN_RETRY_DELAY)
+
+    def assist(self, command: str, timeout: Optional[float] = None) -> Optional[str]:
+        from google.assistant.embedded.v1alpha2 import embedded_assistant_pb2
+
+        self.connect()
+
+        # Create text query
+        config = embedded_assistant_pb2.AssistConfig(
+            text_query=command,
+            audio_out_config=embedded_assistant_pb2.AudioOutConfig(
+                encoding='LINEAR16',
+                sample_rate_hertz=16000,
+                volume_percentage=100,
+            )
+        )
+        request = embedded_assistant_pb2.AssistRequest(config=config)
+
+        # Send request
+        for response in self._assistant.Assist([request], timeout=timeout):
+            if response.speech_results:
+                return response.speech_results[0].transcript
+
+        return "Command sent"
+
+    def close(self):
+        if self._refresh_timer:
+            self._refresh_timer.cancel()
+        if self._channel is not None:
+            self._channel.close()
+        self._channel = None
+        self._assistant = None
+
+
+class CommandHandle:
+    """Returned immediately by the command queue; resolves to the Assistant's transcript"""
+
+    PENDING = "pending"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+    SUPERSEDED = "superseded"
+    EXPIRED = "expired"
+
+    _ids = itertools.count(1)
+
+    def __init__(self, command: str, kind: Optional[str], deadline: float):
+        self.id = next(self._ids)
+        self.command = command
+        self.kind = kind
+        self.deadline = deadline            # time.monotonic() value
+        self.status = self.PENDING
+        self.error: Optional[str] = None
+        self.future: Future = Future()
+
+    def done(self) -> bool:
+        return self.future.done()
+
+    def result(self, timeout: Optional[float] = None) -> Optional[str]:
+        """Block until the command finishes; None if it was dropped or failed"""
+        return self.future.result(timeout)
+
+    def __await__(self):
+        return asyncio.wrap_future(self.future).__await__()
+
+    def _finish(self, status: str, result: Optional[str] = None, error: Optional[str] = None):
+        self.status = status
+        self.error = error
+        if not self.future.done():
+            self.future.set_result(result)
+
+    def to_dict(self) -> dict:
+        return {"id": self.id, "command": self.command, "kind": self.kind,
+                "status": self.status, "error": self.error}
+
+
+class AssistantCommandQueue:
+    """
+    Non-blocking command queue in front of the Assistant
+
+    Commands run in submission order on a few worker threads sharing one
+    channel. A pending command is dropped ("superseded") when a newer one of
+    the same kind arrives, e.g. two volume changes in a row only send the
+    last; commands of one kind never run concurrently, so their order holds.
+    Commands still queued past their deadline are dropped ("expired") and
+    the remaining time is passed to the call as its gRPC deadline.
+    """
+
+    def __init__(self, send: Callable[..., Optional[str]], max_in_flight: int = MAX_IN_FLIGHT,
+                 default_deadline: float = COMMAND_DEADLINE):
+        self._send = send
+        self.max_in_flight = max_in_flight
+        self.default_deadline = default_deadline
+        self._pending: deque = deque()
+        self._running_kinds: set = set()
+        self._cond = threading.Condition()
+        self._workers: List[threading.Thread] = []
+        self._closed = False
+
+    def submit(self, command: str, kind: Optional[str] = None, deadline: Optional[float] = None) -> CommandHandle:
+        """
+        Queue a command and return its handle without waiting
+
+        Args:
+            command: Text command for the Assistant
+            kind: Commands of the same kind supersede each other while pending
+            deadline: Seconds from now after which the command is pointless;
+                None uses default_deadline, 0 expires it without sending
+        """
+        if deadline is None:
+            deadline = self.default_deadline
+        handle = CommandHandle(command, kind, time.monotonic() + deadline)
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("Assistant command queue is closed")
+            if kind is not None:
+                for queued in [h for h in self._pending if h.kind == kind]:
+                    self._pending.remove(queued)
+                    queued._finish(CommandHandle.SUPERSEDED)
+            self._pending.append(handle)
+            self._start_workers_locked()
+            self._cond.notify()
+        return handle
+
+    def pending(self) -> List[dict]:
+        with self._cond:
+            return [h.to_dict() for h in self._pending]
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            while self._pending:
+                self._pending.popleft()._finish(CommandHandle.EXPIRED)
+            self._cond.notify_all()
+
+    def _start_workers_locked(self):
+        while len(self._workers) < self.max_in_flight:
+            worker = threading.Thread(target=self._worker, name=f"assistant-cmd-{len(self._workers)}", daemon=True)
+            self._workers.append(worker)
+            worker.start()
+
+    def _next_locked(self) -> Optional[CommandHandle]:
+        # First pending command whose kind isn't already in flight
+        for handle in self._pending:
+            if handle.kind is None or handle.kind not in self._running_kinds:
+                self._pending.remove(handle)
+                return handle
+        return None
+
+    def _worker(self):
+        while True:
+            with self._cond:
+                handle = self._next_locked()
+                while handle is None:
+                    if self._closed:
+                        return
+                    self._cond.wait()
+                    handle = self._next_locked()
+                if handle.kind is not None:
+                    self._running_kinds.add(handle.kind)
+                handle.status = CommandHandle.RUNNING
+
+            try:
+                remaining = handle.deadline - time.monotonic()
+                if remaining <= 0:
+                    handle._finish(CommandHandle.EXPIRED)
+                else:
+                    handle._finish(CommandHandle.DONE, self._send(handle.command, timeout=remaining))
+            except Exception as e:
+                print(f"Assistant error: {e}")
+                handle._finish(CommandHandle.FAILED, error=str(e))
+            finally:
+                with self._cond:
+                    self._running_kinds.discard(handle.kind)
+                    self._cond.notify_all()
+
+
+def create_backend():
+    """Backend selected by GOOGLE_ASSISTANT_BACKEND ("grpc" or "stub")"""
+    if os.getenv('GOOGLE_ASSISTANT_BACKEND', 'grpc') == 'stub':
+        return StubAssistantBackend()
+    return GrpcAssistantBackend(
+        os.getenv('GOOGLE_ASSISTANT_CREDENTIALS', 'google_assistant_credentials.json')
+    )
+
 
 class GoogleAssistantService:
     """Control Google Home via Assistant SDK"""
     
-    def __init__(self):
-        # Load credentials
-        creds_path = 'google_assistant_credentials.json'
+    def __init__(self, backend=None):
+        # Constructed lazily on first command so importing this module is free
+        self._backend = backend
+        self._lock = threading.Lock()
+        self.commands = AssistantCommandQueue(self._dispatch)
         
-        if not os.path.exists(creds_path):
-            raise ValueError("Google Assistant credentials not found!")
+    @property
+    def backend(self):
+        if self._backend is None:
+            with self._lock:
+                if self._backend is None:
+                    self._backend = create_backend()
+        return self._backend
         
-        with open(creds_path, 'r') as f:
-            credentials_data = json.load(f)
+    def warmup(self):
+        """Open the channel ahead of the first command (e.g. from a background task)"""
+        connect = getattr(self.backend, 'connect', None)
+        if connect:
+            connect()
         
-        self.credentials = google.oauth2.credentials.Credentials(
-            token=credentials_data['access_token'],
-            refresh_token=credentials_data.get('refresh_token'),
-            token_uri='https://oauth2.googleapis.com/token',
-            client_id=credentials_data['client_id'],
-            client_secret=credentials_data['client_secret']
-        )
+    def _dispatch(self, command: str, timeout: Optional[float] = None) -> Optional[str]:
+        # Used by the command queue, which wants errors rather than None
+        return self.backend.assist(command, timeout=timeout)
         
-        # Create gRPC channel
-        http_request = google.auth.transport.requests.Request()
-        self.credentials.refresh(http_request)
+    def submit_command(self, command: str, kind: Optional[str] = None,
+                       deadline: Optional[float] = None) -> CommandHandle:
+        """
+        Queue a command without blocking (see AssistantCommandQueue)
         
-        grpc_channel = google.auth.transport.grpc.secure_authorized_channel(
-            self.credentials,
-            http_request,
-            'embeddedassistant.googleapis.com'
-        )
+        Returns:
+            CommandHandle; call .result() or await it for the transcript
+        """
+        return self.commands.submit(command, kind=kind, deadline=deadline)
         
-        self.assistant = embedded_assistant_pb2_grpc.EmbeddedAssistantStub(grpc_channel)
-    
-    def send_text_command(self, command: str):
+    def send_text_command(self, command: str, timeout: Optional[float] = None):
         """
-        Send text command to Google Assistant
+        Send text command to Google Assistant and wait for the answer
         
         Args:
             command: Command like "play lo-fi music on Spotify"
+            timeout: Optional per-call deadline in seconds
         """
         try:
-            # Create text query
-            config = embedded_assistant_pb2.AssistConfig(
-                text_query=command,
-                audio_out_config=embedded_assistant_pb2.AudioOutConfig(
-                    encoding='LINEAR16',
-                    sample_rate_hertz=16000,
-                    volume_percentage=100,
-                )
-            )
-            
-            request = embedded_assistant_pb2.AssistRequest(config=config)
-            
-            # Send request
-            for response in self.assistant.Assist([request]):
-                if response.speech_results:
-                    return response.speech_results[0].transcript
-            
-            return "Command sent"
+            return self.backend.assist(command, timeout=timeout)
         
         except Exception as e:
             print(f"Assistant error: {e}")
             return None
     
-    # Convenience methods for music control
+    # Convenience methods for music control (queued; each returns a CommandHandle)
     
     def play_spotify(self, genre: str, duration: int = None):
         """
@@ -83,6 +375,9 @@ class GoogleAssistantService:
         Args:
             genre: Music type (lofi, jazz, ambient, etc.)
             duration: Optional duration in minutes
+        
+        Returns:
+            CommandHandle (previously the transcript string); call .result() or await it
         """
         genres_map = {
             'lofi': 'lo-fi hip hop',
@@ -101,25 +396,25 @@ class GoogleAssistantService:
         else:
             command = f"play {query} on Spotify"
         
-        return self.send_text_command(command)
+        return self.submit_command(command, kind="playback")
     
     def stop_music(self):
-        """Stop playback"""
-        return self.send_text_command("stop")
+        """Stop playback; returns a CommandHandle"""
+        return self.submit_command("stop", kind="playback")
     
     def pause_music(self):
-        """Pause playback"""
-        return self.send_text_command("pause")
+        """Pause playback; returns a CommandHandle"""
+        return self.submit_command("pause", kind="playback")
     
     def resume_music(self):
-        """Resume playback"""
-        return self.send_text_command("resume")
+        """Resume playback; returns a CommandHandle"""
+        return self.submit_command("resume", kind="playback")
     
     def set_volume(self, level: int):
         """
-        Set volume (0-100)
+        Set volume (0-100); returns a CommandHandle
         """
-        return self.send_text_command(f"set volume to {level}%")
+        return self.submit_command(f"set volume to {level}%", kind="volume")
     
     def play_on_device(self, device_name: str, query: str):
         """
@@ -128,8 +423,16 @@ class GoogleAssistantService:
         Args:
             device_name: Name of your Google Home (e.g., "Living Room")
             query: What to play
+        
+        Returns:
+            CommandHandle (previously the transcript string); call .result() or await it
         """
-        return self.send_text_command(f"play {query} on {device_name}")
+        return self.submit_command(f"play {query} on {device_name}", kind="playback")
+
+    def close(self):
+        self.commands.close()
+        if self._backend is not None:
+            self._backend.close()
 
-# Create singleton
-google_assistant = GoogleAssistantService()
\ No newline at end of file
+# Create singleton (no I/O until the first command)
+google_assistant = GoogleAssistantService()